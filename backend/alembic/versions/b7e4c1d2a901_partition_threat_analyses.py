@@ -0,0 +1,169 @@
+"""Partition threat_analyses by month and add history indexes
+
+Revision ID: b7e4c1d2a901
+Revises:
+Create Date: 2026-10-17 09:00:00.000000
+
+On PostgreSQL the existing table is renamed, a range-partitioned
+threat_analyses is created with (id, created_at) as its primary key,
+monthly partitions are created to cover the existing rows, and the rows
+are copied across. Other databases keep a plain table and only get the
+indexes (a table created here is keyed on (id, created_at) as well, and
+downgrade rebuilds it keyed on id).
+
+Existing rows keep their UUID4 ids; new rows get time-ordered UUIDv7 ids.
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.partitions import add_months, create_partition, is_partitioned, month_start
+
+# revision identifiers, used by Alembic.
+revision = 'b7e4c1d2a901'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    "id, analysis_type, target, file_hash_md5, file_hash_sha256, file_size, file_type, "
+    "verdict, risk_level, confidence_score, tensorflow_result, pytorch_result, "
+    "opencti_result, misp_result, created_at, updated_at, processing_time"
+)
+
+# Months created ahead of the current one (app.partitions keeps extending this)
+PARTITIONS_AHEAD = 3
+
+
+def threat_analyses_columns():
+    return [
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('analysis_type', sa.String(length=50), nullable=False),
+        sa.Column('target', sa.Text(), nullable=False),
+        sa.Column('file_hash_md5', sa.String(length=32), nullable=True),
+        sa.Column('file_hash_sha256', sa.String(length=64), nullable=True),
+        sa.Column('file_size', sa.Integer(), nullable=True),
+        sa.Column('file_type', sa.String(length=100), nullable=True),
+        sa.Column('verdict', sa.String(length=20), nullable=False),
+        sa.Column('risk_level', sa.String(length=20), nullable=False),
+        sa.Column('confidence_score', sa.Float(), nullable=False),
+        sa.Column('tensorflow_result', sa.JSON(), nullable=True),
+        sa.Column('pytorch_result', sa.JSON(), nullable=True),
+        sa.Column('opencti_result', sa.JSON(), nullable=True),
+        sa.Column('misp_result', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('processing_time', sa.Float(), nullable=True),
+    ]
+
+
+def create_history_indexes(existing=()):
+    if 'ix_threat_analyses_sha256_created' not in existing:
+        op.create_index('ix_threat_analyses_sha256_created', 'threat_analyses',
+                        ['file_hash_sha256', sa.text('created_at DESC')],
+                        postgresql_include=['verdict', 'risk_level', 'confidence_score'],
+                        postgresql_where=sa.text('file_hash_sha256 IS NOT NULL'))
+    if 'ix_threat_analyses_target' not in existing:
+        op.create_index('ix_threat_analyses_target', 'threat_analyses', ['target'], postgresql_using='hash')
+    if 'ix_threat_analyses_created' not in existing:
+        op.create_index('ix_threat_analyses_created', 'threat_analyses',
+                        [sa.text('created_at DESC'), 'analysis_type'],
+                        postgresql_include=['verdict', 'risk_level', 'confidence_score', 'processing_time'])
+
+
+def drop_history_indexes():
+    for name in ('ix_threat_analyses_created', 'ix_threat_analyses_target', 'ix_threat_analyses_sha256_created'):
+        op.drop_index(name, table_name='threat_analyses')
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = inspector.get_table_names()
+
+    if 'system_metrics' in tables:
+        indexed = {index['name'] for index in inspector.get_indexes('system_metrics')}
+        if 'ix_system_metrics_timestamp' not in indexed:
+            op.create_index('ix_system_metrics_timestamp', 'system_metrics', ['timestamp'])
+
+    if bind.dialect.name != 'postgresql':
+        if 'threat_analyses' not in tables:
+            op.create_table('threat_analyses', *threat_analyses_columns(),
+                            sa.PrimaryKeyConstraint('id', 'created_at'))
+            create_history_indexes()
+        else:
+            create_history_indexes({index['name'] for index in inspector.get_indexes('threat_analyses')})
+        return
+
+    if is_partitioned(bind):
+        # Created by a newer application's create_all; nothing to convert
+        return
+
+    legacy = 'threat_analyses' in tables
+    if legacy:
+        op.rename_table('threat_analyses', 'threat_analyses_unpartitioned')
+        op.execute('ALTER TABLE threat_analyses_unpartitioned '
+                   'RENAME CONSTRAINT threat_analyses_pkey TO threat_analyses_unpartitioned_pkey')
+
+    op.create_table('threat_analyses', *threat_analyses_columns(),
+                    sa.PrimaryKeyConstraint('id', 'created_at', name='threat_analyses_pkey'),
+                    postgresql_partition_by='RANGE (created_at)')
+    create_history_indexes()
+
+    # Partitions from the oldest existing row through PARTITIONS_AHEAD months from now
+    current = month_start(datetime.now(timezone.utc).date())
+    first = current
+    if legacy:
+        oldest = bind.execute(sa.text(
+            "SELECT min(created_at AT TIME ZONE 'UTC') FROM threat_analyses_unpartitioned"
+        )).scalar()
+        if oldest is not None:
+            first = min(first, month_start(oldest.date()))
+    month = first
+    while month <= add_months(current, PARTITIONS_AHEAD):
+        create_partition(bind, month)
+        month = add_months(month, 1)
+
+    if legacy:
+        op.execute(
+            f"INSERT INTO threat_analyses ({COLUMNS}) "
+            f"SELECT {COLUMNS.replace('created_at', 'coalesce(created_at, now())')} "
+            "FROM threat_analyses_unpartitioned"
+        )
+        op.drop_table('threat_analyses_unpartitioned')
+
+
+def drop_system_metrics_index(bind):
+    inspector = sa.inspect(bind)
+    if 'system_metrics' in inspector.get_table_names() and 'ix_system_metrics_timestamp' in {
+            index['name'] for index in inspector.get_indexes('system_metrics')}:
+        op.drop_index('ix_system_metrics_timestamp', table_name='system_metrics')
+
+
+def restore_single_column_key(source):
+    """Recreate threat_analyses keyed on id alone from the rows in source, then drop source"""
+    columns = threat_analyses_columns()
+    columns[0] = sa.Column('id', sa.String(length=36), primary_key=True)
+    columns[14] = sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True)
+    op.create_table('threat_analyses', *columns)
+    op.execute(f"INSERT INTO threat_analyses ({COLUMNS}) SELECT {COLUMNS} FROM {source}")
+    # On PostgreSQL, dropping the parent drops every partition with it
+    op.drop_table(source)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    drop_system_metrics_index(bind)
+    if bind.dialect.name != 'postgresql':
+        drop_history_indexes()
+        # The table upgrade created (or a newer create_all) is keyed on (id, created_at)
+        if sa.inspect(bind).get_pk_constraint('threat_analyses')['constrained_columns'] != ['id']:
+            op.rename_table('threat_analyses', 'threat_analyses_composite')
+            restore_single_column_key('threat_analyses_composite')
+        return
+
+    op.rename_table('threat_analyses', 'threat_analyses_partitioned')
+    op.execute('ALTER TABLE threat_analyses_partitioned '
+               'RENAME CONSTRAINT threat_analyses_pkey TO threat_analyses_partitioned_pkey')
+    restore_single_column_key('threat_analyses_partitioned')
@@ -0,0 +1,56 @@
+"""Add scan_jobs and scan_results for background network scans
+
+Revision ID: c3f8a2e5d104
+Revises: b7e4c1d2a901
+Create Date: 2026-10-17 12:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c3f8a2e5d104'
+down_revision = 'b7e4c1d2a901'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'scan_jobs' not in tables:
+        op.create_table(
+            'scan_jobs',
+            sa.Column('id', sa.String(length=36), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('targets', sa.JSON(), nullable=False),
+            sa.Column('ports', sa.JSON(), nullable=True),
+            sa.Column('hosts_total', sa.Integer(), nullable=False),
+            sa.Column('hosts_scanned', sa.Integer(), nullable=False),
+            sa.Column('hosts_up', sa.Integer(), nullable=False),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.Column('worker', sa.String(length=100), nullable=True),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_scan_jobs_status_id', 'scan_jobs', ['status', 'id'])
+    if 'scan_results' not in tables:
+        op.create_table(
+            'scan_results',
+            sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+            sa.Column('job_id', sa.String(length=36), nullable=False),
+            sa.Column('ip', sa.String(length=45), nullable=False),
+            sa.Column('result', sa.JSON(), nullable=False),
+            sa.ForeignKeyConstraint(['job_id'], ['scan_jobs.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_scan_results_job_id', 'scan_results', ['job_id', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_scan_results_job_id', table_name='scan_results')
+    op.drop_table('scan_results')
+    op.drop_index('ix_scan_jobs_status_id', table_name='scan_jobs')
+    op.drop_table('scan_jobs')
@@ -0,0 +1,24 @@
+"""Add scan_jobs.profile for port-profile scans
+
+Revision ID: d9a4b6e1f207
+Revises: c3f8a2e5d104
+Create Date: 2026-10-17 15:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd9a4b6e1f207'
+down_revision = 'c3f8a2e5d104'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    columns = [column['name'] for column in sa.inspect(op.get_bind()).get_columns('scan_jobs')]
+    if 'profile' not in columns:
+        op.add_column('scan_jobs', sa.Column('profile', sa.String(length=20), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('scan_jobs', 'profile')
@@ -0,0 +1,26 @@
+"""Add system_metrics.mean_confidence; detection_accuracy is no longer filled
+
+Revision ID: e5c7f3a9b812
+Revises: d9a4b6e1f207
+Create Date: 2026-10-17 18:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e5c7f3a9b812'
+down_revision = 'd9a4b6e1f207'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    columns = [column['name'] for column in sa.inspect(op.get_bind()).get_columns('system_metrics')]
+    if 'mean_confidence' not in columns:
+        op.add_column('system_metrics', sa.Column('mean_confidence', sa.Float(), nullable=True))
+        # What earlier snapshots stored as detection_accuracy was mean confidence
+        op.execute('UPDATE system_metrics SET mean_confidence = detection_accuracy, detection_accuracy = NULL')
+
+
+def downgrade() -> None:
+    op.drop_column('system_metrics', 'mean_confidence')
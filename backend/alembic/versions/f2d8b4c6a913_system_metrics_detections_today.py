@@ -0,0 +1,24 @@
+"""Add system_metrics.detections_today, so today's detection count survives a restart
+
+Revision ID: f2d8b4c6a913
+Revises: e5c7f3a9b812
+Create Date: 2026-10-17 20:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f2d8b4c6a913'
+down_revision = 'e5c7f3a9b812'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    columns = [column['name'] for column in sa.inspect(op.get_bind()).get_columns('system_metrics')]
+    if 'detections_today' not in columns:
+        op.add_column('system_metrics', sa.Column('detections_today', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('system_metrics', 'detections_today')
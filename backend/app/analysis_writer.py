@@ -0,0 +1,150 @@
+"""
+Analysis Writer Module for AbEthiopia Cyber Intelligence Platform
+Write-behind persistence of ThreatAnalysis records: requests enqueue a row
+and return; a background task bulk-inserts batches on a size-or-time trigger
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.core.database import engine
+from app.core.metrics import ANALYSIS_WRITE_QUEUE, ANALYSIS_WRITE_SECONDS, ANALYSIS_WRITES
+from app.executor import dispatcher
+from app.models.database import ThreatAnalysis, generate_uuid
+
+VERDICTS = {"high": "malicious", "medium": "suspicious", "low": "clean"}
+
+def analysis_row(analysis_type: str, target: str, analysis: Dict[str, Any],
+                 processing_time: Optional[float] = None) -> Dict[str, Any]:
+    """threat_analyses row for an analysis result"""
+    hashes = dict(analysis.get("hashes") or {})
+    if analysis_type == "hash":
+        # Hash lookups may be MD5, SHA-1 or SHA-256; only two have columns
+        digest = analysis.get("file_hash", "")
+        hashes = {{32: "md5", 64: "sha256"}.get(len(digest), "other"): digest}
+    risk_level = analysis.get("risk_level", "unknown")
+    return {
+        "id": generate_uuid(),
+        "analysis_type": analysis_type,
+        "target": target or "",
+        "file_hash_md5": hashes.get("md5"),
+        "file_hash_sha256": hashes.get("sha256"),
+        "file_size": analysis.get("file_size"),
+        "file_type": analysis.get("file_type"),
+        "verdict": VERDICTS.get(risk_level, "unknown"),
+        "risk_level": risk_level,
+        "confidence_score": float(analysis.get("confidence", 0)),
+        "processing_time": processing_time
+    }
+
+class AnalysisWriter:
+    def __init__(self, max_queue: Optional[int] = None, batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None):
+        self.max_queue = max_queue or settings.ANALYSIS_WRITER_QUEUE
+        self.batch_size = batch_size or settings.ANALYSIS_WRITER_BATCH
+        self.flush_interval = flush_interval or settings.ANALYSIS_WRITER_INTERVAL
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.stopping = False
+        # Set by stop() to cut short the wait for a batch to fill
+        self.stop_requested: Optional[asyncio.Event] = None
+        # Failures are logged once per outage, not once per batch
+        self.healthy = True
+
+    def start(self):
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self.stopping = False
+        self.stop_requested = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+
+    def record(self, analysis_type: str, target: str, analysis: Dict[str, Any],
+               processing_time: Optional[float] = None):
+        """Enqueue an analysis for persistence; never blocks the request"""
+        if self.queue is None or self.stopping or "error" in analysis:
+            return
+        try:
+            self.queue.put_nowait(analysis_row(analysis_type, target, analysis, processing_time))
+        except asyncio.QueueFull:
+            # Shed writes rather than let a slow database back up into requests
+            ANALYSIS_WRITES.labels(result="dropped").inc()
+            return
+        ANALYSIS_WRITE_QUEUE.set(self.queue.qsize())
+
+    async def run(self):
+        while not (self.stopping and self.queue.empty()):
+            rows = await self.next_batch()
+            if rows:
+                await self.flush(rows)
+
+    async def next_batch(self) -> List[Dict[str, Any]]:
+        """Up to batch_size rows, or whatever arrived within flush_interval"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        rows = []
+        while len(rows) < self.batch_size:
+            try:
+                rows.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if self.stopping or remaining <= 0:
+                break
+            getter = asyncio.ensure_future(self.queue.get())
+            stopped = asyncio.ensure_future(self.stop_requested.wait())
+            await asyncio.wait((getter, stopped), timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            stopped.cancel()
+            if not getter.done():
+                # A cancelled get leaves its row in the queue
+                getter.cancel()
+                break
+            rows.append(getter.result())
+        ANALYSIS_WRITE_QUEUE.set(self.queue.qsize())
+        return rows
+
+    async def flush(self, rows: List[Dict[str, Any]]):
+        started = time.monotonic()
+        try:
+            await dispatcher.run("database", self.write_rows, rows)
+        except Exception as e:
+            ANALYSIS_WRITES.labels(result="failed").inc(len(rows))
+            if self.healthy:
+                print(f"⚠️  Analysis persistence failed, dropping batches until the database recovers: {e}")
+                self.healthy = False
+            return
+        if not self.healthy:
+            print("✅ Analysis persistence recovered")
+            self.healthy = True
+        ANALYSIS_WRITES.labels(result="written").inc(len(rows))
+        ANALYSIS_WRITE_SECONDS.observe(time.monotonic() - started)
+
+    def write_rows(self, rows: List[Dict[str, Any]]):
+        # One executemany per batch; SQLAlchemy turns it into multi-row
+        # INSERT ... VALUES statements on PostgreSQL and SQLite
+        with engine.begin() as connection:
+            connection.execute(insert(ThreatAnalysis.__table__), rows)
+
+    async def stop(self):
+        """Flush everything still queued (bounded by ANALYSIS_WRITER_SHUTDOWN_TIMEOUT)"""
+        if self.task is None:
+            return
+        self.stopping = True
+        self.stop_requested.set()
+        try:
+            await asyncio.wait_for(self.task, settings.ANALYSIS_WRITER_SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"⚠️  Analysis writer shutdown timed out with {self.queue.qsize()} rows unwritten")
+        self.task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "max_queue": self.max_queue,
+            "healthy": self.healthy
+        }
+
+analysis_writer = AnalysisWriter()
@@ -1,18 +1,95 @@
-from sqlalchemy import create_engine
+import time
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from app.core.config import settings
+from app.core.metrics import DB_POOL_CHECKED_OUT, DB_POOL_TIMEOUTS, DB_POOL_WAIT_SECONDS
+
+# Async drivers for the sync URLs in DATABASE_URL
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+class TimedPoolMixin:
+    """Records how long callers wait to get a connection from the pool"""
+    engine_name = "sync"
+
+    def connect(self):
+        started = time.monotonic()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            DB_POOL_TIMEOUTS.labels(engine=self.engine_name).inc()
+            raise
+        finally:
+            DB_POOL_WAIT_SECONDS.labels(engine=self.engine_name).observe(time.monotonic() - started)
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    engine_name = "sync"
+
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    engine_name = "async"
+
+def async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    return parsed.set(drivername=ASYNC_DRIVERS.get(backend, parsed.drivername)).render_as_string(hide_password=False)
 
-# Create database engine
+def pool_options(url: str, poolclass) -> dict:
+    """Per-worker pool sizing; every uvicorn worker opens up to
+    DB_POOL_SIZE + DB_MAX_OVERFLOW connections"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # In-memory SQLite is a single shared connection, not a pool
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+
+def track_checkouts(engine, name: str):
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.labels(engine=name).inc()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.labels(engine=name).dec()
+
+# Create database engine (sync: Alembic, create_all and the analysis writer)
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
-    pool_recycle=300,
-    echo=False
+    echo=False,
+    query_cache_size=settings.DB_QUERY_CACHE_SIZE,
+    **pool_options(settings.DATABASE_URL, TimedQueuePool)
 )
+track_checkouts(engine, "sync")
+
+# Async engine for use from request handlers; asyncpg also keeps a
+# per-connection cache of prepared statements
+_async_url = async_database_url(settings.DATABASE_URL)
+async_engine = create_async_engine(
+    _async_url,
+    pool_pre_ping=True,
+    echo=False,
+    query_cache_size=settings.DB_QUERY_CACHE_SIZE,
+    connect_args=(
+        {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+        if make_url(_async_url).drivername == "postgresql+asyncpg" else {}
+    ),
+    **pool_options(_async_url, TimedAsyncQueuePool)
+)
+track_checkouts(async_engine.sync_engine, "async")
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
 
 # Create Base class
 Base = declarative_base()
@@ -24,3 +101,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency to get an async DB session (for async def routes)
+async def get_async_db():
+    async with AsyncSessionLocal() as session:
+        yield session
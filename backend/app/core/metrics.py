@@ -0,0 +1,146 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+REQUESTS_TOTAL = Counter(
+    'opencyber_requests_total',
+    'Total number of requests',
+    ['method', 'endpoint', 'status_code']
+)
+
+THREAT_ANALYSES = Counter(
+    'opencyber_threat_analyses_total',
+    'Total number of threat analyses',
+    ['analysis_type', 'verdict']
+)
+
+# Batch analysis; rate(opencyber_batch_indicators_total) is the sustained throughput
+BATCH_INDICATORS = Counter(
+    'opencyber_batch_indicators_total',
+    'Indicators analyzed through batch endpoints',
+    ['analysis_type']
+)
+
+BATCH_THROUGHPUT = Histogram(
+    'opencyber_batch_indicators_per_second',
+    'Throughput of each completed batch request',
+    buckets=(100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+)
+
+# Verdict caches (app.verdict_cache)
+VERDICT_CACHE_HITS = Counter(
+    'opencyber_verdict_cache_hits_total',
+    'Verdict cache hits by tier',
+    ['cache', 'tier']
+)
+
+VERDICT_CACHE_MISSES = Counter(
+    'opencyber_verdict_cache_misses_total',
+    'Verdict cache misses (neither tier had the entry)',
+    ['cache']
+)
+
+# Database connection pools (app.core.database)
+DB_POOL_CHECKED_OUT = Gauge(
+    'opencyber_db_pool_checked_out',
+    'Connections currently checked out of the pool',
+    ['engine']
+)
+
+DB_POOL_WAIT_SECONDS = Histogram(
+    'opencyber_db_pool_wait_seconds',
+    'Time to obtain a pooled connection (including any new connect)',
+    ['engine'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+DB_POOL_TIMEOUTS = Counter(
+    'opencyber_db_pool_timeouts_total',
+    'Connection requests that gave up after DB_POOL_TIMEOUT',
+    ['engine']
+)
+
+# Write-behind analysis persistence (app.analysis_writer)
+ANALYSIS_WRITE_QUEUE = Gauge(
+    'opencyber_analysis_write_queue',
+    'Analysis rows waiting to be written'
+)
+
+ANALYSIS_WRITES = Counter(
+    'opencyber_analysis_writes_total',
+    'Analysis rows by outcome (written, dropped, failed)',
+    ['result']
+)
+
+ANALYSIS_WRITE_SECONDS = Histogram(
+    'opencyber_analysis_write_seconds',
+    'Time to insert one batch of analysis rows',
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+# Local ML inference (app.ml_inference)
+ML_BATCH_SIZE = Histogram(
+    'opencyber_ml_batch_size',
+    'Rows scored per forward pass',
+    ['model'],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+)
+
+ML_INFERENCE_SECONDS = Histogram(
+    'opencyber_ml_inference_seconds',
+    'Time of one forward pass over a micro-batch',
+    ['model'],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+)
+
+ML_REQUEST_SECONDS = Histogram(
+    'opencyber_ml_request_seconds',
+    'Time from submitting rows to getting their scores (batching wait, queueing and forward pass)',
+    ['model'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+# Network scan jobs (app.scan_jobs)
+SCAN_JOBS = Counter(
+    'opencyber_scan_jobs_total',
+    'Scan jobs by event (submitted, completed, failed, cancelled, requeued)',
+    ['event']
+)
+
+SCAN_JOBS_RUNNING = Gauge(
+    'opencyber_scan_jobs_running',
+    'Scan jobs running in this worker'
+)
+
+SCAN_JOB_SECONDS = Histogram(
+    'opencyber_scan_job_seconds',
+    'Run time of each finished scan job',
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+)
+
+# Executor pools (app.executor)
+EXECUTOR_QUEUE_DEPTH = Gauge(
+    'opencyber_executor_queue_depth',
+    'Tasks waiting for a free worker',
+    ['pool']
+)
+
+EXECUTOR_IN_FLIGHT = Gauge(
+    'opencyber_executor_in_flight',
+    'Tasks queued or running',
+    ['pool']
+)
+
+# Only jobs that were accepted: PoolSaturatedError rejections never queue
+# and show up in EXECUTOR_REJECTED instead, so under saturation this
+# histogram tops out near the queue's drain time rather than growing
+EXECUTOR_WAIT_SECONDS = Histogram(
+    'opencyber_executor_wait_seconds',
+    'Time a task waited in the queue before a worker picked it up (rejected tasks are not observed)',
+    ['pool'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+EXECUTOR_REJECTED = Counter(
+    'opencyber_executor_rejected_total',
+    'Tasks rejected because the pool queue was full',
+    ['pool']
+)
@@ -0,0 +1,261 @@
+"""
+Reverse DNS Module for AbEthiopia Cyber Intelligence Platform
+Non-blocking PTR lookups over UDP with a shared TTL/LRU answer cache
+
+Usage:
+    python -m app.dns_resolver benchmark [--hosts N] [--silent N] [--timeout SECONDS]
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import os
+import socket
+import struct
+import sys
+import time
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
+
+from app.core.config import settings
+
+DNS_TYPE_PTR = 12
+DNS_CLASS_IN = 1
+DNS_RCODE_NXDOMAIN = 3
+
+def system_nameservers(path: str = "/etc/resolv.conf") -> List[str]:
+    """Nameservers from resolv.conf, falling back to the local stub resolver"""
+    nameservers = []
+    try:
+        with open(path) as resolv_conf:
+            for line in resolv_conf:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == "nameserver":
+                    nameservers.append(parts[1])
+    except OSError:
+        pass
+    return nameservers or ["127.0.0.1"]
+
+def build_ptr_query(query_id: int, name: str) -> bytes:
+    header = struct.pack("!HHHHHH", query_id, 0x0100, 1, 0, 0, 0)
+    question = b"".join(
+        bytes([len(label)]) + label.encode("ascii") for label in name.rstrip(".").split(".")
+    )
+    return header + question + b"\x00" + struct.pack("!HH", DNS_TYPE_PTR, DNS_CLASS_IN)
+
+def read_name(message: bytes, offset: int) -> Tuple[str, int]:
+    """Decode a (possibly compressed) domain name; returns (name, offset after it)"""
+    labels = []
+    end = None
+    for _ in range(128):
+        length = message[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | message[offset + 1]
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(message[offset:offset + length].decode("ascii", errors="replace"))
+        offset += length
+    else:
+        raise ValueError("DNS name compression loop")
+    return ".".join(labels), end if end is not None else offset
+
+def parse_ptr_response(message: bytes, query_id: int) -> Tuple[int, Optional[str], Optional[int]]:
+    """Returns (rcode, hostname or None, ttl or None) for a PTR response"""
+    response_id, flags, question_count, answer_count, _, _ = struct.unpack("!HHHHHH", message[:12])
+    if response_id != query_id or not flags & 0x8000:
+        raise ValueError("Unexpected DNS response")
+    rcode = flags & 0x000F
+    offset = 12
+    for _ in range(question_count):
+        _, offset = read_name(message, offset)
+        offset += 4
+    for _ in range(answer_count):
+        _, offset = read_name(message, offset)
+        record_type, _, ttl, length = struct.unpack("!HHIH", message[offset:offset + 10])
+        offset += 10
+        if record_type == DNS_TYPE_PTR:
+            hostname, _ = read_name(message, offset)
+            return rcode, hostname, ttl
+        offset += length
+    return rcode, None, None
+
+class ReverseDNSResolver:
+    def __init__(self, nameservers: Optional[List[str]] = None, timeout: Optional[float] = None,
+                 max_in_flight: Optional[int] = None, cache_size: Optional[int] = None):
+        self.nameservers = nameservers or settings.DNS_NAMESERVERS or system_nameservers()
+        self.timeout = timeout or settings.DNS_TIMEOUT
+        self.max_in_flight = max_in_flight or settings.DNS_MAX_IN_FLIGHT
+        self.cache_size = cache_size or settings.DNS_CACHE_SIZE
+        # ip -> (expires_at, hostname or None); None caches a negative answer
+        self.cache: "OrderedDict[str, Tuple[float, Optional[str]]]" = OrderedDict()
+        self.pending: Dict[str, asyncio.Future] = {}
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.hits = 0
+        self.misses = 0
+
+    async def resolve(self, ip: str) -> Optional[str]:
+        """PTR hostname for an address, or None if there is none (or the lookup failed)"""
+        ip = str(ipaddress.ip_address(ip))
+        cached = self.cache.get(ip)
+        if cached is not None and cached[0] > time.monotonic():
+            self.cache.move_to_end(ip)
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+
+        # Concurrent lookups of the same address share a single query
+        while ip in self.pending:
+            pending = self.pending[ip]
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                # The lookup that sent the query was cancelled, not this one: send it again
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[ip] = future
+        try:
+            hostname, ttl = await self.query(ip)
+            self.store(ip, hostname, ttl)
+            future.set_result(hostname)
+            return hostname
+        finally:
+            if not future.done():
+                future.cancel()
+            del self.pending[ip]
+
+    async def resolve_many(self, ips: List[str]) -> Dict[str, Optional[str]]:
+        hostnames = await asyncio.gather(*(self.resolve(ip) for ip in ips))
+        return dict(zip(ips, hostnames))
+
+    async def query(self, ip: str) -> Tuple[Optional[str], int]:
+        """Ask each nameserver in turn; returns (hostname, cache ttl)"""
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_in_flight)
+        name = ipaddress.ip_address(ip).reverse_pointer
+        async with self.semaphore:
+            for nameserver in self.nameservers:
+                try:
+                    rcode, hostname, ttl = await self.query_nameserver(nameserver, name)
+                except (OSError, ValueError, IndexError, struct.error, asyncio.TimeoutError):
+                    continue
+                if hostname is not None:
+                    return hostname, ttl
+                if rcode in (0, DNS_RCODE_NXDOMAIN):
+                    return None, settings.DNS_NEGATIVE_TTL
+        # Every nameserver failed; cache briefly so a dead resolver isn't hammered
+        return None, settings.DNS_FAILURE_TTL
+
+    async def query_nameserver(self, nameserver: str, name: str) -> Tuple[int, Optional[str], Optional[int]]:
+        loop = asyncio.get_running_loop()
+        host, _, port = nameserver.partition("#")
+        address = (host, int(port or 53))
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        query_id = struct.unpack("!H", os.urandom(2))[0]
+        with socket.socket(family, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            await loop.sock_connect(sock, address)
+            await loop.sock_sendall(sock, build_ptr_query(query_id, name))
+            deadline = loop.time() + self.timeout
+            while True:
+                response = await asyncio.wait_for(loop.sock_recv(sock, 4096), deadline - loop.time())
+                try:
+                    return parse_ptr_response(response, query_id)
+                except ValueError:
+                    # Stray or spoofed datagram; keep waiting for ours
+                    continue
+
+    def store(self, ip: str, hostname: Optional[str], ttl: int):
+        ttl = max(settings.DNS_MIN_TTL, min(ttl, settings.DNS_MAX_TTL))
+        self.cache[ip] = (time.monotonic() + ttl, hostname)
+        self.cache.move_to_end(ip)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "cache_entries": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+# Shared by every request in this worker so repeat scans hit the cache
+reverse_dns = ReverseDNSResolver()
+
+class StubNameserver(asyncio.DatagramProtocol):
+    """Local UDP nameserver for the benchmark and tests: answers every PTR query
+    with host-<last label>.bench.test, except for names in silent"""
+
+    def __init__(self, silent: set):
+        self.silent = silent
+        self.queries = 0
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, address):
+        self.queries += 1
+        name, offset = read_name(data, 12)
+        if name in self.silent:
+            return
+        hostname = f"host-{name.split('.')[0]}.bench.test"
+        rdata = b"".join(bytes([len(label)]) + label.encode("ascii") for label in hostname.split(".")) + b"\x00"
+        header = struct.pack("!HHHHHH", struct.unpack("!H", data[:2])[0], 0x8180, 1, 1, 0, 0)
+        answer = struct.pack("!HHHIH", 0xC00C, DNS_TYPE_PTR, DNS_CLASS_IN, 300, len(rdata)) + rdata
+        self.transport.sendto(header + data[12:offset + 4] + answer, address)
+
+def benchmark(hosts: int, silent: int, timeout: float) -> int:
+    """Resolve a /24-style batch twice against a local stub nameserver:
+    the cold pass sends one query per address and waits at most one
+    timeout for the silent ones; the warm pass is served from the cache"""
+    async def run() -> int:
+        addresses = [str(ipaddress.ip_address("10.0.0.1") + index) for index in range(hosts)]
+        silent_names = {ipaddress.ip_address(ip).reverse_pointer for ip in addresses[:silent]}
+        loop = asyncio.get_running_loop()
+        transport, stub = await loop.create_datagram_endpoint(
+            lambda: StubNameserver(silent_names), local_addr=("127.0.0.1", 0))
+        port = transport.get_extra_info("sockname")[1]
+        resolver = ReverseDNSResolver(nameservers=[f"127.0.0.1#{port}"], timeout=timeout)
+        try:
+            passes = []
+            for label in ("cold", "warm"):
+                queries = stub.queries
+                started = time.perf_counter()
+                answers = await resolver.resolve_many(addresses)
+                passes.append((label, time.perf_counter() - started, stub.queries - queries, answers))
+        finally:
+            transport.close()
+
+        print(f"{hosts} addresses ({silent} unanswered) against a local stub, {timeout}s timeout, "
+              f"{resolver.max_in_flight} queries in flight")
+        for label, seconds, queries, answers in passes:
+            resolved = sum(1 for hostname in answers.values() if hostname)
+            print(f"  {label + ':':6}{seconds * 1000:8.1f}ms, {queries} queries sent, {resolved} resolved")
+        stats = resolver.stats()
+        print(f"  cache: {stats['cache_entries']} entries, hit rate {stats['hit_rate']:.1%}")
+        # Every address queried exactly once, the warm pass entirely from the cache
+        return 0 if passes[0][2] == hosts and passes[1][2] == 0 and passes[0][3] == passes[1][3] else 1
+
+    return asyncio.run(run())
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.dns_resolver",
+                                     description="Reverse DNS resolver")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("benchmark", help="resolve a batch twice against a local stub nameserver")
+    bench.add_argument("--hosts", type=int, default=254)
+    bench.add_argument("--silent", type=int, default=1)
+    bench.add_argument("--timeout", type=float, default=0.3)
+    args = parser.parse_args(argv)
+    return benchmark(args.hosts, args.silent, args.timeout)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Executor Module for AbEthiopia Cyber Intelligence Platform
+Dispatches blocking and CPU-bound work off the event loop to sized pools
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import (
+    EXECUTOR_IN_FLIGHT, EXECUTOR_QUEUE_DEPTH, EXECUTOR_REJECTED, EXECUTOR_WAIT_SECONDS
+)
+
+class PoolSaturatedError(Exception):
+    """Raised when a pool's queue is full; callers should shed load (HTTP 503)"""
+
+def timed_call(pool: str, submitted: float, fn: Callable, args: tuple, kwargs: dict) -> Any:
+    # Observed when a worker picks the job up, so jobs that raise or whose
+    # caller has gone away are counted as well
+    EXECUTOR_WAIT_SECONDS.labels(pool=pool).observe(max(0.0, time.monotonic() - submitted))
+    return fn(*args, **kwargs)
+
+class WorkPool:
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # Created on first use so unused pools cost nothing
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix=f"opencyber-{self.name}"
+            )
+        return self._executor
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self.in_flight - self.max_workers)
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        if self.in_flight >= self.max_workers + self.max_queue:
+            # Rejected jobs never wait, so they are counted here and not in
+            # EXECUTOR_WAIT_SECONDS; read the two together when saturated
+            EXECUTOR_REJECTED.labels(pool=self.name).inc()
+            raise PoolSaturatedError(f"{self.name} pool is saturated")
+
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        self.update_gauges()
+        try:
+            job = self.executor.submit(timed_call, self.name, time.monotonic(), fn, args, kwargs)
+        except BaseException:
+            self.release()
+            raise
+        # The slot is held until the job itself is done, not just until the
+        # caller stops waiting: a cancelled caller (client disconnect) leaves
+        # a job that is queued or running all the same
+        job.add_done_callback(lambda _: self.release_threadsafe(loop))
+        return await asyncio.wrap_future(job)
+
+    def release(self):
+        self.in_flight -= 1
+        self.update_gauges()
+
+    def release_threadsafe(self, loop: asyncio.AbstractEventLoop):
+        # Done callbacks run on the worker thread
+        try:
+            loop.call_soon_threadsafe(self.release)
+        except RuntimeError:
+            # The loop is closed (shutdown); nothing is left to account for
+            pass
+
+    def update_gauges(self):
+        EXECUTOR_IN_FLIGHT.labels(pool=self.name).set(self.in_flight)
+        EXECUTOR_QUEUE_DEPTH.labels(pool=self.name).set(self.queue_depth)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+class TaskDispatcher:
+    """Routes each kind of blocking work to its own bounded pool.
+
+    analysis  -- URL/IP rule evaluation (short, pure Python)
+    hashing   -- file hashing and byte scanning (hashlib releases the GIL)
+    database  -- blocking database writes
+    inference -- forward passes of the local URL model (NumPy / ONNX release the GIL)
+    """
+
+    def __init__(self):
+        self.pools: Dict[str, WorkPool] = {
+            "analysis": WorkPool("analysis", settings.ANALYSIS_POOL_WORKERS, settings.ANALYSIS_POOL_QUEUE),
+            "hashing": WorkPool("hashing", settings.HASHING_POOL_WORKERS, settings.HASHING_POOL_QUEUE),
+            "database": WorkPool("database", settings.DATABASE_POOL_WORKERS, settings.DATABASE_POOL_QUEUE),
+            "inference": WorkPool("inference", settings.INFERENCE_POOL_WORKERS, settings.INFERENCE_POOL_QUEUE),
+        }
+
+    async def run(self, pool: str, fn: Callable, *args, **kwargs) -> Any:
+        return await self.pools[pool].run(fn, *args, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {"in_flight": pool.in_flight, "queue_depth": pool.queue_depth,
+                   "max_workers": pool.max_workers, "max_queue": pool.max_queue}
+            for name, pool in self.pools.items()
+        }
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown()
+
+dispatcher = TaskDispatcher()
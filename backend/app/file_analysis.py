@@ -0,0 +1,55 @@
+"""
+File Analysis Module for AbEthiopia Cyber Intelligence Platform
+Incremental per-file state: uploads are fed through in chunks, so hashing
+and signature matching never need the whole file in memory
+"""
+
+from typing import Any, Dict, Iterable, Set
+
+from app.file_hashing import MultiHasher
+
+# Byte signatures of obfuscated script code
+OBFUSCATION_SIGNATURES = (b"eval(", b"base64_decode")
+
+class FileScan:
+    def __init__(self, signatures: Iterable[bytes] = OBFUSCATION_SIGNATURES):
+        self.size = 0
+        self.hasher = MultiHasher()
+        self.signatures = tuple(signatures)
+        self.found: Set[bytes] = set()
+        # Enough trailing bytes of the previous chunk to complete any
+        # signature that straddles the boundary
+        self.overlap = max((len(signature) for signature in self.signatures), default=1) - 1
+        self.tail = b""
+
+    def update(self, chunk: bytes):
+        """Feed the next chunk of the file (blocking; run on the hashing pool)"""
+        if not chunk:
+            return
+        self.size += len(chunk)
+        self.hasher.update(chunk)
+
+        pending = [signature for signature in self.signatures if signature not in self.found]
+        if pending:
+            # Only the few bytes around the boundary are searched twice
+            edge = self.tail + chunk[:self.overlap]
+            for signature in pending:
+                if signature in chunk or signature in edge:
+                    self.found.add(signature)
+
+        if self.overlap:
+            if len(chunk) >= self.overlap:
+                self.tail = bytes(chunk[-self.overlap:])
+            else:
+                self.tail = (self.tail + chunk)[-self.overlap:]
+
+    def hashes(self) -> Dict[str, str]:
+        return self.hasher.hexdigests()
+
+    def summary(self) -> Dict[str, Any]:
+        """Everything the verdict needs from the file's bytes (JSON-serializable)"""
+        return {
+            "file_size": self.size,
+            "hashes": self.hashes(),
+            "signatures": sorted(signature.decode("latin-1") for signature in self.found)
+        }
@@ -0,0 +1,144 @@
+"""
+File Hashing Module for AbEthiopia Cyber Intelligence Platform
+Computes every digest the platform stores or looks up in one pass over the
+data: MD5, SHA-1 and SHA-256, plus an ssdeep fuzzy hash when available.
+
+Hashing is compute-bound, not memory-bound: one pass runs at the speed
+of its slowest digest (MD5, about 0.5 GB/s per core), well below memory
+bandwidth, so the threaded path is bounded by MD5 and the sequential
+path by the sum of all three.
+
+Usage:
+    python -m app.file_hashing benchmark [--size-mb N] [--chunk-kb N] [--threads N]
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Sequence
+
+from app.core.config import settings
+
+try:
+    import ssdeep
+except ImportError:  # optional: pip install ssdeep (needs libfuzzy)
+    ssdeep = None
+
+DEFAULT_ALGORITHMS = ("md5", "sha1", "sha256")
+
+# Sequential updates walk the buffer in blocks small enough to stay in
+# cache, so each hasher after the first reads it from cache, not memory
+CACHE_BLOCK_SIZE = 256 * 1024
+
+# Below this a thread hand-off costs more than it saves
+PARALLEL_MIN_BYTES = 256 * 1024
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+def hasher_executor() -> Optional[ThreadPoolExecutor]:
+    """Shared threads for parallel digests; None when only one is configured"""
+    global _executor
+    if settings.FILE_HASH_THREADS <= 1:
+        return None
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.FILE_HASH_THREADS,
+                                       thread_name_prefix="opencyber-digest")
+    return _executor
+
+def feed(hasher, view: memoryview):
+    # hashlib releases the GIL for updates over 2 KiB, so hashers fed from
+    # different threads really do run at the same time
+    hasher.update(view)
+
+class MultiHasher:
+    def __init__(self, algorithms: Sequence[str] = DEFAULT_ALGORITHMS, fuzzy: Optional[bool] = None):
+        self.hashers = {name: hashlib.new(name) for name in algorithms}
+        fuzzy = settings.FILE_FUZZY_HASH if fuzzy is None else fuzzy
+        self.fuzzy = ssdeep.Hash() if fuzzy and ssdeep is not None else None
+        self.executor = hasher_executor()
+
+    def update(self, data: bytes):
+        view = memoryview(data)
+        if self.executor is not None and len(view) >= PARALLEL_MIN_BYTES:
+            futures = [self.executor.submit(feed, hasher, view) for hasher in self.hashers.values()]
+            if self.fuzzy is not None:
+                self.fuzzy.update(bytes(view))
+            for future in futures:
+                future.result()
+            return
+
+        for start in range(0, len(view), CACHE_BLOCK_SIZE):
+            block = view[start:start + CACHE_BLOCK_SIZE]
+            for hasher in self.hashers.values():
+                hasher.update(block)
+        if self.fuzzy is not None:
+            self.fuzzy.update(bytes(view))
+
+    def hexdigests(self) -> Dict[str, str]:
+        digests = {name: hasher.hexdigest() for name, hasher in self.hashers.items()}
+        if self.fuzzy is not None:
+            digests["ssdeep"] = self.fuzzy.digest()
+        return digests
+
+def hash_bytes(data: bytes, algorithms: Sequence[str] = DEFAULT_ALGORITHMS,
+               fuzzy: Optional[bool] = None) -> Dict[str, str]:
+    hasher = MultiHasher(algorithms, fuzzy)
+    hasher.update(data)
+    return hasher.hexdigests()
+
+def benchmark(size_mb: int, chunk_kb: int, threads: int) -> int:
+    """One MultiHasher pass over chunks (sequential and threaded) against
+    three whole-buffer passes, one MD5 pass and a plain copy of the data"""
+    data = os.urandom(size_mb * 1024 * 1024)
+    chunk = chunk_kb * 1024
+    view = memoryview(data)
+
+    def timed(run) -> float:
+        started = time.perf_counter()
+        run()
+        return time.perf_counter() - started
+
+    def multi(executor: Optional[ThreadPoolExecutor]) -> Dict[str, str]:
+        hasher = MultiHasher(fuzzy=False)
+        hasher.executor = executor
+        for start in range(0, len(view), chunk):
+            hasher.update(view[start:start + chunk])
+        return hasher.hexdigests()
+
+    expected = {name: hashlib.new(name, data).hexdigest() for name in DEFAULT_ALGORITHMS}
+    runs = [
+        ("copy (memory bandwidth)", timed(lambda: bytearray(data))),
+        ("MD5 alone", timed(lambda: hashlib.md5(data).digest())),
+        ("3 whole-buffer passes", timed(lambda: [hashlib.new(name, data).digest() for name in DEFAULT_ALGORITHMS])),
+    ]
+    results = {}
+    runs.append(("MultiHasher, sequential", timed(lambda: results.update(sequential=multi(None)))))
+    if threads > 1:
+        executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="opencyber-digest")
+        runs.append((f"MultiHasher, {threads} threads", timed(lambda: results.update(threaded=multi(executor)))))
+        executor.shutdown()
+
+    print(f"{size_mb} MB in {chunk_kb} KiB chunks, {os.cpu_count()} CPUs")
+    for label, seconds in runs:
+        print(f"  {label + ':':28}{seconds:.3f}s ({size_mb / seconds:,.0f} MB/s)")
+    copy_seconds, md5_seconds = runs[0][1], runs[1][1]
+    print(f"  MD5 alone runs at {copy_seconds / md5_seconds:.0%} of copy speed: hashing is compute-bound, "
+          f"not limited by memory bandwidth")
+    return 0 if all(digests == expected for digests in results.values()) else 1
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.file_hashing",
+                                     description="Single-pass multi-digest hashing")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("benchmark", help="compare MultiHasher with separate passes on random data")
+    bench.add_argument("--size-mb", type=int, default=100)
+    bench.add_argument("--chunk-kb", type=int, default=1024)
+    bench.add_argument("--threads", type=int, default=settings.FILE_HASH_THREADS)
+    args = parser.parse_args(argv)
+    return benchmark(args.size_mb, args.chunk_kb, args.threads)
+
+if __name__ == "__main__":
+    sys.exit(main())
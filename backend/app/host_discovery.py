@@ -0,0 +1,254 @@
+"""
+Host Discovery Module for AbEthiopia Cyber Intelligence Platform
+In-process reachability probing: batched ICMP echo over one unprivileged
+datagram socket where the kernel allows it, TCP connect liveness otherwise
+
+Usage:
+    python -m app.host_discovery benchmark [--hosts LIST_OR_CIDR] [--timeout SECONDS]
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import os
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import time
+from typing import Dict, List, Any, Optional
+
+from app.core.config import settings
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+
+# Result of the first unprivileged ICMP socket attempt per address family
+_icmp_support: Dict[int, bool] = {}
+
+def icmp_available(family: int) -> bool:
+    """Whether unprivileged ICMP datagram sockets are allowed (net.ipv4.ping_group_range)"""
+    if family not in _icmp_support:
+        proto = socket.IPPROTO_ICMP if family == socket.AF_INET else socket.IPPROTO_ICMPV6
+        try:
+            socket.socket(family, socket.SOCK_DGRAM, proto).close()
+            _icmp_support[family] = True
+        except OSError:
+            _icmp_support[family] = False
+    return _icmp_support[family]
+
+def icmp_checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+class ReachabilityProber:
+    def __init__(self, timeout: Optional[float] = None, tcp_ports: Optional[List[int]] = None,
+                 use_icmp: bool = True):
+        self.timeout = timeout or settings.DISCOVERY_TIMEOUT
+        # A refused connection on any of these proves the host is up
+        self.tcp_ports = tcp_ports or [80, 443, 22, 3389]
+        self.use_icmp = use_icmp
+
+    async def probe(self, ip: str, semaphore: Optional[asyncio.Semaphore] = None) -> Dict[str, Any]:
+        """Probe a single host"""
+        return (await self.probe_many([ip], semaphore))[ip]
+
+    async def probe_many(self, hosts: List[str],
+                         semaphore: Optional[asyncio.Semaphore] = None) -> Dict[str, Dict[str, Any]]:
+        """Probe a batch of hosts; ICMP first (one socket per address family), TCP for the rest.
+
+        Returns {ip: {"reachable", "rtt_ms", "method"}} for every input address.
+        """
+        semaphore = semaphore or asyncio.Semaphore(settings.SCAN_MAX_CONCURRENCY)
+        results = {ip: {"reachable": False, "rtt_ms": None, "method": None} for ip in hosts}
+
+        by_family: Dict[int, List[str]] = {}
+        for ip in hosts:
+            family = socket.AF_INET6 if ipaddress.ip_address(ip).version == 6 else socket.AF_INET
+            by_family.setdefault(family, []).append(ip)
+
+        if self.use_icmp:
+            batches = [self.icmp_batch(family, members)
+                       for family, members in by_family.items() if icmp_available(family)]
+            for replies in await asyncio.gather(*batches):
+                for ip, rtt in replies.items():
+                    results[ip].update({"reachable": True, "rtt_ms": rtt, "method": "icmp"})
+
+        # Plenty of hosts drop ICMP, so anything silent gets a TCP liveness check
+        silent = [ip for ip, result in results.items() if not result["reachable"]]
+        rtts = await asyncio.gather(*(self.tcp_ping(ip, semaphore) for ip in silent))
+        for ip, rtt in zip(silent, rtts):
+            if rtt is not None:
+                results[ip].update({"reachable": True, "rtt_ms": rtt, "method": "tcp"})
+
+        return results
+
+    async def icmp_batch(self, family: int, hosts: List[str]) -> Dict[str, float]:
+        """Send one echo request per host over a shared socket and collect RTTs (ms)"""
+        loop = asyncio.get_running_loop()
+        if family == socket.AF_INET:
+            proto, request_type, reply_type = socket.IPPROTO_ICMP, ICMP_ECHO_REQUEST, ICMP_ECHO_REPLY
+        else:
+            proto, request_type, reply_type = socket.IPPROTO_ICMPV6, ICMPV6_ECHO_REQUEST, ICMPV6_ECHO_REPLY
+
+        # The kernel rewrites the echo identifier on datagram sockets, so
+        # replies are matched on (source, sequence) plus a per-batch token
+        token = os.urandom(4)
+        sent: Dict[tuple, float] = {}
+        replies: Dict[str, float] = {}
+        all_replied = asyncio.Event()
+
+        async def receive(sock):
+            while True:
+                data, address = await loop.sock_recvfrom(sock, 1024)
+                if len(data) < 12 or data[0] != reply_type or data[8:12] != token:
+                    continue
+                sequence = struct.unpack("!H", data[6:8])[0]
+                source = str(ipaddress.ip_address(address[0].split("%")[0]))
+                sent_at = sent.pop((source, sequence), None)
+                if sent_at is not None:
+                    replies[source] = round((time.monotonic() - sent_at) * 1000, 3)
+                    if not sent:
+                        all_replied.set()
+
+        with socket.socket(family, socket.SOCK_DGRAM, proto) as sock:
+            sock.setblocking(False)
+            # Replies to a large batch arrive in a burst; a small receive
+            # buffer silently drops them and turns live hosts into TCP checks
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+            receiver = asyncio.create_task(receive(sock))
+            try:
+                for index, ip in enumerate(hosts):
+                    if index and index % 64 == 0:
+                        # Let the receiver drain replies between bursts of sends
+                        await asyncio.sleep(0)
+                    sequence = index & 0xFFFF
+                    header = struct.pack("!BBHHH", request_type, 0, 0, 0, sequence)
+                    payload = token + struct.pack("!I", index)
+                    if family == socket.AF_INET:
+                        header = struct.pack("!BBHHH", request_type, 0, icmp_checksum(header + payload), 0, sequence)
+                    target = str(ipaddress.ip_address(ip))
+                    sent[(target, sequence)] = time.monotonic()
+                    try:
+                        await loop.sock_sendto(sock, header + payload, (target, 0))
+                    except OSError:
+                        # Unroutable destinations fall through to the TCP check
+                        sent.pop((target, sequence), None)
+                if sent:
+                    try:
+                        await asyncio.wait_for(all_replied.wait(), self.timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                receiver.cancel()
+                try:
+                    await receiver
+                except (asyncio.CancelledError, OSError):
+                    pass
+
+        return {ip: replies[str(ipaddress.ip_address(ip))]
+                for ip in hosts if str(ipaddress.ip_address(ip)) in replies}
+
+    async def tcp_ping(self, ip: str, semaphore: asyncio.Semaphore) -> Optional[float]:
+        """RTT (ms) of the first TCP port that accepts or refuses a connection, else None"""
+        probes = [asyncio.create_task(self.tcp_connect_rtt(ip, port, semaphore)) for port in self.tcp_ports]
+        try:
+            for probe in asyncio.as_completed(probes):
+                rtt = await probe
+                if rtt is not None:
+                    return rtt
+            return None
+        finally:
+            for probe in probes:
+                probe.cancel()
+
+    async def tcp_connect_rtt(self, ip: str, port: int, semaphore: asyncio.Semaphore) -> Optional[float]:
+        async with semaphore:
+            loop = asyncio.get_running_loop()
+            family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+            with socket.socket(family, socket.SOCK_STREAM) as sock:
+                sock.setblocking(False)
+                started = time.monotonic()
+                try:
+                    await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), self.timeout)
+                except ConnectionRefusedError:
+                    pass
+                except (OSError, asyncio.TimeoutError):
+                    return None
+                return round((time.monotonic() - started) * 1000, 3)
+
+def ping_reachable(ip: str) -> bool:
+    """The per-host subprocess check the prober replaced"""
+    try:
+        return subprocess.run(["ping", "-c", "2", "-W", "1", ip],
+                              capture_output=True, text=True, timeout=10).returncode == 0
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+def parse_hosts(spec: str) -> List[str]:
+    """Comma-separated addresses and/or CIDR blocks"""
+    hosts = []
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        if "/" in part:
+            network = ipaddress.ip_network(part, strict=False)
+            hosts.extend(str(ip) for ip in (network.hosts() if network.num_addresses > 2 else network))
+        else:
+            hosts.append(str(ipaddress.ip_address(part)))
+    return hosts
+
+def benchmark(hosts: List[str], timeout: float) -> int:
+    """Time one probe_many batch against the old loop of one ping subprocess
+    per host; fails if ping finds a host the prober missed"""
+    started = time.perf_counter()
+    results = asyncio.run(ReachabilityProber(timeout=timeout).probe_many(hosts))
+    probe_seconds = time.perf_counter() - started
+    reachable = {ip for ip, result in results.items() if result["reachable"]}
+    methods: Dict[str, int] = {}
+    for result in results.values():
+        if result["method"]:
+            methods[result["method"]] = methods.get(result["method"], 0) + 1
+
+    icmp = ", ".join(f"IPv{4 if family == socket.AF_INET else 6} {'yes' if icmp_available(family) else 'no'}"
+                     for family in (socket.AF_INET, socket.AF_INET6))
+    print(f"{len(hosts)} hosts, {timeout}s timeout (unprivileged ICMP: {icmp})")
+    print(f"  probe_many:{probe_seconds * 1000:10.1f}ms, {len(reachable)} reachable "
+          f"({', '.join(f'{count} {method}' for method, count in sorted(methods.items())) or 'none'})")
+
+    if shutil.which("ping") is None:
+        print("  ping loop:  skipped, no ping binary on PATH")
+        return 0
+
+    started = time.perf_counter()
+    pinged = {ip for ip in hosts if ping_reachable(ip)}
+    ping_seconds = time.perf_counter() - started
+    print(f"  ping loop: {ping_seconds * 1000:10.1f}ms, {len(pinged)} reachable")
+    print(f"  speedup:   {ping_seconds / probe_seconds:10.1f}x")
+    missed = sorted(pinged - reachable, key=ipaddress.ip_address)
+    extra = sorted(reachable - pinged, key=ipaddress.ip_address)
+    if extra:
+        # Hosts that drop ICMP but answer on a TCP port
+        print(f"  only probe_many: {', '.join(extra)}")
+    if missed:
+        print(f"  only ping: {', '.join(missed)}")
+    return 1 if missed else 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.host_discovery",
+                                     description="In-process host discovery")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("benchmark", help="time probe_many against a subprocess ping loop")
+    bench.add_argument("--hosts", default="127.0.0.1,::1",
+                       help="comma-separated addresses or CIDR blocks")
+    bench.add_argument("--timeout", type=float, default=1.0)
+    args = parser.parse_args(argv)
+    return benchmark(parse_hosts(args.hosts), args.timeout)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Indicator Database Module for AbEthiopia Cyber Intelligence Platform
+On-disk format for compiled threat-feed hash sets. Files are memory-mapped
+read-only, so every uvicorn worker shares one copy through the page cache.
+
+Layout (little-endian, every section 8-byte aligned):
+
+    header   magic "OCIDB001", section count (u32), reserved (u32),
+             source mtime (f64)
+    table    per section: kind (8s), record count (u64),
+             fanout length (u64), offset (u64)
+    section  fanout table (i64 x fanout length), then sorted u64 records
+
+Usage:
+    python -m app.indicator_db build [--feed-dir DIR] [feed.txt ...]
+    python -m app.indicator_db info feed.idb
+"""
+
+import argparse
+import glob
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, Tuple
+
+import numpy as np
+
+MAGIC = b"OCIDB001"
+HEADER = struct.Struct("<8sIId")
+SECTION = struct.Struct("<8sQQQ")
+RECORD_DTYPE = np.dtype("<u8")
+FANOUT_DTYPE = np.dtype("<i8")
+
+# kind -> (sorted hashes, fanout table)
+Sections = Dict[str, Tuple[np.ndarray, np.ndarray]]
+
+class IndicatorDBError(Exception):
+    pass
+
+def write_indicator_db(path: str, sections: Sections, source_mtime: float = 0.0):
+    """Write sections to path atomically (temp file, then rename).
+
+    Workers that already mapped the old file keep reading it until they
+    remap; the rename never exposes a partially written database.
+    """
+    offset = HEADER.size + SECTION.size * len(sections)
+    table = []
+    for kind, (hashes, fanout) in sections.items():
+        table.append(SECTION.pack(kind.encode("ascii"), len(hashes), len(fanout), offset))
+        offset += len(fanout) * FANOUT_DTYPE.itemsize + len(hashes) * RECORD_DTYPE.itemsize
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as db_file:
+        db_file.write(HEADER.pack(MAGIC, len(sections), 0, source_mtime))
+        db_file.write(b"".join(table))
+        for hashes, fanout in sections.values():
+            db_file.write(np.ascontiguousarray(fanout, dtype=FANOUT_DTYPE).tobytes())
+            db_file.write(np.ascontiguousarray(hashes, dtype=RECORD_DTYPE).tobytes())
+    os.replace(temp_path, path)
+
+def read_header(path: str) -> float:
+    """Source mtime recorded in a database file"""
+    with open(path, "rb") as db_file:
+        magic, _, _, source_mtime = HEADER.unpack(db_file.read(HEADER.size))
+    if magic != MAGIC:
+        raise IndicatorDBError(f"{path} is not an indicator database")
+    return source_mtime
+
+def open_indicator_db(path: str) -> Sections:
+    """Map a database read-only; the returned arrays are views over the mapping"""
+    with open(path, "rb") as db_file:
+        mapping = mmap.mmap(db_file.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(mapping) < HEADER.size:
+        raise IndicatorDBError(f"{path} is truncated")
+    magic, section_count, _, _ = HEADER.unpack_from(mapping, 0)
+    if magic != MAGIC:
+        raise IndicatorDBError(f"{path} is not an indicator database")
+
+    sections: Sections = {}
+    for index in range(section_count):
+        kind, count, fanout_length, offset = SECTION.unpack_from(mapping, HEADER.size + index * SECTION.size)
+        records_offset = offset + fanout_length * FANOUT_DTYPE.itemsize
+        if records_offset + count * RECORD_DTYPE.itemsize > len(mapping):
+            raise IndicatorDBError(f"{path} is truncated")
+        # The arrays hold a reference to the mapping; it is unmapped once
+        # the last of them is garbage collected
+        fanout = np.frombuffer(mapping, dtype=FANOUT_DTYPE, count=fanout_length, offset=offset)
+        hashes = np.frombuffer(mapping, dtype=RECORD_DTYPE, count=count, offset=records_offset)
+        sections[kind.rstrip(b"\x00").decode("ascii")] = (hashes, fanout)
+    return sections
+
+def db_path_for(feed_path: str) -> str:
+    return os.path.splitext(feed_path)[0] + ".idb"
+
+def main(argv=None) -> int:
+    from app.core.config import settings
+    from app.threat_feeds import parse_feed_file
+
+    parser = argparse.ArgumentParser(prog="python -m app.indicator_db",
+                                     description="Compile threat feeds into memory-mappable indicator databases")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compile feed text files into .idb files")
+    build.add_argument("feeds", nargs="*", help="feed text files (default: every .txt in --feed-dir)")
+    build.add_argument("--feed-dir", default=settings.THREAT_FEED_DIR)
+    info = commands.add_parser("info", help="describe an .idb file")
+    info.add_argument("database")
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        print(f"{args.database}: source mtime {read_header(args.database)}")
+        for kind, (hashes, _) in open_indicator_db(args.database).items():
+            print(f"  {kind}: {len(hashes)} records")
+        return 0
+
+    feeds = args.feeds or sorted(glob.glob(os.path.join(args.feed_dir, "*.txt")))
+    if not feeds:
+        print(f"No feeds found in {args.feed_dir}", file=sys.stderr)
+        return 1
+    for feed_path in feeds:
+        indicators = parse_feed_file(feed_path)
+        target = db_path_for(feed_path)
+        write_indicator_db(target, {kind: (indicator_set.hashes, indicator_set.fanout)
+                                    for kind, indicator_set in indicators.items()},
+                           os.path.getmtime(feed_path))
+        counts = ", ".join(f"{len(indicator_set)} {kind}" for kind, indicator_set in indicators.items())
+        print(f"✅ {feed_path} -> {target} ({counts})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
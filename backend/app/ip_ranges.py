@@ -0,0 +1,152 @@
+"""
+IP Range Module for AbEthiopia Cyber Intelligence Platform
+Longest-prefix match of IPv4/IPv6 addresses against a prefix -> ASN /
+country / provider dataset, using flattened sorted interval arrays
+"""
+
+import bisect
+import csv
+import hashlib
+import ipaddress
+import os
+import socket
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+FIELDS = ["prefix", "asn", "organization", "country_code", "country", "city"]
+
+# Used when IP_RANGES_FILE does not exist; rows in the file take precedence
+DEFAULT_IP_RANGES = [
+    ["196.188.0.0/16", "AS24757", "Ethio Telecom", "ET", "Ethiopia", "Addis Ababa"],
+    ["196.189.0.0/16", "AS24757", "Ethio Telecom", "ET", "Ethiopia", "Addis Ababa"],
+    ["197.156.0.0/16", "AS24757", "Ethio Telecom", "ET", "Ethiopia", "Addis Ababa"],
+    ["197.157.0.0/16", "AS24757", "Ethio Telecom", "ET", "Ethiopia", "Addis Ababa"],
+]
+
+def load_ip_ranges(path: Optional[str] = None) -> List[List[str]]:
+    """Dataset rows: the CSV at IP_RANGES_FILE (header row optional) or the defaults"""
+    path = path or settings.IP_RANGES_FILE
+    if not path or not os.path.exists(path):
+        return DEFAULT_IP_RANGES
+    rows = []
+    with open(path, newline="") as ranges_file:
+        for row in csv.reader(ranges_file):
+            if not row or row[0].startswith("#") or row[0] == "prefix":
+                continue
+            rows.append((row + [""] * len(FIELDS))[:len(FIELDS)])
+    return rows
+
+def parse_address(ip: str) -> Optional[Tuple[int, int]]:
+    """(version, integer value), with IPv4-mapped IPv6 folded to IPv4; None if invalid.
+    inet_pton is several times faster than ipaddress for this."""
+    ip = ip.strip()
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except OSError:
+        pass
+    try:
+        value = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip.split("%")[0]), "big")
+    except OSError:
+        return None
+    if value >> 32 == 0xFFFF:
+        return 4, value & 0xFFFFFFFF
+    return 6, value
+
+def flatten(prefixes: List[Tuple[int, int, int]]) -> Tuple[List[int], List[int], List[int]]:
+    """Turn nested (first, last, record) prefixes into disjoint intervals.
+
+    Each address range ends up owned by its most specific prefix, so a
+    lookup is one bisect with no backtracking. CIDR blocks nest or are
+    disjoint, which is what makes the single stack sweep sufficient; a
+    repeated prefix is won by its last definition.
+    """
+    prefixes = sorted(prefixes, key=lambda prefix: (prefix[0], -prefix[1]))
+    starts: List[int] = []
+    ends: List[int] = []
+    records: List[int] = []
+
+    def emit(first: int, last: int, record: int):
+        if first > last:
+            return
+        if starts and records[-1] == record and ends[-1] + 1 == first:
+            ends[-1] = last
+        else:
+            starts.append(first)
+            ends.append(last)
+            records.append(record)
+
+    open_prefixes: List[Tuple[int, int]] = []
+    cursor = 0
+    for first, last, record in prefixes:
+        while open_prefixes and open_prefixes[-1][0] < first:
+            enclosing_last, enclosing_record = open_prefixes.pop()
+            emit(cursor, enclosing_last, enclosing_record)
+            cursor = enclosing_last + 1
+        if open_prefixes:
+            emit(cursor, first - 1, open_prefixes[-1][1])
+        open_prefixes.append((last, record))
+        cursor = first
+    while open_prefixes:
+        enclosing_last, enclosing_record = open_prefixes.pop()
+        emit(cursor, enclosing_last, enclosing_record)
+        cursor = enclosing_last + 1
+    return starts, ends, records
+
+class IPRangeIndex:
+    """One lookup answers the country, provider and ASN questions for an address"""
+
+    def __init__(self, rows: Iterable[List[str]]):
+        self.records: List[Dict[str, str]] = []
+        prefixes: Dict[int, List[Tuple[int, int, int]]] = {4: [], 6: []}
+        digest = hashlib.sha256()
+        for row in rows:
+            network = ipaddress.ip_network(row[0].strip(), strict=False)
+            record = dict(zip(FIELDS, row))
+            record["prefix"] = str(network)
+            prefixes[network.version].append(
+                (int(network.network_address), int(network.broadcast_address), len(self.records))
+            )
+            self.records.append(record)
+            digest.update(",".join(row).encode())
+        self.version = digest.hexdigest()[:16]
+
+        # Scalar lookups bisect plain lists (faster than numpy for one
+        # value, and IPv6 bounds need 128-bit ints); bulk IPv4 lookups use
+        # uint64 copies of the same intervals
+        self.intervals = {version: flatten(family_prefixes) for version, family_prefixes in prefixes.items()}
+        starts, ends, records = self.intervals[4]
+        self.v4_starts = np.array(starts, dtype=np.uint64)
+        self.v4_ends = np.array(ends, dtype=np.uint64)
+        self.v4_records = np.array(records, dtype=np.int64)
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "IPRangeIndex":
+        return cls(load_ip_ranges(path))
+
+    def lookup(self, ip: str) -> Optional[Dict[str, str]]:
+        """Record of the longest matching prefix, or None (also for invalid addresses)"""
+        parsed = parse_address(ip)
+        if parsed is None:
+            return None
+        version, value = parsed
+        starts, ends, records = self.intervals[version]
+        position = bisect.bisect_right(starts, value) - 1
+        if position >= 0 and value <= ends[position]:
+            return self.records[records[position]]
+        return None
+
+    def lookup_many(self, addresses: np.ndarray) -> np.ndarray:
+        """Record index (into ``records``) per IPv4 address given as integers; -1 where unmatched"""
+        addresses = np.asarray(addresses).astype(np.uint64, copy=False)
+        if not len(self.v4_starts):
+            return np.full(len(addresses), -1, dtype=np.int64)
+        positions = np.searchsorted(self.v4_starts, addresses, side="right").astype(np.int64) - 1
+        clipped = np.maximum(positions, 0)
+        matched = (positions >= 0) & (addresses <= self.v4_ends[clipped])
+        return np.where(matched, self.v4_records[clipped], -1)
+
+    def __len__(self) -> int:
+        return len(self.records)
@@ -0,0 +1,487 @@
+"""
+ML Inference Module for AbEthiopia Cyber Intelligence Platform
+CPU-only URL classification. Each worker loads one model at startup;
+concurrent requests submit feature rows (URLBatch.features()) to a
+micro-batcher, which gathers them until ML_BATCH_MAX_SIZE rows or
+ML_BATCH_MAX_WAIT seconds and scores them in one forward pass on the
+inference pool.
+
+Model formats (chosen by file extension):
+    .npz   NumPy-only; kind "linear" (logistic regression: weights, bias,
+           optional mean / scale for standardization) or kind "trees"
+           (gradient-boosted trees as flat node arrays: feature, threshold,
+           left, right, value, roots, plus base_score and learning_rate;
+           a node goes left when x[feature] <= threshold, left == -1 marks
+           a leaf). Both may carry feature_names, a subset of
+           url_scoring.FEATURE_NAMES; save_linear_model() and
+           save_tree_model() write them.
+    .onnx  Any classifier exported to ONNX (TensorFlow, PyTorch, sklearn
+           without ZipMap) taking one float32 input of FEATURE_NAMES
+           columns; needs onnxruntime. A "feature_names" metadata entry
+           (comma-separated) selects other columns.
+
+Usage:
+    python -m app.ml_inference info PATH
+    python -m app.ml_inference benchmark [PATH] [--requests N] [--rows N]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import ML_BATCH_SIZE, ML_INFERENCE_SECONDS, ML_REQUEST_SECONDS
+from app.executor import PoolSaturatedError, dispatcher
+from app.url_scoring import FEATURE_NAMES
+
+try:
+    import onnxruntime
+except ImportError:  # optional: pip install onnxruntime
+    onnxruntime = None
+
+class ModelError(Exception):
+    """Raised for a model file that can't be loaded or doesn't fit the features"""
+
+def file_version(path: str) -> str:
+    with open(path, "rb") as model_file:
+        return hashlib.sha256(model_file.read()).hexdigest()[:12]
+
+def feature_columns(names: Sequence[str]) -> np.ndarray:
+    """Columns of the feature matrix a model was trained on"""
+    unknown = [name for name in names if name not in FEATURE_NAMES]
+    if unknown:
+        raise ModelError(f"Unknown features: {', '.join(unknown)}")
+    return np.array([FEATURE_NAMES.index(name) for name in names], dtype=np.intp)
+
+def sigmoid(margins: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(margins, -500, 500)))
+
+class LinearModel:
+    kind = "linear"
+
+    def __init__(self, weights: np.ndarray, bias: float, feature_names: Sequence[str] = FEATURE_NAMES,
+                 mean: Optional[np.ndarray] = None, scale: Optional[np.ndarray] = None):
+        self.feature_names = list(feature_names)
+        self.columns = feature_columns(self.feature_names)
+        weights = np.asarray(weights, dtype=np.float64).ravel()
+        if len(weights) != len(self.columns):
+            raise ModelError(f"{len(weights)} weights for {len(self.columns)} features")
+        # Standardization folds into the weights: w.(x - m)/s + b = (w/s).x + (b - w.m/s)
+        if scale is not None:
+            weights = weights / np.asarray(scale, dtype=np.float64)
+        if mean is not None:
+            bias = float(bias) - float(weights @ np.asarray(mean, dtype=np.float64))
+        self.weights = weights
+        self.bias = float(bias)
+
+    def predict(self, matrix: np.ndarray) -> np.ndarray:
+        """Malicious probability of each row"""
+        return sigmoid(matrix[:, self.columns].astype(np.float64) @ self.weights + self.bias)
+
+class TreeEnsemble:
+    kind = "trees"
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray, right: np.ndarray,
+                 value: np.ndarray, roots: np.ndarray, base_score: float = 0.0, learning_rate: float = 1.0,
+                 feature_names: Sequence[str] = FEATURE_NAMES):
+        self.feature_names = list(feature_names)
+        columns = feature_columns(self.feature_names)
+        self.left = np.asarray(left, dtype=np.intp)
+        self.right = np.asarray(right, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        nodes = len(self.left)
+        if not (len(feature) == len(threshold) == len(right) == len(value) == nodes) or not len(self.roots):
+            raise ModelError("Tree arrays differ in length or there are no trees")
+        feature = np.where(self.left < 0, 0, np.asarray(feature, dtype=np.intp))
+        if max(self.left.max(), self.right.max(), self.roots.max()) >= nodes or self.roots.min() < 0:
+            raise ModelError("Tree node index out of range")
+        if feature.min() < 0 or feature.max() >= len(columns):
+            raise ModelError("Tree feature index out of range")
+        # Leaves keep a valid (unused) column so the traversal can index every node
+        self.feature = columns[feature]
+        self.base_score = float(base_score)
+        self.learning_rate = float(learning_rate)
+        self.depth = self.max_depth()
+
+    def max_depth(self) -> int:
+        depth = 0
+        level = np.unique(self.roots)
+        while True:
+            internal = level[self.left[level] >= 0]
+            if not len(internal):
+                return depth
+            depth += 1
+            if depth > len(self.left):
+                raise ModelError("Trees contain a cycle")
+            level = np.unique(np.concatenate((self.left[internal], self.right[internal])))
+
+    def predict(self, matrix: np.ndarray) -> np.ndarray:
+        """Malicious probability of each row: every row walks every tree at
+        once, one level per step"""
+        count = len(matrix)
+        rows = np.arange(count)[:, None]
+        nodes = np.broadcast_to(self.roots, (count, len(self.roots))).copy()
+        for _ in range(self.depth):
+            goes_left = matrix[rows, self.feature[nodes]] <= self.threshold[nodes]
+            children = np.where(goes_left, self.left[nodes], self.right[nodes])
+            nodes = np.where(self.left[nodes] < 0, nodes, children)
+        return sigmoid(self.base_score + self.learning_rate * self.value[nodes].sum(axis=1))
+
+class OnnxModel:
+    kind = "onnx"
+
+    def __init__(self, path: str):
+        if onnxruntime is None:
+            raise ModelError("ONNX models need onnxruntime (pip install onnxruntime)")
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = settings.ML_INFERENCE_THREADS
+        options.inter_op_num_threads = 1
+        try:
+            self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        except Exception as e:
+            raise ModelError(f"Could not load ONNX model: {e}")
+        self.input_name = self.session.get_inputs()[0].name
+        names = self.session.get_modelmeta().custom_metadata_map.get("feature_names")
+        self.feature_names = [name.strip() for name in names.split(",")] if names else list(FEATURE_NAMES)
+        self.columns = feature_columns(self.feature_names)
+
+    def predict(self, matrix: np.ndarray) -> np.ndarray:
+        """Malicious probability of each row: the last 2-D output's positive
+        class column (a probability output), else the first output"""
+        outputs = self.session.run(None, {self.input_name: matrix[:, self.columns].astype(np.float32)})
+        for output in reversed(outputs):
+            if isinstance(output, np.ndarray) and output.ndim == 2 and output.dtype.kind == "f":
+                return output[:, -1].astype(np.float64)
+        return np.asarray(outputs[0], dtype=np.float64).ravel()
+
+def save_linear_model(path: str, weights: Sequence[float], bias: float,
+                      feature_names: Sequence[str] = FEATURE_NAMES,
+                      mean: Optional[Sequence[float]] = None, scale: Optional[Sequence[float]] = None):
+    arrays = {"kind": np.array("linear"), "weights": np.asarray(weights, dtype=np.float64),
+              "bias": np.array(bias, dtype=np.float64), "feature_names": np.array(list(feature_names))}
+    if mean is not None:
+        arrays["mean"] = np.asarray(mean, dtype=np.float64)
+    if scale is not None:
+        arrays["scale"] = np.asarray(scale, dtype=np.float64)
+    with open(path, "wb") as model_file:
+        np.savez(model_file, **arrays)
+
+def save_tree_model(path: str, feature: Sequence[int], threshold: Sequence[float], left: Sequence[int],
+                    right: Sequence[int], value: Sequence[float], roots: Sequence[int],
+                    base_score: float = 0.0, learning_rate: float = 1.0,
+                    feature_names: Sequence[str] = FEATURE_NAMES):
+    with open(path, "wb") as model_file:
+        np.savez(model_file, kind=np.array("trees"), feature=np.asarray(feature, dtype=np.int32),
+                 threshold=np.asarray(threshold, dtype=np.float32), left=np.asarray(left, dtype=np.int32),
+                 right=np.asarray(right, dtype=np.int32), value=np.asarray(value, dtype=np.float64),
+                 roots=np.asarray(roots, dtype=np.int32), base_score=np.array(base_score, dtype=np.float64),
+                 learning_rate=np.array(learning_rate, dtype=np.float64),
+                 feature_names=np.array(list(feature_names)))
+
+def load_npz_model(path: str):
+    try:
+        with np.load(path, allow_pickle=False) as arrays:
+            fields = {name: arrays[name] for name in arrays.files}
+    except (OSError, ValueError) as e:
+        raise ModelError(f"Could not read model file: {e}")
+    kind = str(fields.pop("kind", "linear"))
+    names = [str(name) for name in fields.pop("feature_names", FEATURE_NAMES)]
+    try:
+        if kind == "linear":
+            return LinearModel(fields["weights"], float(fields["bias"]), names,
+                               fields.get("mean"), fields.get("scale"))
+        if kind == "trees":
+            return TreeEnsemble(fields["feature"], fields["threshold"], fields["left"], fields["right"],
+                                fields["value"], fields["roots"], float(fields.get("base_score", 0.0)),
+                                float(fields.get("learning_rate", 1.0)), names)
+    except KeyError as e:
+        raise ModelError(f"{kind} model is missing {e}")
+    raise ModelError(f"Unknown model kind: {kind}")
+
+def load_model(path: str):
+    """LinearModel / TreeEnsemble / OnnxModel for a model file, tagged with
+    its name and a content version"""
+    if path.endswith(".onnx"):
+        model = OnnxModel(path)
+    elif path.endswith(".npz"):
+        model = load_npz_model(path)
+    else:
+        raise ModelError(f"Unsupported model format: {path} (expected .npz or .onnx)")
+    model.name = os.path.splitext(os.path.basename(path))[0]
+    model.version = file_version(path)
+    # One forward pass up front, so a model that can't score fails here
+    model.predict(np.zeros((1, len(FEATURE_NAMES)), dtype=np.float32))
+    return model
+
+class InferenceEngine:
+    """The worker's URL model behind a micro-batcher. A request's rows are
+    never split across passes, so a large request may exceed max_batch_size."""
+
+    def __init__(self, max_batch_size: Optional[int] = None, max_wait: Optional[float] = None,
+                 max_queue_rows: Optional[int] = None):
+        self.max_batch_size = max_batch_size or settings.ML_BATCH_MAX_SIZE
+        self.max_wait = settings.ML_BATCH_MAX_WAIT if max_wait is None else max_wait
+        self.max_queue_rows = max_queue_rows or settings.ML_QUEUE_MAX_ROWS
+        self.threshold = settings.ML_MALICIOUS_THRESHOLD
+        self.model = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.queued_rows = 0
+        # Failures are logged once per outage, not once per batch
+        self.healthy = True
+
+    @property
+    def version(self) -> str:
+        """Model version, or "" with no model; part of the URL verdict cache version"""
+        return self.model.version if self.model is not None else ""
+
+    async def start(self, path: Optional[str] = None):
+        """Load the model (if there is one) and start batching"""
+        path = settings.ML_URL_MODEL_PATH if path is None else path
+        if not path or not os.path.exists(path):
+            print(f"⚠️  No URL model at {path or '(unset)'}, ML scoring disabled")
+            return
+        try:
+            model = await dispatcher.run("inference", load_model, path)
+        except (ModelError, OSError) as e:
+            print(f"⚠️  URL model load failed, ML scoring disabled: {e}")
+            return
+        self.model = model
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self.run())
+        print(f"✅ URL model loaded: {model.name} ({model.kind}, version {model.version})")
+
+    async def predict(self, matrix: np.ndarray) -> np.ndarray:
+        """Malicious probability of each row of a feature matrix"""
+        if self.model is None:
+            raise ModelError("No URL model loaded")
+        if self.queued_rows + len(matrix) > self.max_queue_rows:
+            raise PoolSaturatedError("inference queue is saturated")
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((matrix, future, time.monotonic()))
+        self.queued_rows += len(matrix)
+        return await future
+
+    async def annotate(self, analyses: List[Dict[str, Any]],
+                       matrix: np.ndarray) -> Tuple[List[Dict[str, Any]], bool]:
+        """Adds ml_analysis to each analysis (matrix row for row); returns
+        (analyses, scored). Scoring is advisory: if it fails, the analyses
+        are returned without it and scored is False, so callers don't
+        cache them as this model's verdicts."""
+        try:
+            scores = await self.predict(matrix)
+        except (ModelError, PoolSaturatedError):
+            return analyses, False
+        except Exception as e:
+            if self.healthy:
+                print(f"⚠️  URL model inference failed, analyses go out unscored until it recovers: {e}")
+                self.healthy = False
+            return analyses, False
+        if not self.healthy:
+            print("✅ URL model inference recovered")
+            self.healthy = True
+        for analysis, score in zip(analyses, scores.tolist()):
+            analysis["ml_analysis"] = {
+                "model": self.model.name,
+                "version": self.model.version,
+                "malicious_probability": round(score, 4),
+                "verdict": "malicious" if score >= self.threshold else "benign"
+            }
+        return analyses, True
+
+    async def run(self):
+        while True:
+            await self.forward(await self.next_batch())
+
+    async def next_batch(self) -> List[Tuple[np.ndarray, asyncio.Future, float]]:
+        """Requests up to max_batch_size rows, or whatever arrived within
+        max_wait of the first"""
+        loop = asyncio.get_running_loop()
+        requests = [await self.queue.get()]
+        rows = len(requests[0][0])
+        deadline = loop.time() + self.max_wait
+        while rows < self.max_batch_size:
+            try:
+                request = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            requests.append(request)
+            rows += len(request[0])
+        self.queued_rows -= rows
+        return requests
+
+    async def forward(self, requests: List[Tuple[np.ndarray, asyncio.Future, float]]):
+        """One forward pass over every request's rows"""
+        model = self.model
+        matrix = requests[0][0] if len(requests) == 1 else np.concatenate([rows for rows, _, _ in requests])
+        started = time.monotonic()
+        try:
+            scores = await dispatcher.run("inference", model.predict, matrix)
+        except Exception as e:
+            for _, future, _ in requests:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finished = time.monotonic()
+        ML_BATCH_SIZE.labels(model=model.name).observe(len(matrix))
+        ML_INFERENCE_SECONDS.labels(model=model.name).observe(finished - started)
+        offset = 0
+        for rows, future, submitted in requests:
+            # A caller that went away has a cancelled future
+            if not future.done():
+                future.set_result(scores[offset:offset + len(rows)])
+                ML_REQUEST_SECONDS.labels(model=model.name).observe(finished - submitted)
+            offset += len(rows)
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        while self.queue is not None and not self.queue.empty():
+            self.queue.get_nowait()[1].cancel()
+        self.queued_rows = 0
+        self.model = None
+
+    def stats(self) -> Dict[str, Any]:
+        if self.model is None:
+            return {"loaded": False}
+        return {
+            "loaded": True,
+            "name": self.model.name,
+            "kind": self.model.kind,
+            "version": self.model.version,
+            "features": self.model.feature_names,
+            "max_batch_size": self.max_batch_size,
+            "max_wait": self.max_wait,
+            "queued_rows": self.queued_rows,
+            "healthy": self.healthy
+        }
+
+url_model = InferenceEngine()
+
+# Benchmark
+
+def synthetic_tree_model(path: str, trees: int = 100, depth: int = 4, seed: int = 7):
+    """Random complete trees over FEATURE_NAMES, saved as a trees .npz"""
+    generator = np.random.default_rng(seed)
+    per_tree = 2 ** (depth + 1) - 1
+    local = np.arange(per_tree)
+    internal = local < 2 ** depth - 1
+    offsets = np.repeat(np.arange(trees) * per_tree, per_tree)
+    left = np.where(np.tile(internal, trees), offsets + np.tile(2 * local + 1, trees), -1)
+    right = np.where(np.tile(internal, trees), offsets + np.tile(2 * local + 2, trees), -1)
+    save_tree_model(path, generator.integers(0, len(FEATURE_NAMES), trees * per_tree),
+                    generator.uniform(0, 50, trees * per_tree), left, right,
+                    generator.normal(0, 0.1, trees * per_tree), np.arange(trees) * per_tree,
+                    base_score=-1.0, learning_rate=0.1)
+
+def benchmark(path: Optional[str], requests: int, rows: int) -> int:
+    """Concurrent requests of a few rows each: one forward pass per request
+    against the micro-batcher"""
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    def percentile(latencies: List[float], fraction: float) -> float:
+        return sorted(latencies)[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+
+    async def timed_requests(score) -> Tuple[float, List[float], np.ndarray]:
+        latencies = []
+
+        async def one(matrix: np.ndarray) -> np.ndarray:
+            submitted = time.perf_counter()
+            result = await score(matrix)
+            latencies.append(time.perf_counter() - submitted)
+            return result
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one(matrix) for matrix in matrices))
+        return time.perf_counter() - started, latencies, np.concatenate(results)
+
+    async def run(model) -> int:
+        # The queue limit is for production traffic, not this burst
+        engine = InferenceEngine(max_queue_rows=requests * rows)
+        engine.model = model
+        engine.queue = asyncio.Queue()
+        engine.task = asyncio.create_task(engine.run())
+        # Unbatched requests would overflow the inference pool's queue; this
+        # executor has as many workers but no bound
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=settings.INFERENCE_POOL_WORKERS)
+        await loop.run_in_executor(executor, model.predict, matrices[0])
+        await dispatcher.run("inference", model.predict, matrices[0])
+        single_seconds, single_latencies, expected = await timed_requests(
+            lambda matrix: loop.run_in_executor(executor, model.predict, matrix))
+        executor.shutdown()
+        batched_seconds, batched_latencies, actual = await timed_requests(engine.predict)
+        await engine.stop()
+
+        total = requests * rows
+        print(f"{model.name} ({model.kind}): {requests} concurrent requests x {rows} rows")
+        for label, seconds, latencies in (("one pass per request", single_seconds, single_latencies),
+                                          ("micro-batched", batched_seconds, batched_latencies)):
+            print(f"  {label + ':':22}{seconds:.3f}s ({total / seconds:,.0f} rows/s), "
+                  f"p50 {percentile(latencies, 0.5):.1f}ms, p99 {percentile(latencies, 0.99):.1f}ms")
+        print(f"  micro-batching is {single_seconds / batched_seconds:.1f}x faster "
+              f"(max batch {engine.max_batch_size} rows, max wait {engine.max_wait * 1000:.1f}ms)")
+        return 0 if np.allclose(expected, actual) else 1
+
+    generator = np.random.default_rng(7)
+    matrices = [generator.uniform(0, 60, (rows, len(FEATURE_NAMES))).astype(np.float32) for _ in range(requests)]
+    try:
+        if path:
+            return asyncio.run(run(load_model(path)))
+        with tempfile.TemporaryDirectory() as directory:
+            model_path = os.path.join(directory, "synthetic_trees.npz")
+            synthetic_tree_model(model_path)
+            return asyncio.run(run(load_model(model_path)))
+    finally:
+        dispatcher.shutdown()
+
+def info(path: str) -> int:
+    try:
+        model = load_model(path)
+    except (ModelError, OSError) as e:
+        print(f"⚠️  {e}")
+        return 1
+    print(f"{model.name}: {model.kind} model, version {model.version}")
+    print(f"  features: {', '.join(model.feature_names)}")
+    if isinstance(model, TreeEnsemble):
+        print(f"  {len(model.roots)} trees, {len(model.left)} nodes, depth {model.depth}")
+    return 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.ml_inference",
+                                     description="Local URL model inference")
+    commands = parser.add_subparsers(dest="command", required=True)
+    describe = commands.add_parser("info", help="load a model file and describe it")
+    describe.add_argument("path")
+    bench = commands.add_parser("benchmark", help="compare micro-batched inference with one pass per request "
+                                                  "(a synthetic tree ensemble without PATH)")
+    bench.add_argument("path", nargs="?")
+    bench.add_argument("--requests", type=int, default=5000)
+    bench.add_argument("--rows", type=int, default=1)
+    args = parser.parse_args(argv)
+    if args.command == "info":
+        return info(args.path)
+    return benchmark(args.path, args.requests, args.rows)
+
+if __name__ == "__main__":
+    sys.exit(main())
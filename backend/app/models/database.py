@@ -1,15 +1,44 @@
-from sqlalchemy import Column, String, Integer, DateTime, Boolean, Float, JSON, Text, ForeignKey
+from sqlalchemy import BigInteger, Column, String, Integer, DateTime, Boolean, Float, JSON, Text, ForeignKey, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+import os
+import time
 import uuid
 from app.core.database import Base
 
+def uuid7() -> uuid.UUID:
+    """Time-ordered UUID (RFC 9562 version 7): 48-bit Unix milliseconds,
+    12 bits of sub-millisecond time, then 62 random bits"""
+    milliseconds, nanoseconds = divmod(time.time_ns(), 1_000_000)
+    fraction = nanoseconds * 4096 // 1_000_000
+    random_bits = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    # Version 7 and the RFC 4122 variant
+    return uuid.UUID(int=milliseconds << 80 | 0x7 << 76 | fraction << 64 | 0x2 << 62 | random_bits)
+
 def generate_uuid():
-    return str(uuid.uuid4())
+    # Successive ids sort together, so inserts append to the right edge of
+    # the primary key index instead of landing on random pages
+    return str(uuid7())
 
 class ThreatAnalysis(Base):
     __tablename__ = "threat_analyses"
+    # Monthly range partitions on PostgreSQL (see app.partitions); other
+    # databases get a plain table. Partitioned tables need the partition
+    # key in every unique index, hence the (id, created_at) primary key.
+    __table_args__ = (
+        # History of a file, most recent first, answered from the index alone
+        Index("ix_threat_analyses_sha256_created", "file_hash_sha256", text("created_at DESC"),
+              postgresql_include=["verdict", "risk_level", "confidence_score"],
+              postgresql_where=text("file_hash_sha256 IS NOT NULL")),
+        # Targets are unbounded text (long URLs would overflow a B-tree
+        # entry), so equality lookups go through a hash index
+        Index("ix_threat_analyses_target", "target", postgresql_using="hash"),
+        # Time-range scans and per-type counts
+        Index("ix_threat_analyses_created", text("created_at DESC"), "analysis_type",
+              postgresql_include=["verdict", "risk_level", "confidence_score", "processing_time"]),
+        {"postgresql_partition_by": "RANGE (created_at)"}
+    )
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
     analysis_type = Column(String(50), nullable=False)
@@ -28,7 +57,7 @@ class ThreatAnalysis(Base):
     opencti_result = Column(JSON, nullable=True)
     misp_result = Column(JSON, nullable=True)
     
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     processing_time = Column(Float, nullable=True)
 
@@ -36,12 +65,59 @@ class SystemMetrics(Base):
     __tablename__ = "system_metrics"
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     
     threats_analyzed = Column(Integer, default=0)
     threats_analyzed_today = Column(Integer, default=0)
+    detections_today = Column(Integer, default=0)
     average_processing_time = Column(Float, default=0.0)
-    detection_accuracy = Column(Float, default=0.0)
+    # Needs labelled outcomes, which aren't recorded; left empty
+    detection_accuracy = Column(Float, nullable=True)
+    mean_confidence = Column(Float, nullable=True)
     
     active_models = Column(JSON, nullable=True)
     system_status = Column(String(20), default="healthy")
+
+class ScanJob(Base):
+    """A queued or finished network scan (app.scan_jobs)"""
+    __tablename__ = "scan_jobs"
+    __table_args__ = (
+        # Workers claim the oldest queued job and look for expired leases
+        Index("ix_scan_jobs_status_id", "status", "id"),
+    )
+    
+    # UUIDv7, so id order is submission order
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    status = Column(String(20), nullable=False, default="queued")
+    targets = Column(JSON, nullable=False)
+    # A port profile name, or custom ports as a "22,80,8000-8100" spec
+    # (older jobs: a list of ports); neither means SCAN_PORT_PROFILE
+    profile = Column(String(20), nullable=True)
+    ports = Column(JSON, nullable=True)
+    
+    hosts_total = Column(Integer, nullable=False, default=0)
+    hosts_scanned = Column(Integer, nullable=False, default=0)
+    hosts_up = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    
+    # The worker running the job renews heartbeat_at; runs so far in attempts
+    worker = Column(String(100), nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+class ScanResult(Base):
+    """One live host found by a scan job"""
+    __tablename__ = "scan_results"
+    __table_args__ = (
+        Index("ix_scan_results_job_id", "job_id", "id"),
+    )
+    
+    # Increasing, so results page (and SSE streams resume) by id
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    job_id = Column(String(36), ForeignKey("scan_jobs.id", ondelete="CASCADE"), nullable=False)
+    ip = Column(String(45), nullable=False)
+    result = Column(JSON, nullable=False)
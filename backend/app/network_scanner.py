@@ -2,70 +2,326 @@
 Network Scanner Module for AbEthiopia Cyber Intelligence Platform
 """
 
-import subprocess
+import asyncio
+import ipaddress
+import itertools
 import socket
-from typing import Dict, List, Any
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Any, Optional, Tuple
+
+from app.core.config import settings
+from app.dns_resolver import reverse_dns
+from app.host_discovery import ReachabilityProber
+from app.port_profiles import port_profiles
+from app.service_fingerprint import fingerprint
+
+# Address blocks reported by get_network_info; anything else is "Public"
+NETWORK_TYPES = [
+    (ipaddress.ip_network(block), kind) for block, kind in (
+        ("10.0.0.0/8", "Private"), ("172.16.0.0/12", "Private"), ("192.168.0.0/16", "Private"),
+        ("127.0.0.0/8", "Loopback"), ("169.254.0.0/16", "Link-local"),
+        ("fc00::/7", "Private"), ("::1/128", "Loopback"), ("fe80::/10", "Link-local")
+    )
+]
+
+class RttEstimator:
+    """Connect timeout for one host from its measured round trips, as TCP
+    computes its retransmission timeout (RFC 6298): srtt + 4 * rttvar,
+    kept between SCAN_MIN_PORT_TIMEOUT and the maximum. Until the first
+    sample the maximum is used. Accepted and refused connects are samples;
+    timeouts are not, since a filtered port says nothing about the path."""
+    
+    def __init__(self, maximum: float, initial_ms: Optional[float] = None):
+        self.maximum = maximum
+        self.minimum = min(settings.SCAN_MIN_PORT_TIMEOUT, maximum)
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+        if initial_ms is not None:
+            self.sample(initial_ms / 1000)
+    
+    def sample(self, rtt: float):
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+    
+    def timeout(self) -> float:
+        if self.srtt is None:
+            return self.maximum
+        return min(self.maximum, max(self.minimum, self.srtt + 4 * self.rttvar))
 
 class NetworkScanner:
-    def __init__(self):
-        self.common_ports = [21, 22, 23, 25, 53, 80, 110, 443, 993, 995, 1433, 3306, 3389, 5432, 8000, 8080, 8443, 9000, 3000]
+    def __init__(self, max_concurrency: Optional[int] = None, port_timeout: Optional[float] = None,
+                 ports: Optional[List[int]] = None):
+        # Ports scanned when a call names none (SCAN_PORT_PROFILE by default)
+        self.ports = port_profiles.resolve() if ports is None else ports
+        # Port probes run concurrently; these bound the open sockets and the
+        # time a single filtered port may hold one of them
+        self.max_concurrency = max_concurrency or settings.SCAN_MAX_CONCURRENCY
+        self.port_timeout = port_timeout or settings.SCAN_PORT_TIMEOUT
+        self.prober = ReachabilityProber()
     
     def scan_ip(self, ip_address: str) -> Dict[str, Any]:
         try:
-            socket.inet_aton(ip_address)
-            
-            scan_results = {
-                "ip": ip_address,
-                "reachable": self.check_reachability(ip_address),
-                "open_ports": self.scan_ports(ip_address),
-                "hostname": self.reverse_dns_lookup(ip_address),
-                "network_info": self.get_network_info(ip_address)
-            }
-            
-            return scan_results
-            
-        except socket.error:
+            # IPv4 or IPv6, in canonical form
+            ip_address = str(ipaddress.ip_address(ip_address))
+        except ValueError:
+            return {"error": "Invalid IP address"}
+        
+        scan_results = {
+            "ip": ip_address,
+            "reachable": self.check_reachability(ip_address),
+            "open_ports": self.scan_ports(ip_address),
+            "hostname": self.reverse_dns_lookup(ip_address),
+            "network_info": self.get_network_info(ip_address)
+        }
+        
+        return scan_results
+    
+    async def scan_ip_async(self, ip_address: str, ports: Optional[List[int]] = None) -> Dict[str, Any]:
+        """Event-loop friendly variant of scan_ip; all probes run concurrently"""
+        try:
+            ip_address = str(ipaddress.ip_address(ip_address))
+        except ValueError:
             return {"error": "Invalid IP address"}
+        
+        reachability, open_ports, hostname = await asyncio.gather(
+            self.prober.probe(ip_address),
+            self.scan_ports_async(ip_address, ports),
+            self.reverse_dns_lookup_async(ip_address)
+        )
+        
+        return {
+            "ip": ip_address,
+            "reachable": reachability["reachable"],
+            "rtt_ms": reachability["rtt_ms"],
+            "open_ports": open_ports,
+            "hostname": hostname,
+            "network_info": self.get_network_info(ip_address)
+        }
+    
+    def expand_targets(self, target: str) -> Iterator[str]:
+        """Lazily expand a single IP, CIDR block or 'start-end' range into host addresses"""
+        count, hosts = self.target_hosts(target)
+        if count > settings.SWEEP_MAX_HOSTS:
+            raise ValueError(f"Sweep target too large: {count} addresses (limit {settings.SWEEP_MAX_HOSTS})")
+        return hosts
+    
+    def target_hosts(self, target: str) -> Tuple[int, Iterator[str]]:
+        """(number of host addresses, lazy iterator over them) for a single IP, CIDR block or 'start-end' range"""
+        target = target.strip()
+        if "-" in target:
+            start_text, end_text = (part.strip() for part in target.split("-", 1))
+            start = ipaddress.ip_address(start_text)
+            end = ipaddress.ip_address(end_text)
+            if start.version != end.version or int(end) < int(start):
+                raise ValueError("Invalid address range")
+            count = int(end) - int(start) + 1
+            hosts = (str(ipaddress.ip_address(value)) for value in range(int(start), int(end) + 1))
+        else:
+            network = ipaddress.ip_network(target, strict=False)
+            count = network.num_addresses
+            hosts = (str(host) for host in (network.hosts() if count > 2 else network))
+            if count > 2:
+                # hosts() leaves out the network and broadcast (IPv6: subnet-router) addresses
+                count -= 2 if network.version == 4 else 1
+        return count, hosts
+    
+    async def sweep(self, target: str, ports: Optional[List[int]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Discover and port-scan every host in a CIDR block or range"""
+        async for result in self.sweep_hosts(self.expand_targets(target), ports):
+            yield result
+    
+    async def sweep_hosts(self, hosts: Iterator[str],
+                          ports: Optional[List[int]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Discover and port-scan every host address from an iterator.
+        
+        Hosts are discovered in batches of DISCOVERY_BATCH_SIZE (one ICMP
+        socket per batch) and live hosts are handed to a fixed pool of
+        SWEEP_HOSTS_IN_FLIGHT port-scan workers. One semaphore bounds
+        connections across all hosts and ports, and every queue is bounded,
+        so memory stays flat regardless of the size of the target. Results
+        are yielded per host as soon as that host finishes. An error in
+        discovery or in a host's scan stops the sweep and is raised here.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        in_flight = settings.SWEEP_HOSTS_IN_FLIGHT
+        live_hosts: asyncio.Queue = asyncio.Queue(maxsize=in_flight)
+        results: asyncio.Queue = asyncio.Queue(maxsize=in_flight)
+        
+        async def discover():
+            try:
+                while True:
+                    batch = list(itertools.islice(hosts, settings.DISCOVERY_BATCH_SIZE))
+                    if not batch:
+                        break
+                    statuses = await self.prober.probe_many(batch, semaphore)
+                    for ip in batch:
+                        if statuses[ip]["reachable"]:
+                            await live_hosts.put((ip, statuses[ip]))
+                        else:
+                            await results.put(self.host_result(ip, statuses[ip], []))
+            except Exception as error:
+                await results.put(error)
+            finally:
+                for _ in range(in_flight):
+                    await live_hosts.put(None)
+        
+        async def scan_worker():
+            try:
+                while True:
+                    item = await live_hosts.get()
+                    if item is None:
+                        break
+                    ip, status = item
+                    open_ports, hostname = await asyncio.gather(
+                        self.scan_ports_async(ip, ports, semaphore=semaphore, rtt_ms=status["rtt_ms"]),
+                        self.reverse_dns_lookup_async(ip)
+                    )
+                    result = self.host_result(ip, status, open_ports)
+                    result["hostname"] = hostname
+                    await results.put(result)
+            except Exception as error:
+                await results.put(error)
+            finally:
+                await results.put(None)
+        
+        tasks = [asyncio.create_task(discover())]
+        tasks += [asyncio.create_task(scan_worker()) for _ in range(in_flight)]
+        running = in_flight
+        try:
+            while running:
+                result = await results.get()
+                if result is None:
+                    running -= 1
+                elif isinstance(result, Exception):
+                    raise result
+                else:
+                    yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def host_result(self, ip: str, status: Dict[str, Any], open_ports: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "ip": ip,
+            "reachable": status["reachable"],
+            "rtt_ms": status["rtt_ms"],
+            "open_ports": open_ports,
+            "network_info": self.get_network_info(ip)
+        }
     
     def check_reachability(self, ip: str) -> bool:
         try:
-            result = subprocess.run(
-                ["ping", "-c", "2", "-W", "1", ip],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            return result.returncode == 0
+            return asyncio.run(self.prober.probe(ip))["reachable"]
         except:
             return False
     
     def scan_ports(self, ip: str) -> List[Dict[str, Any]]:
-        open_ports = []
-        for port in self.common_ports:
-            try:
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                    sock.settimeout(1)
-                    result = sock.connect_ex((ip, port))
-                    if result == 0:
-                        service = self.get_service_name(port)
-                        open_ports.append({
-                            "port": port,
-                            "service": service,
-                            "status": "open"
-                        })
-            except:
-                continue
-        return open_ports
+        return asyncio.run(self.scan_ports_async(ip))
     
-    def get_service_name(self, port: int) -> str:
-        service_map = {
-            21: "FTP", 22: "SSH", 23: "Telnet", 25: "SMTP", 53: "DNS",
-            80: "HTTP", 110: "POP3", 443: "HTTPS", 993: "IMAPS", 995: "POP3S",
-            1433: "MSSQL", 3306: "MySQL", 3389: "RDP", 5432: "PostgreSQL",
-            8000: "HTTP-Alt", 8080: "HTTP-Proxy", 8443: "HTTPS-Alt", 
-            9000: "Jenkins", 3000: "Node.js"
+    async def scan_ports_async(self, ip: str, ports: Optional[List[int]] = None,
+                               deadline: Optional[float] = None,
+                               semaphore: Optional[asyncio.Semaphore] = None,
+                               rtt_ms: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Connect-scan the ports, then fingerprint the open ones.
+        
+        Up to max_concurrency workers pull ports from one iterator, so a full
+        1-65535 scan holds a bounded number of tasks and sockets. Each connect
+        times out after the host's adaptive timeout (see RttEstimator), seeded
+        with ``rtt_ms`` when discovery measured it. Ports not probed when
+        ``deadline`` (seconds) expires, or when the caller is cancelled, are
+        reported as closed. Pass a shared ``semaphore`` to draw from a budget
+        spanning several hosts.
+        """
+        ports = self.ports if ports is None else ports
+        if not ports:
+            return []
+        semaphore = semaphore or asyncio.Semaphore(self.max_concurrency)
+        rtt = RttEstimator(self.port_timeout, rtt_ms)
+        pending = iter(ports)
+        open_ports: List[int] = []
+        
+        async def connect_worker():
+            for port in pending:
+                if await self.probe_port(ip, port, semaphore, rtt):
+                    open_ports.append(port)
+        
+        started = time.monotonic()
+        await self.run_all([connect_worker() for _ in range(min(len(ports), self.max_concurrency))], deadline)
+        open_ports.sort()
+        
+        found: Dict[int, Dict[str, Any]] = {}
+        if settings.SCAN_BANNER_GRAB and open_ports:
+            async def grab(port: int):
+                async with semaphore:
+                    result = await fingerprint(ip, port, rtt.maximum)
+                if result is not None:
+                    found[port] = result
+            
+            remaining = None if deadline is None else max(0.0, deadline - (time.monotonic() - started))
+            await self.run_all([grab(port) for port in open_ports], remaining)
+        
+        return [self.port_result(port, found.get(port)) for port in open_ports]
+    
+    async def run_all(self, coroutines: List[Any], timeout: Optional[float]):
+        """Run coroutines concurrently for up to timeout seconds, cancelling
+        whatever is still running after that (or when cancelled)"""
+        tasks = [asyncio.create_task(coroutine) for coroutine in coroutines]
+        try:
+            await asyncio.wait(tasks, timeout=timeout)
+        finally:
+            for task in tasks:
+                task.cancel()
+        # A cancelled task only finishes on a later loop iteration; until
+        # then its state can't be read (InvalidStateError), so wait for all
+        # of them before the caller looks at what they found
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def port_result(self, port: int, found: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Entry for an open port: the fingerprinted service, or the one
+        conventionally on that port (fingerprint "port") when none matched"""
+        if found is None:
+            found = {"service": self.get_service_name(port), "product": None, "banner": None, "method": "port"}
+        result = {
+            "port": port,
+            "service": found["service"],
+            "status": "open",
+            "product": found["product"],
+            "banner": found["banner"],
+            "fingerprint": found["method"]
         }
-        return service_map.get(port, "Unknown")
+        if "tls" in found:
+            result["tls"] = found["tls"]
+        return result
+    
+    async def probe_port(self, ip: str, port: int, semaphore: asyncio.Semaphore,
+                         rtt: Optional[RttEstimator] = None) -> bool:
+        """Non-blocking TCP connect probe; True if the port accepted the connection"""
+        async with semaphore:
+            loop = asyncio.get_running_loop()
+            family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+            timeout = rtt.timeout() if rtt else self.port_timeout
+            with socket.socket(family, socket.SOCK_STREAM) as sock:
+                sock.setblocking(False)
+                started = time.monotonic()
+                try:
+                    await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), timeout)
+                except ConnectionRefusedError:
+                    # The RST took one round trip too
+                    if rtt:
+                        rtt.sample(time.monotonic() - started)
+                    return False
+                except (OSError, asyncio.TimeoutError):
+                    return False
+                if rtt:
+                    rtt.sample(time.monotonic() - started)
+                return True
+    
+    def get_service_name(self, port: int) -> str:
+        return port_profiles.service_name(port)
     
     def reverse_dns_lookup(self, ip: str) -> str:
         try:
@@ -73,15 +329,46 @@ class NetworkScanner:
         except:
             return "Unknown"
     
+    async def reverse_dns_lookup_async(self, ip: str) -> str:
+        """Non-blocking PTR lookup through the shared, cached resolver"""
+        return await reverse_dns.resolve(ip) or "Unknown"
+    
     def get_network_info(self, ip: str) -> Dict[str, str]:
-        octets = ip.split('.')
-        first_octet = int(octets[0])
-        
-        if first_octet == 10:
-            return {"type": "Private", "range": "10.0.0.0/8"}
-        elif first_octet == 172 and 16 <= int(octets[1]) <= 31:
-            return {"type": "Private", "range": "172.16.0.0/12"}
-        elif first_octet == 192 and int(octets[1]) == 168:
-            return {"type": "Private", "range": "192.168.0.0/16"}
+        """Kind of network an IPv4 or IPv6 address is in"""
+        address = ipaddress.ip_address(ip)
+        for network, kind in NETWORK_TYPES:
+            if address in network:
+                return {"type": kind, "range": str(network)}
+        return {"type": "Public", "range": "Internet"}
+
+def assess_network_threat(scan_results: dict) -> dict:
+    threat_score = 0
+    warnings = []
+    
+    if scan_results.get("reachable"):
+        threat_score += 10
+    
+    open_ports = scan_results.get("open_ports", [])
+    suspicious_ports = [23, 135, 139, 445, 1433, 3389]
+    
+    for port_info in open_ports:
+        port = port_info["port"]
+        if port in suspicious_ports:
+            threat_score += 20
+            warnings.append(f"Suspicious port open: {port} ({port_info['service']})")
         else:
-            return {"type": "Public", "range": "Internet"}
+            threat_score += 5
+    
+    if threat_score >= 30:
+        level = "High"
+    elif threat_score >= 15:
+        level = "Medium"
+    else:
+        level = "Low"
+    
+    return {
+        "threat_score": threat_score,
+        "level": level,
+        "warnings": warnings,
+        "open_port_count": len(open_ports)
+    }
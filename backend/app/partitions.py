@@ -0,0 +1,151 @@
+"""
+Partitions Module for AbEthiopia Cyber Intelligence Platform
+Monthly range partitions of threat_analyses on PostgreSQL: partitions are
+created ahead of time, and retention detaches and drops whole months
+instead of running bulk DELETEs (no table bloat, no long vacuum).
+
+Partitions are named threat_analyses_pYYYYMM and cover
+[YYYY-MM-01, next month) in UTC.
+
+Usage:
+    python -m app.partitions status
+    python -m app.partitions maintain [--retention-days N]
+"""
+
+import argparse
+import asyncio
+import re
+import sys
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.models.database import ThreatAnalysis
+
+PARENT = ThreatAnalysis.__tablename__
+PARTITION_NAME = re.compile(rf"^{PARENT}_p(\d{{4}})(\d{{2}})$")
+
+# pg_advisory_xact_lock key, so concurrent workers don't race on DDL
+MAINTENANCE_LOCK = 0x6F637061  # "ocpa"
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_p{month:%Y%m}"
+
+def is_partitioned(connection) -> bool:
+    if connection.dialect.name != "postgresql":
+        return False
+    return connection.execute(
+        text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"), {"table": PARENT}
+    ).scalar() or False
+
+def list_partitions(connection) -> List[Tuple[str, date]]:
+    """(name, first day of month) for each monthly partition, oldest first"""
+    names = connection.execute(text(
+        "SELECT child.relname FROM pg_inherits"
+        " JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+        " WHERE pg_inherits.inhparent = to_regclass(:table)"
+    ), {"table": PARENT}).scalars()
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+def create_partition(connection, month: date):
+    # Bounds are explicit UTC so they don't depend on the session time zone
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT}"
+        f" FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{add_months(month, 1):%Y-%m-%d} 00:00:00+00')"
+    ))
+
+def ensure_partitions(connection, ahead: Optional[int] = None, today: Optional[date] = None) -> List[str]:
+    """Create partitions for this month and the next `ahead` months; returns the new ones"""
+    ahead = settings.ANALYSIS_PARTITIONS_AHEAD if ahead is None else ahead
+    current = month_start(today or datetime.now(timezone.utc).date())
+    existing = {name for name, _ in list_partitions(connection)}
+    created = []
+    for offset in range(ahead + 1):
+        month = add_months(current, offset)
+        if partition_name(month) not in existing:
+            create_partition(connection, month)
+            created.append(partition_name(month))
+    return created
+
+def drop_expired_partitions(connection, retention_days: Optional[int] = None,
+                            today: Optional[date] = None) -> List[str]:
+    """Drop partitions whose every row is older than retention_days (0 keeps everything)"""
+    retention_days = settings.ANALYSIS_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return []
+    cutoff = (today or datetime.now(timezone.utc).date()) - timedelta(days=retention_days)
+    dropped = []
+    for name, month in list_partitions(connection):
+        if add_months(month, 1) > cutoff:
+            break
+        # Detaching first keeps the parent's lock brief; the drop is then
+        # just unlinking files, however many rows the month held
+        connection.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+        connection.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    return dropped
+
+def maintain_partitions(engine, retention_days: Optional[int] = None) -> Dict[str, Any]:
+    """Create upcoming partitions and drop expired ones (blocking; run on the database pool)"""
+    with engine.begin() as connection:
+        if not is_partitioned(connection):
+            return {"partitioned": False, "created": [], "dropped": []}
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MAINTENANCE_LOCK})
+        created = ensure_partitions(connection)
+        dropped = drop_expired_partitions(connection, retention_days)
+    return {"partitioned": True, "created": created, "dropped": dropped}
+
+async def maintain_periodically(engine, run_blocking, interval: Optional[float] = None):
+    """Background task: partition maintenance every interval seconds via run_blocking(fn)"""
+    interval = interval or settings.ANALYSIS_MAINTENANCE_INTERVAL
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            result = await run_blocking(lambda: maintain_partitions(engine))
+            if result["dropped"]:
+                print(f"✅ Dropped expired analysis partitions: {', '.join(result['dropped'])}")
+        except Exception as e:
+            print(f"⚠️  Analysis partition maintenance failed: {e}")
+
+def main(argv=None) -> int:
+    from app.core.database import engine
+
+    parser = argparse.ArgumentParser(prog="python -m app.partitions",
+                                     description="Manage monthly partitions of threat_analyses")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="list partitions")
+    maintain = commands.add_parser("maintain", help="create upcoming partitions and drop expired ones")
+    maintain.add_argument("--retention-days", type=int, default=settings.ANALYSIS_RETENTION_DAYS)
+    args = parser.parse_args(argv)
+
+    if args.command == "maintain":
+        result = maintain_partitions(engine, args.retention_days)
+    else:
+        with engine.connect() as connection:
+            result = {"partitioned": is_partitioned(connection)}
+            if result["partitioned"]:
+                result["partitions"] = [name for name, _ in list_partitions(connection)]
+    if not result["partitioned"]:
+        print(f"{PARENT} is not partitioned (PostgreSQL only)", file=sys.stderr)
+        return 1
+    for key in ("partitions", "created", "dropped"):
+        if key in result:
+            print(f"{key}: {', '.join(result[key]) or 'none'}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Pattern Index Module for AbEthiopia Cyber Intelligence Platform
+Aho-Corasick index over protected domains and their typosquatting
+variants, with host-anchored domain matching
+
+Usage:
+    python -m app.pattern_index benchmark [--brands N] [--hosts N] [--loop-sample N] [--seed N]
+"""
+
+import argparse
+import random
+import resource
+import string
+import sys
+import time
+from typing import Dict, Iterator, List, Tuple
+
+import ahocorasick
+
+def typo_variants(domain: str) -> List[str]:
+    """Fixed rewrites of a legitimate domain commonly used by typosquatters"""
+    return [
+        domain.replace('.', '-'),
+        domain.replace('.', ''),
+        domain + '-login',
+        domain + '-secure',
+        'www-' + domain
+    ]
+
+def build_automaton(patterns: Dict[str, List[int]]) -> ahocorasick.Automaton:
+    automaton = ahocorasick.Automaton()
+    for pattern, ordinals in patterns.items():
+        automaton.add_word(pattern, tuple(ordinals))
+    if len(automaton):
+        automaton.make_automaton()
+    return automaton
+
+class DomainIndex:
+    """Finds the protected domains a host belongs to, and every typo
+    variant of one in a host, with a single linear pass over a batch of
+    hosts independent of how many are indexed (or a few dict lookups for
+    one host).
+
+    Matches are reported as ordinals into ``entries``, i.e. in the same
+    (category, domain) order a nested loop over the organizations would
+    produce.
+    """
+
+    def __init__(self, organizations: Dict[str, List[str]]):
+        self.entries: List[Tuple[str, str]] = [
+            (org_type, domain) for org_type, domains in organizations.items() for domain in domains
+        ]
+        domains: Dict[str, List[int]] = {}
+        variants: Dict[str, List[int]] = {}
+        for ordinal, (_, domain) in enumerate(self.entries):
+            domains.setdefault(domain, []).append(ordinal)
+            for variant in set(typo_variants(domain)):
+                variants.setdefault(variant, []).append(ordinal)
+        self.domains = domains
+        # Only a host's last few labels can be an indexed domain
+        self.max_labels = max((domain.count(".") + 1 for domain in domains), default=0)
+        self.domain_automaton = build_automaton(domains)
+        self.variant_automaton = build_automaton(variants)
+
+    def match_host(self, host: str) -> List[int]:
+        """Ordinals of every indexed domain that is the host or a parent of it, in entry order"""
+        found = []
+        end = len(host)
+        for _ in range(self.max_labels):
+            end = host.rfind(".", 0, end)
+            ordinals = self.domains.get(host[end + 1:])
+            if ordinals:
+                found.extend(ordinals)
+            if end < 0:
+                break
+        return sorted(found) if found else found
+
+    def host_matches(self, hosts: str) -> Iterator[Tuple[int, Tuple[int, ...]]]:
+        """(end, ordinals) of every indexed domain that is one of the
+        newline-separated hosts, or a parent of it. Domains occurring
+        anywhere else in a host ('mfa.gov.et.evil.com') don't count."""
+        if not len(self.domain_automaton):
+            return
+        last = len(hosts) - 1
+        for end, ordinals in self.domain_automaton.iter(hosts):
+            start = end - len(self.entries[ordinals[0]][1])
+            if (end == last or hosts[end + 1] == "\n") and (start < 0 or hosts[start] in ".\n"):
+                yield end, ordinals
+
+    def typosquat_matches(self, hosts: str) -> Iterator[Tuple[int, Tuple[int, ...]]]:
+        """(end, ordinals) of every typo variant occurring in hosts"""
+        if len(self.variant_automaton):
+            yield from self.variant_automaton.iter(hosts)
+
+    def match_typosquats(self, text: str) -> List[int]:
+        """Ordinals of every domain one of whose typo variants occurs in text"""
+        return self.scan(self.variant_automaton, text)
+
+    def scan(self, automaton: ahocorasick.Automaton, text: str) -> List[int]:
+        if not len(automaton):
+            return []
+        found = set()
+        for _, ordinals in automaton.iter(text):
+            found.update(ordinals)
+        return sorted(found)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+def loop_match_host(entries: List[Tuple[str, str]], host: str) -> List[int]:
+    """match_host() as the nested loop it replaces"""
+    return [ordinal for ordinal, (_, domain) in enumerate(entries)
+            if host == domain or host.endswith("." + domain)]
+
+def loop_match_typosquats(entries: List[Tuple[str, str]], text: str) -> List[int]:
+    """match_typosquats() as the nested loop it replaces"""
+    return [ordinal for ordinal, (_, domain) in enumerate(entries)
+            if any(variant in text for variant in typo_variants(domain))]
+
+def synthetic_organizations(brands: int, seed: int) -> Dict[str, List[str]]:
+    generator = random.Random(seed)
+    suffixes = ["gov.et", "com.et", "edu.et", "org.et", "com", "net", "org"]
+    domains = set()
+    while len(domains) < brands:
+        label = "".join(generator.choices(string.ascii_lowercase, k=generator.randint(5, 12)))
+        domains.add(f"{label}.{generator.choice(suffixes)}")
+    ordered = sorted(domains)
+    return {category: ordered[index::4]
+            for index, category in enumerate(("government", "banking", "education", "telecom"))}
+
+def synthetic_hosts(domains: List[str], count: int, seed: int) -> List[str]:
+    """A mix of protected hosts, subdomains of them, typosquats and unrelated hosts"""
+    generator = random.Random(seed)
+    hosts = []
+    for _ in range(count):
+        domain = generator.choice(domains)
+        kind = generator.random()
+        if kind < 0.2:
+            hosts.append(domain)
+        elif kind < 0.4:
+            hosts.append(f"mail.{domain}")
+        elif kind < 0.6:
+            hosts.append(f"{generator.choice(typo_variants(domain))}.example.com")
+        else:
+            label = "".join(generator.choices(string.ascii_lowercase, k=generator.randint(6, 14)))
+            hosts.append(f"www.{label}.com")
+    return hosts
+
+def benchmark(brands: int, hosts: int, loop_sample: int, seed: int) -> int:
+    """Both lookups a URL analysis makes (match_host for the organization
+    context, match_typosquats for phishing) through the index, against
+    the nested loop over every brand on a sample of the hosts"""
+    organizations = synthetic_organizations(brands, seed)
+    started = time.perf_counter()
+    index = DomainIndex(organizations)
+    build_seconds = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    patterns = len(index.domains) + sum(len(set(typo_variants(domain))) for _, domain in index.entries)
+
+    sample = synthetic_hosts([domain for _, domain in index.entries], hosts, seed)
+    started = time.perf_counter()
+    indexed = [(index.match_host(host), index.match_typosquats(host)) for host in sample]
+    index_seconds = time.perf_counter() - started
+
+    checked = sample[:loop_sample]
+    started = time.perf_counter()
+    looped = [(loop_match_host(index.entries, host), loop_match_typosquats(index.entries, host)) for host in checked]
+    loop_seconds = time.perf_counter() - started
+    mismatches = sum(1 for left, right in zip(indexed, looped) if left != right)
+
+    per_index = index_seconds / len(sample) * 1e6
+    per_loop = loop_seconds / max(1, len(checked)) * 1e6
+    print(f"{brands} brands ({patterns} patterns), {len(sample)} hosts")
+    print(f"  index build:  {build_seconds:.2f}s, peak RSS {peak_mb:.0f} MB")
+    print(f"  index lookup: {per_index:.1f} us/host")
+    print(f"  nested loop:  {per_loop:,.0f} us/host on {len(checked)} hosts, "
+          f"{per_loop / per_index:,.0f}x slower")
+    print(f"  differing from the loop: {mismatches} of {len(checked)}")
+    return 1 if mismatches else 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.pattern_index",
+                                     description="Aho-Corasick domain index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("benchmark", help="compare index lookups with the nested loop on synthetic brands")
+    bench.add_argument("--brands", type=int, default=100000)
+    bench.add_argument("--hosts", type=int, default=20000)
+    bench.add_argument("--loop-sample", type=int, default=50)
+    bench.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+    return benchmark(args.brands, args.hosts, args.loop_sample, args.seed)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Port Profiles Module for AbEthiopia Cyber Intelligence Platform
+Named sets of TCP ports to scan (default, top-100, top-1000, full) and
+custom lists such as "22,80,8000-8100", plus the service conventionally
+found on each port. With NMAP_SERVICES_FILE (nmap's nmap-services) the
+top-N profiles follow its measured open frequencies and it names the
+ports the built-in table doesn't; otherwise the built-in tables are used.
+"""
+
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from app.core.config import settings
+
+# The original scan list, kept as the "default" profile
+DEFAULT_PORTS = [21, 22, 23, 25, 53, 80, 110, 443, 993, 995, 1433, 3306, 3389, 5432, 8000, 8080, 8443, 9000, 3000]
+
+# nmap's 100 most frequently open TCP ports, most frequent first
+TOP_PORTS = [
+    80, 23, 443, 21, 22, 25, 3389, 110, 445, 139, 143, 53, 135, 3306, 8080, 1723, 111, 995, 993, 5900,
+    1025, 587, 8888, 199, 1720, 465, 548, 113, 81, 6001, 10000, 514, 5060, 179, 1026, 2000, 8443, 8000,
+    32768, 554, 26, 1433, 49152, 2001, 515, 8008, 49154, 1027, 5666, 646, 5000, 5631, 631, 49153, 8081,
+    2049, 88, 79, 5800, 106, 2121, 1110, 49155, 6000, 513, 990, 5357, 427, 49156, 543, 544, 5101, 144, 7,
+    389, 8009, 3128, 444, 9999, 5009, 7070, 5190, 3000, 5432, 1900, 3986, 13, 1029, 9, 5051, 6646, 49157,
+    1028, 873, 1755, 2717, 4899, 9100, 119, 37
+]
+
+# Service usually listening on a port; only a guess until the service
+# fingerprint confirms it
+SERVICE_NAMES = {
+    7: "Echo", 9: "Discard", 13: "Daytime", 21: "FTP", 22: "SSH", 23: "Telnet", 25: "SMTP", 37: "Time",
+    53: "DNS", 79: "Finger", 80: "HTTP", 81: "HTTP-Alt", 88: "Kerberos", 110: "POP3", 111: "RPCbind",
+    113: "Ident", 119: "NNTP", 123: "NTP", 135: "MSRPC", 139: "NetBIOS-SSN", 143: "IMAP", 161: "SNMP",
+    179: "BGP", 389: "LDAP", 443: "HTTPS", 445: "SMB", 465: "SMTPS", 513: "Rlogin", 514: "RSH",
+    515: "LPD", 548: "AFP", 554: "RTSP", 587: "Submission", 631: "IPP", 636: "LDAPS", 873: "Rsync",
+    990: "FTPS", 993: "IMAPS", 995: "POP3S", 1080: "SOCKS", 1194: "OpenVPN", 1433: "MSSQL", 1521: "Oracle",
+    1723: "PPTP", 1883: "MQTT", 1900: "UPnP", 2049: "NFS", 2375: "Docker", 2376: "Docker-TLS",
+    3000: "HTTP-Alt", 3128: "Squid", 3306: "MySQL", 3389: "RDP", 5000: "UPnP", 5060: "SIP",
+    5432: "PostgreSQL", 5601: "Kibana", 5672: "AMQP", 5900: "VNC", 5984: "CouchDB", 6000: "X11",
+    6379: "Redis", 6443: "Kubernetes-API", 8000: "HTTP-Alt", 8008: "HTTP-Alt", 8009: "AJP",
+    8080: "HTTP-Proxy", 8081: "HTTP-Alt", 8443: "HTTPS-Alt", 8888: "HTTP-Alt", 9000: "HTTP-Alt",
+    9090: "HTTP-Alt", 9100: "JetDirect", 9200: "Elasticsearch", 9418: "Git", 10000: "Webmin",
+    11211: "Memcached", 27017: "MongoDB"
+}
+
+PROFILES = ("default", "top-100", "top-1000", "full")
+
+def parse_port_spec(spec: Any) -> List[int]:
+    """Sorted unique ports from a list of numbers or a "22,80,8000-8100"
+    string; raises ValueError"""
+    if isinstance(spec, str):
+        items: Iterable[Any] = spec.split(",")
+    elif isinstance(spec, (list, tuple)):
+        items = spec
+    else:
+        raise ValueError("ports must be a list or a comma-separated string")
+    ports = set()
+    for item in items:
+        text = str(item).strip()
+        if not text:
+            continue
+        start_text, _, end_text = text.partition("-")
+        try:
+            start, end = int(start_text), int(end_text or start_text)
+        except ValueError:
+            raise ValueError(f"Invalid port {text!r}")
+        if not 1 <= start <= end <= 65535:
+            raise ValueError(f"Invalid port range {text!r} (ports are 1-65535)")
+        ports.update(range(start, end + 1))
+    if not ports:
+        raise ValueError("No ports given")
+    return sorted(ports)
+
+def format_port_spec(ports: Sequence[int]) -> str:
+    """Sorted ports as a compact spec, e.g. "22,80,8000-8100" """
+    ranges: List[List[int]] = []
+    for port in sorted(set(ports)):
+        if ranges and port == ranges[-1][1] + 1:
+            ranges[-1][1] = port
+        else:
+            ranges.append([port, port])
+    return ",".join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
+class PortProfiles:
+    def __init__(self, ranked: Sequence[int], names: Dict[int, str]):
+        # Every port, most commonly open first; top-N is a prefix of this
+        seen = dict.fromkeys(ranked)
+        seen.update(dict.fromkeys(sorted(names)))
+        seen.update(dict.fromkeys(range(1, 65536)))
+        self.ranked = list(seen)
+        self.names = names
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "PortProfiles":
+        """NMAP_SERVICES_FILE if it exists, else the built-in tables.
+
+        Without the file, top-1000 is the top 100, then the named ports,
+        then the remaining ports in ascending order.
+        """
+        path = settings.NMAP_SERVICES_FILE if path is None else path
+        if not path or not os.path.exists(path):
+            return cls(TOP_PORTS, SERVICE_NAMES)
+        frequencies: Dict[int, float] = {}
+        names: Dict[int, str] = {}
+        with open(path, encoding="utf-8", errors="ignore") as services_file:
+            # name  port/proto  open-frequency  [# comment]
+            for line in services_file:
+                fields = line.split("#", 1)[0].split()
+                if len(fields) < 3 or not fields[1].endswith("/tcp"):
+                    continue
+                try:
+                    port, frequency = int(fields[1][:-4]), float(fields[2])
+                except ValueError:
+                    continue
+                if frequency >= frequencies.get(port, -1.0):
+                    frequencies[port] = frequency
+                    if fields[0] != "unknown":
+                        names[port] = fields[0]
+        # The built-in names win (consistent spelling); the file names the rest
+        names = {**names, **SERVICE_NAMES}
+        return cls(sorted(frequencies, key=lambda port: -frequencies[port]), names)
+
+    def ports(self, profile: str) -> List[int]:
+        if profile == "default":
+            return list(DEFAULT_PORTS)
+        if profile == "full":
+            return list(range(1, 65536))
+        if profile in ("top-100", "top-1000"):
+            return sorted(self.ranked[:int(profile[4:])])
+        raise ValueError(f"Unknown port profile {profile!r} (one of {', '.join(PROFILES)})")
+
+    def resolve(self, profile: Optional[str] = None, ports: Any = None) -> List[int]:
+        """Ports for a scan request: the custom list if given, else the
+        profile (SCAN_PORT_PROFILE by default); raises ValueError"""
+        if ports is not None:
+            return parse_port_spec(ports)
+        return self.ports(profile or settings.SCAN_PORT_PROFILE)
+
+    def service_name(self, port: int) -> str:
+        return self.names.get(port, "Unknown")
+
+port_profiles = PortProfiles.from_file()
@@ -0,0 +1,123 @@
+"""
+Rules Sync Module for AbEthiopia Cyber Intelligence Platform
+Keeps every uvicorn worker on the same detection rules. A reload bumps a
+generation counter in the shared Redis at REDIS_URL; each worker checks
+it every RULES_SYNC_INTERVAL seconds and recompiles its RuleSet when it
+changes, so all workers move to the new rules (and the verdict caches to
+the new analysis version) within one interval. Without Redis a reload
+only reaches the worker that received it.
+"""
+
+import asyncio
+import os
+import socket
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+
+GENERATION_KEY = "opencyber:rules:generation"
+
+class RulesSync:
+    def __init__(self, redis_url: Optional[str] = None, client: Optional[redis.Redis] = None):
+        self.redis_url = settings.REDIS_URL if redis_url is None else redis_url
+        # Any redis.asyncio-compatible client (e.g. fakeredis) can be injected
+        self.client: Optional[redis.Redis] = client
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.generation: Optional[int] = None
+        self.task: Optional[asyncio.Task] = None
+        self.reloads = 0
+        # Failures are logged once per outage, not once per poll
+        self.healthy = True
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None or bool(self.redis_url)
+
+    def redis(self) -> redis.Redis:
+        if self.client is None:
+            self.client = redis.from_url(self.redis_url, socket_timeout=settings.VERDICT_CACHE_REDIS_TIMEOUT,
+                                         socket_connect_timeout=settings.VERDICT_CACHE_REDIS_TIMEOUT)
+        return self.client
+
+    async def start(self, reload: Callable[[], Awaitable[str]]):
+        """Watch the generation; reload() recompiles this worker's rules.
+        The rules were just compiled from the files, so the generation
+        current at startup counts as seen."""
+        if not self.enabled:
+            return
+        self.generation = await self.read_generation()
+        self.task = asyncio.create_task(self.watch(reload))
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+    async def publish(self) -> bool:
+        """Tell the other workers to reload (after reloading here); False
+        when there is no Redis to tell them through"""
+        if not self.enabled:
+            return False
+        try:
+            self.generation = int(await self.redis().incr(GENERATION_KEY))
+        except (redis.RedisError, OSError) as e:
+            self.failed(e)
+            return False
+        self.recovered()
+        return True
+
+    async def read_generation(self) -> Optional[int]:
+        try:
+            value = await self.redis().get(GENERATION_KEY)
+        except (redis.RedisError, OSError) as e:
+            self.failed(e)
+            return self.generation
+        self.recovered()
+        return int(value) if value is not None else 0
+
+    async def watch(self, reload: Callable[[], Awaitable[str]]):
+        while True:
+            await asyncio.sleep(settings.RULES_SYNC_INTERVAL)
+            generation = await self.read_generation()
+            if generation is None or generation == self.generation:
+                continue
+            if self.generation is None:
+                # Redis was down at startup; the rules compiled then are current
+                self.generation = generation
+                continue
+            try:
+                version = await reload()
+            except Exception as e:
+                # Retried on the next poll
+                print(f"⚠️  Rule reload from another worker failed: {e}")
+                continue
+            self.generation = generation
+            self.reloads += 1
+            print(f"✅ Threat intelligence rules reloaded (version {version}, generation {generation})")
+
+    def failed(self, error: Exception):
+        if self.healthy:
+            print(f"⚠️  Redis unavailable for rules sync, reloads stay per worker: {error}")
+            self.healthy = False
+
+    def recovered(self):
+        if not self.healthy:
+            print("✅ Rules sync recovered")
+            self.healthy = True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker": self.worker_id,
+            "enabled": self.enabled,
+            "healthy": self.healthy,
+            "generation": self.generation,
+            "reloads": self.reloads
+        }
+
+rules_sync = RulesSync()
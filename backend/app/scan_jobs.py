@@ -0,0 +1,426 @@
+"""
+Scan Jobs Module for AbEthiopia Cyber Intelligence Platform
+Network scans as background jobs: submitting a scan writes a scan_jobs row
+and returns its id at once, a bounded set of workers in each process claims
+queued jobs and sweeps their targets, and live hosts are written to
+scan_results as they finish. Any worker can report a job's progress, page
+through its results or stream both as Server-Sent Events.
+
+Jobs live in the database, so they survive restarts: a worker shutting
+down hands its running jobs back to the queue, and a job whose worker died
+(its lease wasn't renewed for SCAN_JOB_LEASE_SECONDS) is requeued by
+whichever worker notices. A requeued job is scanned again from the start.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+
+from app.core.config import settings
+from app.core.database import async_engine
+from app.core.metrics import SCAN_JOB_SECONDS, SCAN_JOBS, SCAN_JOBS_RUNNING
+from app.models.database import ScanJob, ScanResult, generate_uuid
+from app.network_scanner import NetworkScanner, assess_network_threat
+from app.port_profiles import format_port_spec, port_profiles
+
+JOBS = ScanJob.__table__
+RESULTS = ScanResult.__table__
+
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = "queued", "running", "completed", "failed", "cancelled"
+FINISHED = (COMPLETED, FAILED, CANCELLED)
+
+# An SSE comment goes out after this many quiet seconds, so proxies keep
+# the stream of a long-queued job open
+SSE_KEEPALIVE = 15.0
+
+class ScanJobError(Exception):
+    """A scan request that can't be queued (bad targets or ports)"""
+
+class ScanQueueFullError(ScanJobError):
+    """SCAN_JOB_MAX_QUEUED jobs are already waiting; callers should retry later (HTTP 503)"""
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+def isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+def job_view(row) -> Dict[str, Any]:
+    """API representation of a scan_jobs row"""
+    total = row.hosts_total or 0
+    progress = 100.0 if row.status == COMPLETED else round(100.0 * row.hosts_scanned / total, 1) if total else 0.0
+    return {
+        "job_id": row.id,
+        "status": row.status,
+        "targets": row.targets,
+        "profile": row.profile,
+        "ports": row.ports,
+        "hosts_total": total,
+        "hosts_scanned": row.hosts_scanned,
+        "hosts_up": row.hosts_up,
+        "progress": progress,
+        "attempts": row.attempts,
+        "error": row.error,
+        "created_at": isoformat(row.created_at),
+        "started_at": isoformat(row.started_at),
+        "finished_at": isoformat(row.finished_at)
+    }
+
+def sse(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    """One Server-Sent Events message"""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+class JobProgress:
+    """What a running job has found since its last checkpoint"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.scanned = 0
+        self.up = 0
+        self.pending: List[Dict[str, Any]] = []
+
+class ScanJobQueue:
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or settings.SCAN_JOB_WORKERS
+        # Unique per process start; a restarted process never renews an old lease
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.tasks: List[asyncio.Task] = []
+        self.wakeup: Optional[asyncio.Event] = None
+        self.running: Dict[str, JobProgress] = {}
+        # Failures are logged once per outage, not once per poll
+        self.healthy = True
+
+    async def start(self):
+        self.wakeup = asyncio.Event()
+        self.tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self.maintain()))
+
+    async def stop(self):
+        """Cancel the workers; each hands its running job back to the queue"""
+        for task in self.tasks:
+            task.cancel()
+        if self.tasks:
+            await asyncio.wait(self.tasks, timeout=settings.SCAN_JOB_FLUSH_INTERVAL * 5)
+        self.tasks = []
+
+    # Submitting and reading jobs (any worker)
+
+    async def submit(self, targets: Sequence[Any], ports: Any = None,
+                     profile: Optional[str] = None) -> Dict[str, Any]:
+        """Queue a scan of one or more IPs, CIDR blocks or ranges of a port
+        profile or custom ports (see port_profiles.resolve); raises ScanJobError"""
+        targets = list(dict.fromkeys(str(target).strip() for target in targets if str(target).strip()))
+        if not targets:
+            raise ScanJobError("At least one target is required")
+        if len(targets) > settings.SCAN_JOB_MAX_TARGETS:
+            raise ScanJobError(f"Too many targets: {len(targets)} (max {settings.SCAN_JOB_MAX_TARGETS})")
+        scanner = NetworkScanner()
+        hosts_total = 0
+        for target in targets:
+            try:
+                hosts_total += scanner.target_hosts(target)[0]
+            except ValueError as e:
+                raise ScanJobError(f"Invalid target {target!r}: {e}")
+        if hosts_total > settings.SWEEP_MAX_HOSTS:
+            raise ScanJobError(f"Scan too large: {hosts_total} addresses (limit {settings.SWEEP_MAX_HOSTS})")
+        try:
+            port_list = port_profiles.resolve(profile, ports)
+        except ValueError as e:
+            raise ScanJobError(f"Invalid ports: {e}")
+        # Stored compactly: custom ports as a "22,80,8000-8100" spec, else the
+        # profile name (fixed now, so a later SCAN_PORT_PROFILE change doesn't apply)
+        if ports is not None:
+            profile, ports = None, format_port_spec(port_list)
+        else:
+            profile = profile or settings.SCAN_PORT_PROFILE
+
+        job_id = generate_uuid()
+        async with async_engine.begin() as connection:
+            queued = (await connection.execute(
+                select(func.count()).select_from(JOBS).where(JOBS.c.status == QUEUED)
+            )).scalar()
+            if queued >= settings.SCAN_JOB_MAX_QUEUED:
+                raise ScanQueueFullError(f"{queued} scan jobs already queued")
+            await connection.execute(insert(JOBS).values(
+                id=job_id, status=QUEUED, targets=targets, profile=profile, ports=ports, hosts_total=hosts_total,
+                hosts_scanned=0, hosts_up=0, attempts=0, created_at=utcnow()
+            ))
+        SCAN_JOBS.labels(event="submitted").inc()
+        if self.wakeup is not None:
+            self.wakeup.set()
+        return await self.get(job_id)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        async with async_engine.connect() as connection:
+            row = (await connection.execute(select(JOBS).where(JOBS.c.id == job_id))).one_or_none()
+        return job_view(row) if row is not None else None
+
+    async def results(self, job_id: str, after: int = 0, limit: int = 100) -> List[Tuple[int, Dict[str, Any]]]:
+        """(result id, host result) for up to limit live hosts, in the order they were found"""
+        async with async_engine.connect() as connection:
+            rows = (await connection.execute(
+                select(RESULTS.c.id, RESULTS.c.result)
+                .where(RESULTS.c.job_id == job_id, RESULTS.c.id > after)
+                .order_by(RESULTS.c.id).limit(limit)
+            )).all()
+        return [(row.id, row.result) for row in rows]
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running job; the worker running it stops at its next checkpoint"""
+        async with async_engine.begin() as connection:
+            cancelled = await connection.execute(
+                update(JOBS).where(JOBS.c.id == job_id, JOBS.c.status.in_((QUEUED, RUNNING)))
+                .values(status=CANCELLED, finished_at=utcnow())
+            )
+        if cancelled.rowcount:
+            SCAN_JOBS.labels(event="cancelled").inc()
+        return await self.get(job_id)
+
+    async def events(self, job_id: str, after: int = 0) -> AsyncIterator[str]:
+        """Server-Sent Events for a job: 'result' for each live host (its id
+        is the result id, so a client reconnecting with Last-Event-ID
+        resumes), 'progress' whenever the counters move, then 'done' with
+        the final job once it finishes"""
+        last_progress = None
+        last_sent = time.monotonic()
+        while True:
+            try:
+                # The job is read before its results: a finished job's
+                # results were committed with its final status
+                job = await self.get(job_id)
+                if job is None:
+                    yield sse("error", {"error": "Scan job not found"})
+                    return
+                results = await self.results(job_id, after, limit=500)
+            except Exception as e:
+                yield sse("error", {"error": f"Scan job unavailable: {e}"})
+                return
+            for result_id, result in results:
+                yield sse("result", result, result_id)
+                after = result_id
+                last_sent = time.monotonic()
+            if len(results) == 500:
+                continue
+
+            progress = {key: job[key] for key in ("status", "hosts_total", "hosts_scanned", "hosts_up", "progress")}
+            if progress != last_progress:
+                yield sse("progress", progress)
+                last_progress = progress
+                last_sent = time.monotonic()
+            if job["status"] in FINISHED:
+                yield sse("done", job)
+                return
+            if time.monotonic() - last_sent >= SSE_KEEPALIVE:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+            await asyncio.sleep(settings.SCAN_JOB_EVENT_INTERVAL)
+
+    # Running jobs (this process's workers)
+
+    async def work(self):
+        while True:
+            self.wakeup.clear()
+            try:
+                job = await self.claim()
+            except Exception as e:
+                self.database_failed(e)
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), settings.SCAN_JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.run_job(job)
+
+    async def claim(self):
+        """Take the oldest queued job, or None. The conditional UPDATE
+        makes the claim safe against other workers without any
+        dialect-specific locking."""
+        async with async_engine.begin() as connection:
+            candidates = (await connection.execute(
+                select(JOBS.c.id).where(JOBS.c.status == QUEUED).order_by(JOBS.c.id).limit(self.workers)
+            )).scalars().all()
+            for job_id in candidates:
+                now = utcnow()
+                claimed = await connection.execute(
+                    update(JOBS).where(JOBS.c.id == job_id, JOBS.c.status == QUEUED).values(
+                        status=RUNNING, worker=self.worker_id, attempts=JOBS.c.attempts + 1,
+                        started_at=now, heartbeat_at=now, hosts_scanned=0, hosts_up=0, error=None
+                    )
+                )
+                if claimed.rowcount == 1:
+                    # A requeued job starts over
+                    await connection.execute(delete(RESULTS).where(RESULTS.c.job_id == job_id))
+                    self.database_recovered()
+                    return (await connection.execute(select(JOBS).where(JOBS.c.id == job_id))).one()
+        self.database_recovered()
+        return None
+
+    async def run_job(self, job):
+        progress = JobProgress(job.id)
+        self.running[job.id] = progress
+        SCAN_JOBS_RUNNING.inc()
+        started = time.monotonic()
+        scan = asyncio.create_task(self.scan(job, progress))
+        try:
+            while True:
+                await asyncio.wait({scan}, timeout=settings.SCAN_JOB_FLUSH_INTERVAL)
+                if scan.done():
+                    break
+                if not await self.checkpoint(progress):
+                    # Cancelled, or requeued while this worker couldn't reach the database
+                    scan.cancel()
+                    await asyncio.wait({scan})
+                    return
+            error = scan.exception()
+            if await self.finish(progress, FAILED if error else COMPLETED, str(error) if error else None):
+                SCAN_JOBS.labels(event=FAILED if error else COMPLETED).inc()
+                SCAN_JOB_SECONDS.observe(time.monotonic() - started)
+        except asyncio.CancelledError:
+            scan.cancel()
+            await self.release(progress)
+            raise
+        finally:
+            del self.running[job.id]
+            SCAN_JOBS_RUNNING.dec()
+
+    async def scan(self, job, progress: JobProgress):
+        scanner = NetworkScanner()
+        hosts = itertools.chain.from_iterable(scanner.target_hosts(target)[1] for target in job.targets)
+        # One sweep over every target, so they share a single connection budget
+        ports = port_profiles.resolve(job.profile, job.ports)
+        async for host_result in scanner.sweep_hosts(hosts, ports):
+            progress.scanned += 1
+            if not host_result["reachable"]:
+                continue
+            progress.up += 1
+            host_result["threat_assessment"] = assess_network_threat(host_result)
+            progress.pending.append({"job_id": job.id, "ip": host_result["ip"], "result": host_result})
+
+    async def checkpoint(self, progress: JobProgress) -> bool:
+        """Write new results and the counters, renewing the lease. False if
+        the job is no longer this worker's (cancelled or requeued); after a
+        database error the results wait for the next checkpoint."""
+        try:
+            return await self.write_checkpoint(progress)
+        except Exception as e:
+            self.database_failed(e)
+            return True
+
+    async def write_checkpoint(self, progress: JobProgress, **values) -> bool:
+        rows, progress.pending = progress.pending, []
+        try:
+            async with async_engine.begin() as connection:
+                renewed = await connection.execute(
+                    update(JOBS).where(JOBS.c.id == progress.job_id, JOBS.c.status == RUNNING,
+                                       JOBS.c.worker == self.worker_id)
+                    .values(hosts_scanned=progress.scanned, hosts_up=progress.up, heartbeat_at=utcnow(), **values)
+                )
+                if renewed.rowcount != 1:
+                    return False
+                if rows:
+                    await connection.execute(insert(RESULTS), rows)
+        except Exception:
+            progress.pending = rows + progress.pending
+            raise
+        self.database_recovered()
+        return True
+
+    async def finish(self, progress: JobProgress, status: str, error: Optional[str]) -> bool:
+        """Final checkpoint; retried briefly, after which the lease expiry
+        requeues the job"""
+        for attempt in range(3):
+            if attempt:
+                await asyncio.sleep(settings.SCAN_JOB_FLUSH_INTERVAL)
+            try:
+                return await self.write_checkpoint(progress, status=status, error=error, worker=None,
+                                                   finished_at=utcnow())
+            except Exception as e:
+                self.database_failed(e)
+        return False
+
+    async def release(self, progress: JobProgress):
+        """Hand a job back to the queue on shutdown; the run isn't counted as an attempt"""
+        try:
+            async with async_engine.begin() as connection:
+                await connection.execute(
+                    update(JOBS).where(JOBS.c.id == progress.job_id, JOBS.c.status == RUNNING,
+                                       JOBS.c.worker == self.worker_id)
+                    .values(status=QUEUED, worker=None, heartbeat_at=None, attempts=JOBS.c.attempts - 1)
+                )
+            SCAN_JOBS.labels(event="requeued").inc()
+        except Exception as e:
+            print(f"⚠️  Could not requeue scan job {progress.job_id}; it is rescanned once its lease expires: {e}")
+
+    async def maintain(self):
+        """Requeue jobs whose worker stopped renewing the lease (failing
+        them after SCAN_JOB_MAX_ATTEMPTS runs) and drop expired jobs"""
+        while True:
+            await asyncio.sleep(settings.SCAN_JOB_LEASE_SECONDS / 2)
+            try:
+                await self.recover_expired()
+                await self.purge_finished()
+            except Exception as e:
+                self.database_failed(e)
+
+    async def recover_expired(self) -> int:
+        now = utcnow()
+        expired = (JOBS.c.status == RUNNING) & (JOBS.c.heartbeat_at < now - timedelta(seconds=settings.SCAN_JOB_LEASE_SECONDS))
+        async with async_engine.begin() as connection:
+            failed = await connection.execute(
+                update(JOBS).where(expired, JOBS.c.attempts >= settings.SCAN_JOB_MAX_ATTEMPTS)
+                .values(status=FAILED, worker=None, finished_at=now,
+                        error=f"Scan worker stopped responding ({settings.SCAN_JOB_MAX_ATTEMPTS} attempts)")
+            )
+            requeued = await connection.execute(
+                update(JOBS).where(expired).values(status=QUEUED, worker=None, heartbeat_at=None)
+            )
+        if failed.rowcount:
+            SCAN_JOBS.labels(event="failed").inc(failed.rowcount)
+        if requeued.rowcount:
+            SCAN_JOBS.labels(event="requeued").inc(requeued.rowcount)
+            self.wakeup.set()
+        return requeued.rowcount
+
+    async def purge_finished(self):
+        if not settings.SCAN_JOB_RETENTION_DAYS:
+            return
+        cutoff = utcnow() - timedelta(days=settings.SCAN_JOB_RETENTION_DAYS)
+        expired = select(JOBS.c.id).where(JOBS.c.status.in_(FINISHED), JOBS.c.finished_at < cutoff)
+        async with async_engine.begin() as connection:
+            # Explicitly, since SQLite doesn't enforce the cascade by default
+            await connection.execute(delete(RESULTS).where(RESULTS.c.job_id.in_(expired)))
+            await connection.execute(delete(JOBS).where(JOBS.c.id.in_(expired)))
+
+    def database_failed(self, error: Exception):
+        if self.healthy:
+            print(f"⚠️  Scan job queue cannot reach the database, retrying: {error}")
+            self.healthy = False
+
+    def database_recovered(self):
+        if not self.healthy:
+            print("✅ Scan job queue reconnected")
+            self.healthy = True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "running": {job_id: {"hosts_scanned": progress.scanned, "hosts_up": progress.up}
+                        for job_id, progress in self.running.items()},
+            "healthy": self.healthy
+        }
+
+scan_jobs = ScanJobQueue()
@@ -0,0 +1,162 @@
+"""
+Service Fingerprint Module for AbEthiopia Cyber Intelligence Platform
+Identifies the service actually listening on an open TCP port. The server
+gets SCAN_BANNER_WAIT seconds to speak first (SSH, FTP, SMTP, POP3, IMAP,
+MySQL, VNC, Telnet); if it doesn't, one small protocol probe is sent (HTTP,
+or PostgreSQL / Redis / RDP on their ports) and the reply is matched
+against signatures. A port answering with a TLS alert (or silent on a
+usual TLS port) gets a TLS handshake and the same checks inside it.
+"""
+
+import asyncio
+import re
+import ssl
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+
+PROBES = {
+    "http": b"HEAD / HTTP/1.0\r\n\r\n",
+    # SSLRequest: every PostgreSQL server answers a single 'S' or 'N'
+    "postgresql": b"\x00\x00\x00\x08\x04\xd2\x16\x2f",
+    "redis": b"PING\r\n",
+    # X.224 Connection Request with an RDP negotiation request
+    "rdp": b"\x03\x00\x00\x13\x0e\xe0\x00\x00\x00\x00\x00\x01\x00\x08\x00\x03\x00\x00\x00",
+}
+
+# Probe sent on a port when the server stays silent (HTTP elsewhere)
+PORT_PROBES = {5432: "postgresql", 6379: "redis", 3389: "rdp"}
+
+# Ports whose protocols never speak first, so the wait is skipped
+CLIENT_FIRST_PORTS = {80, 81, 443, 3000, 3389, 5432, 6379, 8000, 8008, 8080, 8081, 8443, 8888, 9000, 9090, 9200}
+
+# Ports where silence usually means TLS (a handshake is tried)
+TLS_PORTS = {443, 465, 636, 990, 993, 995, 2376, 5986, 6443, 8443, 9443}
+
+# Ports where a bare "220" greeting is mail rather than FTP
+SMTP_PORTS = {25, 465, 587, 2525}
+
+# (pattern, service, product group or None): matched against whatever the
+# server sent first, or answered to the HTTP probe
+SIGNATURES = [
+    (re.compile(rb"^SSH-[\d.]+-([^\r\n ]+)"), "SSH", 1),
+    (re.compile(rb"^220[ -][^\r\n]*?\b(E?SMTP|Postfix|Exim|Sendmail)\b"), "SMTP", None),
+    (re.compile(rb"^220[ -][^\r\n]*?\bFTP\b"), "FTP", None),
+    (re.compile(rb"^\+OK"), "POP3", None),
+    (re.compile(rb"^\* OK"), "IMAP", None),
+    (re.compile(rb"^RFB (\d{3}\.\d{3})"), "VNC", 1),
+    (re.compile(rb"^\xff[\xfb-\xfe]"), "Telnet", None),
+    # Handshake v10: 3-byte length, sequence 0, protocol 10, NUL-terminated version
+    (re.compile(rb"^...\x00\x0a([0-9][\x20-\x7e]*)\x00", re.S), "MySQL", 1),
+    (re.compile(rb"^HTTP/\d(?:\.\d)? \d{3}"), "HTTP", None),
+]
+SERVER_HEADER = re.compile(rb"\r\nserver: *([^\r\n]+)", re.I)
+# A TLS alert record: the HTTP probe reached a TLS server
+TLS_ALERT = re.compile(rb"^\x15\x03[\x00-\x04]")
+PROBE_SIGNATURES = {
+    "postgresql": (re.compile(rb"^[SN]\Z"), "PostgreSQL"),
+    "redis": (re.compile(rb"^(?:\+PONG|-NOAUTH|-DENIED)"), "Redis"),
+    "rdp": (re.compile(rb"^\x03\x00"), "RDP"),
+}
+# Services inside TLS, by what they send (or answer to HTTP)
+TLS_NAMES = {"HTTP": "HTTPS", "IMAP": "IMAPS", "POP3": "POP3S", "SMTP": "SMTPS", "FTP": "FTPS"}
+
+def printable(data: bytes) -> str:
+    """First line of a banner as text, non-printable bytes as '.'"""
+    line = data.split(b"\n", 1)[0][:200]
+    return "".join(chr(byte) if 32 <= byte < 127 else "." for byte in line.rstrip(b"\r")).strip()
+
+def identify(data: bytes, port: int, probe: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """{service, product, banner} for a server's first bytes, or None"""
+    if not data:
+        return None
+    if probe in PROBE_SIGNATURES:
+        pattern, service = PROBE_SIGNATURES[probe]
+        if pattern.match(data):
+            return {"service": service, "product": None, "banner": printable(data) or None}
+    for pattern, service, group in SIGNATURES:
+        match = pattern.match(data)
+        if match is None:
+            continue
+        product = match.group(group).decode("latin-1") if group else None
+        if service == "HTTP":
+            server = SERVER_HEADER.search(data)
+            product = server.group(1).decode("latin-1").strip() if server else None
+        return {"service": service, "product": product, "banner": printable(data)}
+    if data.startswith((b"220 ", b"220-")):
+        return {"service": "SMTP" if port in SMTP_PORTS else "FTP", "product": None, "banner": printable(data)}
+    return None
+
+async def read_some(reader: asyncio.StreamReader, timeout: float) -> bytes:
+    try:
+        return await asyncio.wait_for(reader.read(settings.SCAN_BANNER_MAX_BYTES), timeout)
+    except (asyncio.TimeoutError, OSError):
+        return b""
+
+async def close(writer: asyncio.StreamWriter):
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except (OSError, ssl.SSLError):
+        pass
+
+async def converse(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, port: int,
+                   wait: bool, probe: str) -> Dict[str, Any]:
+    """Let the server speak first (if wait), else send the probe; returns
+    {data, probe} with the probe actually sent (None if none was)"""
+    data = await read_some(reader, settings.SCAN_BANNER_WAIT) if wait else b""
+    if data:
+        return {"data": data, "probe": None}
+    try:
+        writer.write(PROBES[probe])
+        await writer.drain()
+    except OSError:
+        return {"data": b"", "probe": probe}
+    return {"data": await read_some(reader, settings.SCAN_BANNER_TIMEOUT), "probe": probe}
+
+def tls_context() -> ssl.SSLContext:
+    # Fingerprinting, not trust: any certificate and any protocol the server offers
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+async def fingerprint_tls(ip: str, port: int, connect_timeout: float) -> Optional[Dict[str, Any]]:
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(ip, port, ssl=tls_context(), server_hostname=""),
+            connect_timeout + settings.SCAN_BANNER_TIMEOUT
+        )
+    except (OSError, ssl.SSLError, asyncio.TimeoutError):
+        return None
+    try:
+        tls_version = writer.get_extra_info("ssl_object").version()
+        reply = await converse(reader, writer, port, port not in CLIENT_FIRST_PORTS, "http")
+    finally:
+        await close(writer)
+    found = identify(reply["data"], port, reply["probe"]) or {"service": "TLS", "product": None, "banner": None}
+    found["service"] = TLS_NAMES.get(found["service"], found["service"])
+    found["tls"] = tls_version
+    return found
+
+async def fingerprint(ip: str, port: int, connect_timeout: float) -> Optional[Dict[str, Any]]:
+    """{service, product, banner, method} for an open port, or None if
+    nothing matched. method is 'banner' (the server spoke first), 'probe'
+    or 'tls'."""
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), connect_timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    try:
+        reply = await converse(reader, writer, port, port not in CLIENT_FIRST_PORTS, PORT_PROBES.get(port, "http"))
+    finally:
+        await close(writer)
+
+    found = identify(reply["data"], port, reply["probe"])
+    if found is not None:
+        return dict(found, method="probe" if reply["probe"] else "banner")
+    if TLS_ALERT.match(reply["data"]) or (not reply["data"] and port in TLS_PORTS):
+        found = await fingerprint_tls(ip, port, connect_timeout)
+        if found is not None:
+            return dict(found, method="tls")
+    return None
@@ -0,0 +1,353 @@
+"""
+Stats Aggregator Module for AbEthiopia Cyber Intelligence Platform
+Incremental dashboard statistics: every analysis bumps in-memory counters
+and a rolling window of time buckets, so the dashboard never has to scan
+threat_analyses. Workers merge their counts in Redis, and one of them
+snapshots the aggregate to system_metrics periodically.
+"""
+
+import asyncio
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.database import SystemMetrics
+
+KEY_PREFIX = "opencyber:stats"
+
+# Risk levels counted as detections
+DETECTION_LEVELS = ("high", "medium")
+
+def utc_day(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d")
+
+def day_end(timestamp: float) -> float:
+    return (timestamp // 86400 + 1) * 86400
+
+def analysis_counts(analysis_type: str, analysis: Dict[str, Any],
+                    processing_time: Optional[float] = None) -> Dict[str, float]:
+    """Counter increments for one analysis"""
+    risk_level = analysis.get("risk_level", "unknown")
+    counts = {
+        "analyses": 1,
+        "confidence_sum": float(analysis.get("confidence", 0)),
+        f"type:{analysis_type}": 1,
+        f"risk:{risk_level}": 1
+    }
+    if risk_level in DETECTION_LEVELS:
+        counts["detections"] = 1
+    if processing_time is not None:
+        counts["time_sum"] = processing_time
+        counts["timed"] = 1
+    return counts
+
+def add(counter: Counter, counts: Dict[str, float]):
+    # Cheaper than Counter.update() for a handful of keys
+    for field, value in counts.items():
+        counter[field] = counter.get(field, 0) + value
+
+def average(total: float, count: float) -> float:
+    return total / count if count else 0.0
+
+def summarize(totals: Counter, today: Counter, window: Counter) -> Dict[str, Any]:
+    """Dashboard figures from the three aggregates"""
+    return {
+        "total_threats_analyzed": int(totals["analyses"]),
+        "threats_today": int(today["analyses"]),
+        "detections_today": int(today["detections"]),
+        # No labelled outcomes are recorded, so accuracy can't be measured
+        "mean_confidence": round(average(totals["confidence_sum"], totals["analyses"]), 1),
+        # Deprecated: the old name of mean_confidence, kept for existing dashboard clients
+        "detection_accuracy": round(average(totals["confidence_sum"], totals["analyses"]), 1),
+        "average_processing_time": round(average(totals["time_sum"], totals["timed"]), 4),
+        "analyses_by_type": {field[5:]: int(value) for field, value in totals.items() if field.startswith("type:")},
+        "verdicts": {field[5:]: int(value) for field, value in totals.items() if field.startswith("risk:")},
+        "recent": {
+            "window_seconds": settings.STATS_BUCKET_SECONDS * settings.STATS_WINDOW_BUCKETS,
+            "analyses": int(window["analyses"]),
+            "detections": int(window["detections"]),
+            "average_processing_time": round(average(window["time_sum"], window["timed"]), 4)
+        }
+    }
+
+def increment(pipe, writes: List[Tuple[str, Counter, Optional[int]]]):
+    """Queue HINCRBY / HINCRBYFLOAT for (key, counts, expiry seconds or None) writes"""
+    for key, counts, expiry in writes:
+        for field, value in counts.items():
+            if isinstance(value, float):
+                pipe.hincrbyfloat(key, field, value)
+            else:
+                pipe.hincrby(key, field, value)
+        if expiry is not None:
+            pipe.expire(key, expiry)
+
+def decode_hash(raw: Dict[bytes, bytes]) -> Counter:
+    return Counter({field.decode(): float(value) for field, value in raw.items()})
+
+class StatsAggregator:
+    def __init__(self, redis_url: Optional[str] = None, client: Optional[redis.Redis] = None):
+        self.redis_url = settings.REDIS_URL if redis_url is None else redis_url
+        # Any redis.asyncio-compatible client (e.g. fakeredis) can be injected
+        self.client: Optional[redis.Redis] = client
+        self.redis_retry_at = 0.0
+        self.bucket_seconds = settings.STATS_BUCKET_SECONDS
+        self.window_buckets = settings.STATS_WINDOW_BUCKETS
+        # This worker's own aggregates (all the dashboard has without Redis)
+        self.totals: Counter = Counter()
+        self.day = utc_day(time.time())
+        self.day_ends = day_end(time.time())
+        self.today: Counter = Counter()
+        # bucket start -> counts, oldest first
+        self.buckets: "OrderedDict[int, Counter]" = OrderedDict()
+        # (day, bucket start) -> increments not yet merged into Redis
+        self.pending: Dict[Tuple[str, int], Counter] = {}
+        self.view: Dict[str, Any] = summarize(self.totals, self.today, Counter())
+        self.shared = False
+        self.last_snapshot = time.monotonic()
+        self.task: Optional[asyncio.Task] = None
+        self.system_status: Callable[[], str] = lambda: "healthy"
+        # Engines actually loaded in this worker (rules, URL model, feeds)
+        self.active_models: Callable[[], List[str]] = lambda: []
+
+    def record(self, analysis_type: str, analysis: Dict[str, Any], processing_time: Optional[float] = None):
+        """Count one analysis; O(1), no I/O"""
+        if "error" in analysis:
+            return
+        now = time.time()
+        counts = analysis_counts(analysis_type, analysis, processing_time)
+        add(self.totals, counts)
+        if now >= self.day_ends:
+            self.day = utc_day(now)
+            self.day_ends = day_end(now)
+            self.today = Counter()
+        add(self.today, counts)
+        bucket = int(now // self.bucket_seconds) * self.bucket_seconds
+        if bucket not in self.buckets:
+            self.buckets[bucket] = Counter()
+            self.expire_buckets(now)
+        add(self.buckets[bucket], counts)
+
+        if self.client is not None or self.redis_url:
+            add(self.pending.setdefault((self.day, bucket), Counter()), counts)
+
+    def expire_buckets(self, now: float):
+        oldest = int(now // self.bucket_seconds - self.window_buckets + 1) * self.bucket_seconds
+        while self.buckets and next(iter(self.buckets)) < oldest:
+            self.buckets.popitem(last=False)
+
+    def window_starts(self, now: float):
+        current = int(now // self.bucket_seconds) * self.bucket_seconds
+        return [current - i * self.bucket_seconds for i in range(self.window_buckets)]
+
+    def local_view(self) -> Dict[str, Any]:
+        now = time.time()
+        self.expire_buckets(now)
+        window = Counter()
+        for counts in self.buckets.values():
+            window.update(counts)
+        today = self.today if self.day == utc_day(now) else Counter()
+        return summarize(self.totals, today, window)
+
+    async def seed(self):
+        """Start the totals from the latest system_metrics snapshot, so a
+        restart (or an empty Redis) doesn't reset the dashboard"""
+        try:
+            async with AsyncSessionLocal() as session:
+                snapshot = (await session.execute(
+                    select(SystemMetrics).order_by(SystemMetrics.timestamp.desc()).limit(1)
+                )).scalar_one_or_none()
+        except Exception as e:
+            print(f"⚠️  Could not read the last metrics snapshot, dashboard totals start at zero: {e}")
+            return
+        if snapshot is None:
+            return
+
+        count = snapshot.threats_analyzed or 0
+        seed = Counter({
+            "analyses": count,
+            # Snapshots before mean_confidence kept it in detection_accuracy
+            "confidence_sum": (snapshot.mean_confidence if snapshot.mean_confidence is not None
+                               else snapshot.detection_accuracy or 0.0) * count,
+            "time_sum": (snapshot.average_processing_time or 0.0) * count,
+            "timed": count
+        })
+        self.totals.update(seed)
+        taken_at = snapshot.timestamp
+        if taken_at is not None and taken_at.tzinfo is None:
+            # SQLite hands back naive UTC
+            taken_at = taken_at.replace(tzinfo=timezone.utc)
+        if taken_at is not None and utc_day(taken_at.timestamp()) == self.day:
+            self.today["analyses"] += snapshot.threats_analyzed_today or 0
+            self.today["detections"] += snapshot.detections_today or 0
+
+        client = self.redis()
+        if client is not None:
+            try:
+                await self.seed_redis(client, seed)
+            except redis.WatchError:
+                # Another worker seeded it first
+                pass
+            except (redis.RedisError, OSError) as e:
+                self.redis_failed(e)
+        self.view = self.local_view()
+
+    async def seed_redis(self, client: redis.Redis, seed: Counter):
+        """Add the snapshot to the shared counters, once per Redis.
+
+        The seed marker and the increments commit in one transaction, so
+        exactly one worker seeds a fresh Redis, and counts other workers
+        flushed before it are added to rather than overwritten or kept
+        in place of the seed.
+        """
+        marker = f"{KEY_PREFIX}:seeded"
+        writes = [(f"{KEY_PREFIX}:totals", seed, None)]
+        today = Counter({field: self.today[field] for field in ("analyses", "detections") if self.today[field]})
+        if today:
+            writes.append((f"{KEY_PREFIX}:day:{self.day}", today, 2 * 86400))
+        async with client.pipeline(transaction=True) as pipe:
+            await pipe.watch(marker)
+            if await pipe.exists(marker):
+                return
+            pipe.multi()
+            pipe.set(marker, 1)
+            increment(pipe, writes)
+            await pipe.execute()
+
+    async def flush(self):
+        """Merge this worker's pending increments into Redis"""
+        client = self.redis()
+        if client is None or not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        totals = Counter()
+        days: Dict[str, Counter] = {}
+        # Buckets that have already left the window only count toward the totals
+        oldest = self.window_starts(time.time())[-1]
+        window_ttl = self.bucket_seconds * (self.window_buckets + 1)
+        writes = []
+        for (day, bucket), counts in pending.items():
+            totals.update(counts)
+            days.setdefault(day, Counter()).update(counts)
+            if bucket >= oldest:
+                writes.append((f"{KEY_PREFIX}:bucket:{bucket}", counts, window_ttl))
+        writes.append((f"{KEY_PREFIX}:totals", totals, None))
+        writes += [(f"{KEY_PREFIX}:day:{day}", counts, 2 * 86400) for day, counts in days.items()]
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                increment(pipe, writes)
+                await pipe.execute()
+        except (redis.RedisError, OSError) as e:
+            self.redis_failed(e)
+            # Keep the increments for the next attempt
+            for key, counts in pending.items():
+                self.pending.setdefault(key, Counter()).update(counts)
+
+    async def refresh(self):
+        """Recompute the dashboard view: cluster-wide from Redis, else this worker's"""
+        await self.flush()
+        client = self.redis()
+        if client is not None:
+            now = time.time()
+            try:
+                async with client.pipeline(transaction=False) as pipe:
+                    pipe.hgetall(f"{KEY_PREFIX}:totals")
+                    pipe.hgetall(f"{KEY_PREFIX}:day:{utc_day(now)}")
+                    for bucket in self.window_starts(now):
+                        pipe.hgetall(f"{KEY_PREFIX}:bucket:{bucket}")
+                    replies = await pipe.execute()
+                window = Counter()
+                for raw in replies[2:]:
+                    window.update(decode_hash(raw))
+                self.view = summarize(decode_hash(replies[0]), decode_hash(replies[1]), window)
+                self.shared = True
+                return
+            except (redis.RedisError, OSError) as e:
+                self.redis_failed(e)
+        self.view = self.local_view()
+        self.shared = False
+
+    async def snapshot(self):
+        """Write the current view to system_metrics (one worker per interval when Redis is shared)"""
+        client = self.redis() if self.shared else None
+        if client is not None:
+            slot = int(time.time() // settings.STATS_SNAPSHOT_INTERVAL)
+            try:
+                if not await client.set(f"{KEY_PREFIX}:snapshot:{slot}", 1, nx=True,
+                                        ex=settings.STATS_SNAPSHOT_INTERVAL * 2):
+                    return
+            except (redis.RedisError, OSError) as e:
+                self.redis_failed(e)
+                return
+        view = self.view
+        try:
+            async with AsyncSessionLocal() as session:
+                session.add(SystemMetrics(
+                    threats_analyzed=view["total_threats_analyzed"],
+                    threats_analyzed_today=view["threats_today"],
+                    detections_today=view["detections_today"],
+                    average_processing_time=view["average_processing_time"],
+                    mean_confidence=view["mean_confidence"],
+                    active_models=self.active_models(),
+                    system_status=self.system_status()
+                ))
+                await session.commit()
+        except Exception as e:
+            print(f"⚠️  Metrics snapshot failed: {e}")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(settings.STATS_REFRESH_INTERVAL)
+            try:
+                await self.refresh()
+                if time.monotonic() - self.last_snapshot >= settings.STATS_SNAPSHOT_INTERVAL:
+                    self.last_snapshot = time.monotonic()
+                    await self.snapshot()
+            except Exception as e:
+                print(f"⚠️  Dashboard stats refresh failed: {e}")
+
+    async def start(self, system_status: Optional[Callable[[], str]] = None,
+                    active_models: Optional[Callable[[], List[str]]] = None):
+        if system_status is not None:
+            self.system_status = system_status
+        if active_models is not None:
+            self.active_models = active_models
+        await self.seed()
+        self.last_snapshot = time.monotonic()
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+    def redis(self) -> Optional[redis.Redis]:
+        if time.monotonic() < self.redis_retry_at:
+            return None
+        if self.client is None:
+            if not self.redis_url:
+                return None
+            self.client = redis.from_url(self.redis_url, socket_timeout=settings.VERDICT_CACHE_REDIS_TIMEOUT,
+                                         socket_connect_timeout=settings.VERDICT_CACHE_REDIS_TIMEOUT)
+        return self.client
+
+    def redis_failed(self, error: Exception):
+        if self.redis_retry_at <= time.monotonic():
+            print(f"⚠️  Redis unavailable for dashboard stats, showing this worker's counts only: {error}")
+        self.redis_retry_at = time.monotonic() + settings.VERDICT_CACHE_REDIS_RETRY
+
+    def stats(self) -> Dict[str, Any]:
+        """Current dashboard figures (precomputed; O(1))"""
+        return dict(self.view, system_status=self.system_status(), active_models=self.active_models(),
+                    scope="cluster" if self.shared else "worker")
+
+stats_aggregator = StatsAggregator()
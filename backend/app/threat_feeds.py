@@ -0,0 +1,272 @@
+"""
+Threat Feed Module for AbEthiopia Cyber Intelligence Platform
+Loads OpenPhish / URLhaus / Phishing.Database text feeds from disk (or a
+local mirror) into compact, immutable hash sets that are swapped atomically.
+Compiled sets are cached next to each feed as memory-mapped .idb files.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import time
+from array import array
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+import requests
+
+from app.core.config import settings
+from app.indicator_db import IndicatorDBError, db_path_for, open_indicator_db, read_header, write_indicator_db
+
+HEX_DIGEST = re.compile(r"^(?:[0-9a-f]{32}|[0-9a-f]{40}|[0-9a-f]{64})$")
+
+# Top 16 bits of each hash select a bucket; the fanout table holds bucket
+# start offsets so a lookup only searches a few entries
+FANOUT_BITS = 16
+
+def indicator_hash(text: str) -> int:
+    """Stable 64-bit hash of a normalized indicator"""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+def indicator_hashes(values: Iterable[str]) -> np.ndarray:
+    """indicator_hash of each value, as a uint64 array"""
+    digests = b"".join(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest() for value in values)
+    return np.frombuffer(digests, dtype=">u8").astype(np.uint64)
+
+def normalize_host(host: str) -> str:
+    return host.strip().lower().rstrip(".")
+
+def split_url(raw: str) -> Optional[Tuple[str, str]]:
+    """(canonical URL, host) for a feed entry or lookup target.
+    
+    The canonical form is 'host[:port]/path[?query]': scheme, userinfo,
+    default ports and fragments are dropped so feed entries and lookups agree.
+    """
+    raw = raw.strip()
+    if not raw:
+        return None
+    try:
+        parts = urlsplit(raw if "://" in raw else "http://" + raw)
+        port = parts.port
+    except ValueError:
+        return None
+    host = normalize_host(parts.hostname or "")
+    if not host:
+        return None
+    netloc = f"[{host}]" if ":" in host else host
+    if port not in (None, 80, 443):
+        netloc = f"{netloc}:{port}"
+    path = parts.path.rstrip("/") or "/"
+    return netloc + path + ("?" + parts.query if parts.query else ""), host
+
+def normalize_url(raw: str) -> Optional[str]:
+    split = split_url(raw)
+    return split[0] if split else None
+
+def classify_line(line: str) -> Iterator[Tuple[str, str]]:
+    """Yields (kind, normalized indicator) for one feed line"""
+    line = line.strip()
+    if not line or line.startswith(("#", ";", "//")):
+        return
+    lowered = line.lower()
+    if HEX_DIGEST.match(lowered):
+        yield "hashes", lowered
+        return
+    split = split_url(line)
+    if split is None:
+        return
+    url, host = split
+    if "/" in line:
+        yield "urls", url
+    yield "hosts", host
+
+def build_fanout(hashes: np.ndarray) -> np.ndarray:
+    """Start offset of every bucket (plus the end) in a sorted hash array"""
+    buckets = (hashes >> np.uint64(64 - FANOUT_BITS)).astype(np.int64)
+    return np.searchsorted(buckets, np.arange((1 << FANOUT_BITS) + 1)).astype(np.int64)
+
+class IndicatorSet:
+    """Sorted uint64 hashes plus a fanout table: 8 bytes per indicator and
+    a constant-time bucket jump before a short binary search"""
+
+    def __init__(self, hashes: np.ndarray, fanout: Optional[np.ndarray] = None):
+        if fanout is None:
+            hashes = np.unique(hashes.astype(np.uint64, copy=False))
+            fanout = build_fanout(hashes)
+        # Either freshly built arrays or read-only views over a mapped .idb file
+        self.hashes = hashes
+        self.fanout = fanout
+
+    def contains_hash(self, value: int) -> bool:
+        bucket = value >> (64 - FANOUT_BITS)
+        start, end = int(self.fanout[bucket]), int(self.fanout[bucket + 1])
+        if start == end:
+            return False
+        position = start + int(np.searchsorted(self.hashes[start:end], np.uint64(value)))
+        return position < end and int(self.hashes[position]) == value
+
+    def __contains__(self, indicator: str) -> bool:
+        return self.contains_hash(indicator_hash(indicator))
+
+    def contains_many(self, values: np.ndarray) -> np.ndarray:
+        """Membership of every uint64 hash in values, in one vectorized search"""
+        positions = np.searchsorted(self.hashes, values)
+        found = positions < len(self.hashes)
+        found[found] = self.hashes[positions[found]] == values[found]
+        return found
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.hashes.nbytes + self.fanout.nbytes
+
+def parse_feed_file(path: str) -> Dict[str, IndicatorSet]:
+    """Stream one feed text file into hash sets without keeping the lines"""
+    buffers = {"urls": array("Q"), "hosts": array("Q"), "hashes": array("Q")}
+    with open(path, encoding="utf-8", errors="ignore") as feed_file:
+        for line in feed_file:
+            for kind, indicator in classify_line(line):
+                buffers[kind].append(indicator_hash(indicator))
+    return {kind: IndicatorSet(np.frombuffer(buffer, dtype=np.uint64))
+            for kind, buffer in buffers.items()}
+
+def map_indicator_db(path: str) -> Dict[str, IndicatorSet]:
+    return {kind: IndicatorSet(hashes, fanout) for kind, (hashes, fanout) in open_indicator_db(path).items()}
+
+class FeedSnapshot:
+    """Immutable view of one load of every feed"""
+
+    def __init__(self, feeds: Dict[str, Dict[str, IndicatorSet]], sources: Dict[str, Dict[str, Any]]):
+        self.feeds = feeds
+        self.sources = sources
+        self.loaded_at = time.time()
+
+    def lookup(self, split: Optional[Tuple[str, str]]) -> Dict[str, str]:
+        """Per feed: 'detected' (exact URL), 'host_listed' or 'not_detected',
+        for a URL's split_url() (or ParsedURL.feed_split())"""
+        results = {}
+        for name, indicators in self.feeds.items():
+            if split is None:
+                results[name] = "not_detected"
+            elif split[0] in indicators["urls"]:
+                results[name] = "detected"
+            elif split[1] in indicators["hosts"]:
+                results[name] = "host_listed"
+            else:
+                results[name] = "not_detected"
+        return results
+
+    def lookup_hash(self, digest: str) -> List[str]:
+        digest = digest.strip().lower()
+        return [name for name, indicators in self.feeds.items() if digest in indicators["hashes"]]
+
+    def stats(self) -> Dict[str, Any]:
+        """Per feed: source path, its mtime ("modified"), when this snapshot
+        loaded it ("loaded_at", epoch seconds) and indicator counts"""
+        return {
+            name: dict(self.sources[name], loaded_at=self.loaded_at,
+                       **{kind: len(indicator_set) for kind, indicator_set in indicators.items()})
+            for name, indicators in self.feeds.items()
+        }
+
+class ThreatFeedStore:
+    def __init__(self, feed_urls: Dict[str, str], feed_dir: Optional[str] = None,
+                 mirror_url: Optional[str] = None):
+        self.feed_urls = feed_urls
+        self.feed_dir = feed_dir or settings.THREAT_FEED_DIR
+        self.mirror_url = (mirror_url if mirror_url is not None else settings.THREAT_FEED_MIRROR_URL).rstrip("/")
+        # Replaced wholesale by refresh(); readers never see a partial load
+        self.snapshot: Optional[FeedSnapshot] = None
+
+    def feed_path(self, name: str) -> str:
+        return os.path.join(self.feed_dir, f"{name}.txt")
+
+    def fetch_from_mirror(self, name: str):
+        """Download one feed from the local mirror into feed_dir (write, then rename).
+        
+        The request is conditional and the file takes the mirror's
+        Last-Modified time, so an unchanged feed keeps its compiled .idb.
+        """
+        path = self.feed_path(name)
+        os.makedirs(self.feed_dir, exist_ok=True)
+        headers = {}
+        if os.path.exists(path):
+            headers["If-Modified-Since"] = formatdate(os.path.getmtime(path), usegmt=True)
+        with requests.get(f"{self.mirror_url}/{name}.txt", headers=headers, stream=True, timeout=30) as response:
+            if response.status_code == 304:
+                return
+            response.raise_for_status()
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as target:
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    target.write(chunk)
+            last_modified = response.headers.get("Last-Modified")
+            if last_modified:
+                modified = parsedate_to_datetime(last_modified).timestamp()
+                os.utime(temp_path, (modified, modified))
+        os.replace(temp_path, path)
+    
+    def load_feed(self, name: str) -> Tuple[Dict[str, IndicatorSet], Dict[str, Any]]:
+        """Map the feed's compiled .idb file, compiling it first if the text feed is newer.
+
+        The first worker to see a changed feed pays for the parse; the rest
+        (and every later restart) map the same file and share its pages.
+        """
+        path = self.feed_path(name)
+        db_path = db_path_for(path)
+        modified = os.path.getmtime(path) if os.path.exists(path) else None
+        try:
+            if modified is None or read_header(db_path) == modified:
+                return map_indicator_db(db_path), {"path": db_path, "modified": os.path.getmtime(db_path)}
+        except (OSError, IndicatorDBError):
+            if modified is None:
+                raise
+
+        indicators = parse_feed_file(path)
+        try:
+            write_indicator_db(db_path, {kind: (indicator_set.hashes, indicator_set.fanout)
+                                         for kind, indicator_set in indicators.items()}, modified)
+            indicators = map_indicator_db(db_path)
+        except OSError as e:
+            # Read-only feed directory: keep this worker's private copy
+            print(f"⚠️  Could not write indicator database for {name}: {e}")
+        return indicators, {"path": path, "modified": modified}
+    
+    def refresh(self) -> FeedSnapshot:
+        """Load every available feed and swap the snapshot in one assignment.
+        Blocking; run it on an executor pool."""
+        feeds, sources = {}, {}
+        for name in self.feed_urls:
+            if self.mirror_url:
+                try:
+                    self.fetch_from_mirror(name)
+                except (requests.RequestException, OSError) as e:
+                    print(f"⚠️  Feed mirror fetch failed for {name}: {e}")
+            path = self.feed_path(name)
+            if not os.path.exists(path) and not os.path.exists(db_path_for(path)):
+                continue
+            feeds[name], sources[name] = self.load_feed(name)
+        snapshot = FeedSnapshot(feeds, sources)
+        self.snapshot = snapshot
+        return snapshot
+
+    def lookup(self, split: Optional[Tuple[str, str]]) -> Dict[str, str]:
+        snapshot = self.snapshot
+        results = snapshot.lookup(split) if snapshot is not None else {}
+        # Feeds that have never loaded are reported as such, not as clean
+        return {name: results.get(name, "unavailable") for name in self.feed_urls}
+
+    async def refresh_periodically(self, run_blocking, interval: Optional[float] = None):
+        """Background task: reload feeds every interval seconds via run_blocking(fn)"""
+        interval = interval or settings.THREAT_FEED_REFRESH_SECONDS
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_blocking(self.refresh)
+            except Exception as e:
+                print(f"⚠️  Threat feed refresh failed: {e}")
@@ -0,0 +1,383 @@
+"""
+Typosquatting Module for AbEthiopia Cyber Intelligence Platform
+Lookalike-domain detection: confusable-character normalization plus
+Damerau-Levenshtein distance over a SymSpell-style deletion index
+
+Usage:
+    python -m app.typosquatting benchmark [--brands N] [--hosts N] [--seed N]
+"""
+
+import argparse
+import functools
+import random
+import resource
+import string
+import sys
+import time
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+from app.url_parser import ParsedURL, PublicSuffixList
+
+# Characters that render alike are folded to one representative before
+# distances are measured, so homoglyph swaps cost nothing
+CONFUSABLES = str.maketrans({
+    "0": "o", "1": "l", "i": "l", "|": "l", "!": "l", "3": "e", "5": "s", "$": "s", "@": "a",
+    # Cyrillic
+    "а": "a", "е": "e", "о": "o", "р": "p", "с": "c", "у": "y", "х": "x", "і": "l",
+    "ј": "j", "ԁ": "d", "һ": "h", "ѕ": "s", "ԛ": "q", "ԝ": "w", "к": "k", "м": "m", "т": "t",
+    # Greek and Latin extensions
+    "α": "a", "ο": "o", "ν": "v", "ρ": "p", "ι": "l", "κ": "k", "τ": "t", "ɡ": "g", "ı": "l",
+})
+MULTI_CHAR_CONFUSABLES = [("rn", "m"), ("vv", "w")]
+
+# Character-count profiles for the batch prefilter: a-z, 0-9, everything else
+PROFILE_SYMBOLS = 37
+PROFILE_TABLE = np.full(256, PROFILE_SYMBOLS - 1, dtype=np.intp)
+PROFILE_TABLE[np.frombuffer(b"abcdefghijklmnopqrstuvwxyz0123456789", dtype=np.uint8)] = np.arange(36)
+# The single-byte part of CONFUSABLES, for bytes.translate
+ASCII_CONFUSABLES = bytes.maketrans(
+    bytes(code for code, replacement in CONFUSABLES.items() if code < 128),
+    "".join(replacement for code, replacement in CONFUSABLES.items() if code < 128).encode("ascii")
+)
+
+def skeleton(text: str) -> str:
+    """Lowercased, NFKC-normalized text with confusable characters folded"""
+    text = unicodedata.normalize("NFKC", text).lower().translate(CONFUSABLES)
+    for sequence, replacement in MULTI_CHAR_CONFUSABLES:
+        text = text.replace(sequence, replacement)
+    return text
+
+def damerau_levenshtein(a: str, b: str, max_distance: int) -> int:
+    """Optimal string alignment distance; returns max_distance + 1 once exceeded"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    # Lookalikes differ in one or two places, so trimming the shared prefix
+    # and suffix usually leaves only a few characters for the DP
+    start = 0
+    limit = min(len(a), len(b))
+    while start < limit and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+    if not a or not b:
+        distance = len(a) + len(b)
+        return distance if distance <= max_distance else max_distance + 1
+
+    previous_previous: Optional[List[int]] = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous_previous is not None and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]
+                    and previous_previous[j - 2] + 1 < value):
+                value = previous_previous[j - 2] + 1
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1] if previous[-1] <= max_distance else max_distance + 1
+
+def profiles(joined: bytes, count: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Character counts and lengths of newline-separated ASCII keys, shortest
+    key first: (counts, PROFILE_SYMBOLS x count and symbol-major; sorted
+    lengths; order, the key index at each sorted position)"""
+    codes = np.frombuffer(joined, dtype=np.uint8)
+    separators = codes == 10
+    rows = np.cumsum(separators)[~separators]
+    lengths = np.bincount(rows, minlength=count)
+    order = np.argsort(lengths, kind="stable")
+    positions = np.empty_like(order)
+    positions[order] = np.arange(count)
+    counts = np.bincount(PROFILE_TABLE[codes[~separators]] * count + positions[rows],
+                         minlength=PROFILE_SYMBOLS * count).astype(np.int16).reshape(PROFILE_SYMBOLS, count)
+    return counts, lengths[order], order
+
+def deletes(term: str, distance: int) -> Set[str]:
+    """Every string reachable from term by deleting up to ``distance`` characters"""
+    results = {term}
+    frontier = {term}
+    for _ in range(distance):
+        frontier = {word[:i] + word[i + 1:] for word in frontier for i in range(len(word))}
+        results |= frontier
+    return results
+
+class SymSpellIndex:
+    """Deletion-neighbourhood index: a lookup generates the deletes of the
+    query prefix and verifies only the keys sharing one, instead of
+    comparing against every key."""
+
+    def __init__(self, max_distance: int = 2, prefix_length: int = 7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.keys: List[str] = []
+        # Most deletes belong to a single key, so those hold a bare key id
+        # and only shared ones pay for a tuple
+        self.deletes: Dict[str, Union[int, Tuple[int, ...]]] = {}
+
+    def add(self, key: str) -> int:
+        key_id = len(self.keys)
+        self.keys.append(key)
+        for variant in deletes(key[:self.prefix_length], self.max_distance):
+            existing = self.deletes.get(variant)
+            if existing is None:
+                self.deletes[variant] = key_id
+            elif isinstance(existing, int):
+                self.deletes[variant] = (existing, key_id)
+            else:
+                self.deletes[variant] = existing + (key_id,)
+        return key_id
+
+    def lookup(self, term: str, max_distance: Optional[int] = None) -> List[Tuple[int, int]]:
+        """(key id, distance) for every indexed key within max_distance of term"""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        candidates: Set[int] = set()
+        for variant in deletes(term[:self.prefix_length], max_distance):
+            key_ids = self.deletes.get(variant)
+            if key_ids is None:
+                continue
+            if isinstance(key_ids, int):
+                candidates.add(key_ids)
+            else:
+                candidates.update(key_ids)
+        matches = []
+        for key_id in candidates:
+            distance = damerau_levenshtein(term, self.keys[key_id], max_distance)
+            if distance <= max_distance:
+                matches.append((key_id, distance))
+        return matches
+
+def raw_domain_keys(registered: str, suffix: str) -> List[str]:
+    """The registered domain and its label, with dots and hyphens dropped"""
+    label = registered[:-len(suffix) - 1] if suffix else registered
+    return [registered.replace(".", "").replace("-", ""), label.replace("-", "")]
+
+def allowed_distance(key: str) -> int:
+    # Short names collide with ordinary words, so they must match exactly
+    if len(key) <= 4:
+        return 0
+    if len(key) <= 8:
+        return 1
+    return 2
+
+class LookalikeIndex:
+    """Finds protected domains that a URL's registered domain imitates"""
+
+    def __init__(self, domains: Iterable[str], suffixes: PublicSuffixList, max_distance: int = 2):
+        self.index = SymSpellIndex(max_distance=max_distance)
+        self.key_domains: List[str] = []
+        self.raw_keys: List[str] = []
+        self.protected: Set[str] = set()
+        for domain in domains:
+            domain = domain.lower().strip()
+            if not domain or " " in domain or domain in self.protected:
+                continue
+            self.protected.add(domain)
+            registered, suffix = suffixes.split(domain)
+            for key, raw_key in self.domain_keys(registered, suffix, include_short_label=False):
+                self.index.add(key)
+                self.key_domains.append(domain)
+                self.raw_keys.append(raw_key)
+        # Campaigns reuse a handful of hosts; repeat lookups are free
+        self.find_host = functools.lru_cache(maxsize=65536)(self.find_host)
+        # Profiles of the indexed keys, for candidates(); a non-ASCII key
+        # (from a unicode rule domain) turns the prefilter off
+        self.key_profiles: Optional[np.ndarray] = None
+        if all(key.isascii() for key in self.index.keys):
+            columns, self.key_lengths, order = profiles("\n".join(self.index.keys).encode("ascii"),
+                                                        len(self.index.keys))
+            self.key_profiles = columns.T
+            self.key_allowed = np.array([allowed_distance(self.index.keys[key_id]) for key_id in order],
+                                        dtype=np.intp)
+
+    def domain_keys(self, registered: str, suffix: str,
+                    include_short_label: bool = True) -> Set[Tuple[str, str]]:
+        """(skeleton key, raw key) pairs: the registrable label, and the whole
+        registered domain with separators dropped (so 'cbe-et.com' meets 'cbe.et')"""
+        raw_keys = raw_domain_keys(registered, suffix)
+        if not include_short_label and len(raw_keys[-1]) <= 4:
+            raw_keys.pop()
+        return {(skeleton(raw_key), unicodedata.normalize("NFKC", raw_key)) for raw_key in raw_keys if raw_key}
+
+    def is_protected(self, host: str) -> bool:
+        """True for a protected domain itself or any host beneath one"""
+        labels = host.split(".")
+        return any(".".join(labels[i:]) in self.protected for i in range(len(labels)))
+
+    def candidates(self, domains: Sequence[Tuple[str, str]]) -> np.ndarray:
+        """Which (registered domain, public suffix) pairs find_host() could
+        match, decided for the whole batch at once.
+
+        An edit changes a string's length by at most one and its character
+        counts by at most two, so a host whose keys are further than that
+        from every indexed key is ruled out without the index lookup. The
+        test is a lower bound: it never rules out a host find_host() would
+        match. Non-ASCII domains are always candidates.
+        """
+        result = np.zeros(len(domains), dtype=bool)
+        if not len(self.index.keys):
+            return result
+        keys, key_rows = [], []
+        for row, (registered, suffix) in enumerate(domains):
+            if not registered:
+                continue
+            if not registered.isascii() or self.key_profiles is None:
+                result[row] = True
+                continue
+            # domain_keys() for an ASCII domain; the skeleton is applied to the whole batch below
+            full, label = raw_domain_keys(registered, suffix)
+            if label:
+                keys.append(label)
+                key_rows.append(row)
+            if full != label:
+                keys.append(full)
+                key_rows.append(row)
+        if not keys:
+            return result
+
+        joined = "\n".join(keys).encode("ascii").translate(ASCII_CONFUSABLES)
+        for sequence, replacement in MULTI_CHAR_CONFUSABLES:
+            joined = joined.replace(sequence.encode(), replacement.encode())
+        # Sorted by length, the keys near each indexed key form one slice;
+        # symbol-major, each symbol's counts for a slice are contiguous
+        columns, key_lengths, order = profiles(joined, len(keys))
+        matched = np.zeros(len(keys), dtype=bool)
+        for profile, length, allowed in zip(self.key_profiles, self.key_lengths, self.key_allowed):
+            low = np.searchsorted(key_lengths, length - allowed, side="left")
+            high = np.searchsorted(key_lengths, length + allowed, side="right")
+            if low < high:
+                # L1 distance, summed over the indexed key's own symbols only:
+                # any other symbol adds its count, which is what's left of
+                # the length once those are subtracted
+                distance = key_lengths[low:high].astype(np.int16)
+                for symbol in np.flatnonzero(profile):
+                    counts = columns[symbol, low:high]
+                    distance += np.abs(counts - profile[symbol]) - counts
+                matched[low:high] |= distance <= 2 * allowed
+        result[np.array(key_rows)[order[matched]]] = True
+        return result
+
+    def find(self, parsed: ParsedURL) -> List[Dict[str, object]]:
+        """Protected domains imitated by the URL's host, closest first"""
+        return self.find_host(parsed.unicode_host, parsed.registered_domain, parsed.public_suffix)
+
+    def find_host(self, host: str, registered: str, suffix: str) -> List[Dict[str, object]]:
+        if not host or self.is_protected(host):
+            return []
+        best: Dict[str, Tuple[int, bool]] = {}
+        for key, raw_key in self.domain_keys(registered, suffix):
+            for key_id, distance in self.index.lookup(key):
+                if distance > allowed_distance(self.index.keys[key_id]):
+                    continue
+                # Confusable characters made it look closer than it spells
+                homoglyph = damerau_levenshtein(raw_key, self.raw_keys[key_id], distance) > distance
+                domain = self.key_domains[key_id]
+                if domain not in best or distance < best[domain][0]:
+                    best[domain] = (distance, homoglyph)
+        return [
+            {"target": domain, "distance": distance, "homoglyph": homoglyph}
+            for domain, (distance, homoglyph) in sorted(best.items(), key=lambda item: (item[1][0], item[0]))
+        ]
+
+def synthetic_brands(count: int, seed: int) -> List[str]:
+    generator = random.Random(seed)
+    suffixes = ["gov.et", "com.et", "edu.et", "org.et", "com", "net", "org"]
+    domains = set()
+    while len(domains) < count:
+        label = "".join(generator.choices(string.ascii_lowercase, k=generator.randint(5, 12)))
+        domains.add(f"{label}.{generator.choice(suffixes)}")
+    return sorted(domains)
+
+def synthetic_lookalike_hosts(brands: List[str], count: int, seed: int) -> List[str]:
+    """A mix of protected hosts, one-edit and homoglyph lookalikes, and unrelated hosts"""
+    generator = random.Random(seed)
+    homoglyphs = {"o": "0", "l": "1", "e": "3", "s": "5", "a": "а", "m": "rn"}
+    hosts = []
+    for _ in range(count):
+        brand = generator.choice(brands)
+        label, _, suffix = brand.partition(".")
+        kind = generator.random()
+        if kind < 0.2:
+            hosts.append(f"www.{brand}")
+        elif kind < 0.4:
+            position = generator.randrange(len(label))
+            hosts.append(f"{label[:position]}{generator.choice(string.ascii_lowercase)}"
+                         f"{label[position + 1:]}.{suffix}")
+        elif kind < 0.5:
+            swappable = [char for char in homoglyphs if char in label]
+            if swappable:
+                char = generator.choice(swappable)
+                label = label.replace(char, homoglyphs[char], 1)
+            else:
+                label += label[-1]
+            hosts.append(f"{label}.{suffix}")
+        else:
+            label = "".join(generator.choices(string.ascii_lowercase, k=generator.randint(6, 14)))
+            hosts.append(f"www.{label}.com")
+    return hosts
+
+def benchmark(brands: int, hosts: int, seed: int) -> int:
+    """find_host() latency per lookup on a synthetic brand index: uncached
+    (the SymSpell lookup and distance checks) and served from the LRU cache"""
+    def percentile(latencies: List[float], fraction: float) -> float:
+        return sorted(latencies)[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1e6
+
+    suffixes = PublicSuffixList.from_file()
+    protected = synthetic_brands(brands, seed)
+    started = time.perf_counter()
+    index = LookalikeIndex(protected, suffixes)
+    build_seconds = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    lookups = []
+    for host in synthetic_lookalike_hosts(protected, hosts, seed):
+        registered, suffix = suffixes.split(host)
+        lookups.append((host, registered, suffix))
+
+    passes = {}
+    uncached = index.find_host.__wrapped__
+    for label, find_host in (("uncached", uncached), ("cold cache", index.find_host),
+                             ("warm cache", index.find_host)):
+        latencies, results = [], []
+        for lookup in lookups:
+            started = time.perf_counter()
+            results.append(find_host(*lookup))
+            latencies.append(time.perf_counter() - started)
+        passes[label] = (latencies, results)
+
+    print(f"{len(index.protected)} brands ({len(index.index.keys)} keys, "
+          f"{len(index.index.deletes)} deletes), {len(lookups)} hosts")
+    print(f"  index build: {build_seconds:.2f}s, peak RSS {peak_mb:.0f} MB")
+    for label, (latencies, _) in passes.items():
+        print(f"  {label + ':':12} p50 {percentile(latencies, 0.5):8.1f} us, "
+              f"p99 {percentile(latencies, 0.99):8.1f} us")
+    expected = passes["uncached"][1]
+    flagged = sum(1 for matches in expected if matches)
+    print(f"  lookalikes flagged: {flagged} of {len(lookups)}")
+    return 0 if all(passes[label][1] == expected for label in passes) else 1
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.typosquatting",
+                                     description="Lookalike-domain index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("benchmark", help="time cached and uncached lookups on synthetic brands")
+    bench.add_argument("--brands", type=int, default=100000)
+    bench.add_argument("--hosts", type=int, default=20000)
+    bench.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+    return benchmark(args.brands, args.hosts, args.seed)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+"""
+URL Parser Module for AbEthiopia Cyber Intelligence Platform
+Parses and normalizes a URL once into a compact ParsedURL that every
+detector reads: scheme, host (as written and IDNA-decoded), port, path,
+query, and the registered domain from a local public suffix list.
+
+Plain URLs (printable ASCII, no IPv6 brackets) are split by one regex,
+over a whole batch at once in parse_batch(); anything else goes through
+urllib's urlsplit(). Both give the same fields urlsplit() would. A
+ParsedBatch keeps the fields as columns and derives the host fields
+(IDNA decoding, IP test, suffix split) once per distinct host; ParsedURL
+rows are only built for the URLs that are looked at one by one.
+"""
+
+import functools
+import hashlib
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from app.core.config import settings
+
+# Multi-label public suffixes used when PUBLIC_SUFFIX_FILE does not exist.
+# Single-label TLDs need no entry (every TLD is a suffix); the private
+# hosting suffixes are here because each subdomain of them is a separate site.
+DEFAULT_PUBLIC_SUFFIXES = [
+    # Ethiopia
+    "com.et", "gov.et", "edu.et", "org.et", "net.et", "biz.et", "info.et", "name.et",
+    # Elsewhere in Africa
+    "co.ke", "or.ke", "go.ke", "ac.ke", "co.za", "org.za", "gov.za", "ac.za",
+    "com.ng", "gov.ng", "edu.ng", "com.eg", "gov.eg", "co.ug", "co.tz", "co.rw", "com.gh",
+    # Europe, Asia, Americas
+    "co.uk", "org.uk", "ac.uk", "gov.uk", "ltd.uk", "plc.uk", "me.uk", "net.uk",
+    "com.au", "net.au", "org.au", "edu.au", "gov.au", "co.nz", "org.nz",
+    "co.jp", "ne.jp", "or.jp", "ac.jp", "com.cn", "net.cn", "org.cn", "gov.cn",
+    "co.in", "net.in", "org.in", "gov.in", "com.br", "net.br", "org.br", "com.mx", "com.tr",
+    "com.sa", "com.ae", "co.il", "com.sg", "com.hk", "com.tw", "co.kr", "com.ru",
+    # Private hosting suffixes
+    "github.io", "gitlab.io", "blogspot.com", "herokuapp.com", "appspot.com", "web.app",
+    "firebaseapp.com", "pages.dev", "workers.dev", "netlify.app", "vercel.app",
+    "azurewebsites.net", "cloudfront.net", "ngrok.io", "ngrok-free.app", "duckdns.org",
+    "000webhostapp.com", "glitch.me", "wixsite.com", "weebly.com", "repl.co",
+]
+
+# Scheme, host, port, path and query of each line, as urlsplit() finds them
+# for plain URLs (the host is lowercased afterwards)
+URL_PARTS = re.compile(
+    r"^(?:([a-z][a-z0-9+.\-]*):)?(?://(?:[^/?#\n]*@)?([^/?#:@\n]*)(?::([^/?#\n]*))?)?"
+    r"([^?#\n]*)(?:\?([^#\n]*))?(?:#[^\n]*)?$", re.I | re.M
+)
+# Just the host and port of each line, as URL_PARTS finds them; for
+# lowercased text (case-insensitive matching costs half as much again)
+HOST_PORT = re.compile(
+    r"^(?:[a-z][a-z0-9+.\-]*:)?(?://(?:[^/?#\n]*@)?([^/?#:@\n]*)(?::([^/?#\n]*))?)?[^\n]*$", re.M
+)
+# Printable ASCII without '[' or ']'
+PLAIN = re.compile(r"[!-Z\\^-~]*\Z")
+IPV4_HOST = re.compile(r"\d{1,3}(?:\.\d{1,3}){3}")
+
+class PublicSuffixList:
+    """Public suffix rules in the Mozilla list's format: one per line,
+    '*.' wildcards, '!' exceptions, '//' comments"""
+
+    def __init__(self, rules: Iterable[str]):
+        self.rules, self.wildcards, self.exceptions = set(), set(), set()
+        for line in rules:
+            line = line.strip().lower()
+            if not line or line.startswith("//"):
+                continue
+            rule = line.split()[0]
+            if rule.startswith("!"):
+                self.exceptions.add(rule[1:])
+            elif rule.startswith("*."):
+                self.wildcards.add(rule[2:])
+            else:
+                self.rules.add(rule)
+        self.version = hashlib.sha256("\n".join(
+            sorted(self.rules) + ["*." + rule for rule in sorted(self.wildcards)]
+            + ["!" + rule for rule in sorted(self.exceptions)]
+        ).encode()).hexdigest()[:16]
+        # Labels in the longest rule ('*.ck' and '!www.ck' both match two)
+        self.depth = max([rule.count(".") + 1 for rule in self.rules | self.exceptions]
+                         + [rule.count(".") + 2 for rule in self.wildcards] + [1])
+        # Last two labels of every rule that can make a suffix longer than
+        # the TLD, and TLDs with a one-label wildcard or exception; hosts
+        # under neither have the TLD as their suffix
+        self.deep_tails = {".".join(rule.split(".")[-2:]) for rule in self.rules | self.exceptions | self.wildcards
+                           if "." in rule}
+        self.deep_tlds = {rule for rule in self.wildcards | self.exceptions if "." not in rule}
+        # Hosts repeat far more than they vary
+        self.split = functools.lru_cache(maxsize=65536)(self.split)
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "PublicSuffixList":
+        """PUBLIC_SUFFIX_FILE (e.g. the full public_suffix_list.dat) or the defaults"""
+        path = settings.PUBLIC_SUFFIX_FILE if path is None else path
+        if not path or not os.path.exists(path):
+            return cls(DEFAULT_PUBLIC_SUFFIXES)
+        with open(path, encoding="utf-8") as suffix_file:
+            return cls(suffix_file)
+
+    def split(self, host: str) -> Tuple[str, str]:
+        """(registrable domain, public suffix) of a host. A host that is
+        itself a public suffix counts as registrable under its parent, so
+        'gov.et' is ('gov.et', 'et')."""
+        # Only the last depth labels can match a rule; one more is the registrable label
+        labels = host.rsplit(".", self.depth + 1)
+        if len(labels) < 2:
+            return host, ""
+        # The longest matching rule wins; without one the TLD is the suffix
+        suffix = 1
+        for count in range(min(self.depth, len(labels)), 0, -1):
+            candidate = ".".join(labels[-count:])
+            if candidate in self.exceptions:
+                suffix = count - 1
+                break
+            if candidate in self.rules or (count > 1 and ".".join(labels[1 - count:]) in self.wildcards):
+                suffix = count
+                break
+        suffix = min(suffix, len(labels) - 1)
+        return ".".join(labels[-suffix - 1:]), ".".join(labels[-suffix:])
+
+    def split_many(self, hosts: Iterable[str]) -> List[Tuple[str, str]]:
+        """split() of each host. Most hosts are under no multi-label rule,
+        so their last two labels are decided without the rule walk."""
+        splits = []
+        for host in hosts:
+            head, dot, tld = host.rpartition(".")
+            tail = host[head.rfind(".") + 1:]
+            if not dot or tld in self.deep_tlds or tail in self.deep_tails:
+                splits.append(self.split(host))
+            else:
+                splits.append((tail, tld))
+        return splits
+
+class ParsedURL:
+    """One URL, parsed once. host is lowercased as written (punycode
+    stays encoded; feeds list it that way), unicode_host has IDNA labels
+    decoded, and registered_domain / public_suffix are of unicode_host
+    (an IP host is its own registered domain). valid is False when the
+    authority can't be parsed (a bad port or IPv6 literal)."""
+
+    __slots__ = ("url", "lowered", "scheme", "host", "unicode_host", "port", "path", "query",
+                 "registered_domain", "public_suffix", "is_ip", "valid")
+
+    def __init__(self, url: str, lowered: str, scheme: str, host: str, unicode_host: str, port: Optional[int],
+                 path: str, query: str, registered_domain: str, public_suffix: str, is_ip: bool, valid: bool):
+        self.url = url
+        self.lowered = lowered
+        self.scheme = scheme
+        self.host = host
+        self.unicode_host = unicode_host
+        self.port = port
+        self.path = path
+        self.query = query
+        self.registered_domain = registered_domain
+        self.public_suffix = public_suffix
+        self.is_ip = is_ip
+        self.valid = valid
+
+    @property
+    def tld(self) -> str:
+        return self.host.rpartition(".")[2]
+
+    def feed_split(self) -> Optional[Tuple[str, str]]:
+        """(canonical URL, host) as threat_feeds.split_url() gives them, or
+        None: 'host[:port]/path[?query]' without scheme, userinfo, default
+        port or fragment"""
+        if not self.valid or not self.host:
+            return None
+        netloc = f"[{self.host}]" if ":" in self.host else self.host
+        if self.port not in (None, 80, 443):
+            netloc = f"{netloc}:{self.port}"
+        path = self.path.rstrip("/") or "/"
+        return netloc + path + ("?" + self.query if self.query else ""), self.host
+
+    def __repr__(self) -> str:
+        return f"ParsedURL({self.url!r}, host={self.host!r}, registered_domain={self.registered_domain!r})"
+
+def decode_host(host: str) -> str:
+    """Host with punycode (xn--) labels decoded"""
+    try:
+        return host.encode("ascii").decode("idna")
+    except UnicodeError:
+        return host
+
+def with_scheme(url: str) -> str:
+    # A bare 'example.com/path' is taken as http
+    return url if "://" in url else "http://" + url
+
+def is_ip_host(host: str) -> bool:
+    # No TLD ends in a digit, so only those hosts can be dotted IPv4
+    return ":" in host or (host[-1:].isdigit() and IPV4_HOST.fullmatch(host) is not None)
+
+def build(url: str, scheme: str, host: str, port: Optional[int], path: str, query: str,
+          valid: bool, suffixes: PublicSuffixList) -> ParsedURL:
+    host = host.strip().lower().rstrip(".")
+    unicode_host = decode_host(host) if "xn--" in host else host
+    is_ip = is_ip_host(host)
+    registered, suffix = (unicode_host, "") if is_ip else suffixes.split(unicode_host)
+    return ParsedURL(url, url.lower(), scheme.lower(), host, unicode_host, port, path, query,
+                     registered, suffix, is_ip, valid)
+
+def plain_port(port: str) -> Tuple[Optional[int], bool]:
+    """(port, valid) as SplitResult.port reads a URL_PARTS port: digits in
+    0-65535, anything else is an error"""
+    if not port:
+        return None, True
+    valid = port.isdigit() and int(port) <= 65535
+    return (int(port) or None) if valid else None, valid
+
+def build_plain(url: str, parts: Tuple[str, ...], suffixes: PublicSuffixList) -> ParsedURL:
+    """ParsedURL from a URL_PARTS match of a plain URL"""
+    scheme, host, port, path, query = parts
+    port, valid = plain_port(port)
+    return build(url, scheme, host, port, path, query, valid, suffixes)
+
+def parse_split(url: str, suffixes: PublicSuffixList) -> ParsedURL:
+    """ParsedURL through urlsplit(), for URLs the regex doesn't handle"""
+    try:
+        parts = urlsplit(with_scheme(url.strip()))
+    except ValueError:
+        return ParsedURL(url, url.lower(), "", "", "", None, "", "", "", "", False, False)
+    try:
+        port, valid = parts.port, True
+    except ValueError:
+        port, valid = None, False
+    return build(url, parts.scheme, parts.hostname or "", port, parts.path, parts.query, valid, suffixes)
+
+def parse_url(url: str, suffixes: PublicSuffixList) -> ParsedURL:
+    text = url.strip()
+    if PLAIN.match(text):
+        match = URL_PARTS.match(with_scheme(text))
+        if match:
+            return build_plain(url, match.groups(""), suffixes)
+    return parse_split(url, suffixes)
+
+class ParsedBatch:
+    """parse_url() of every URL in a batch, as columns. Per row: lowered,
+    hosts, valid, and host_ids indexing the distinct hosts; per distinct
+    host (unique_hosts order): unicode_hosts, is_ip and domains, the
+    (registered domain, public suffix) pairs. batch[row] is that row's
+    ParsedURL, built on first use."""
+
+    def __init__(self, urls: Sequence[str], suffixes: PublicSuffixList):
+        self.urls = list(urls)
+        self.texts = [with_scheme(url.strip()) for url in self.urls]
+        # A URL with a newline of its own would break the rows, so it's blank here
+        joined = "\n".join("" if "\n" in text else text for text in self.texts)
+        codes = np.frombuffer(joined.encode("utf-8"), dtype=np.uint8)
+        newlines = codes == 10
+        unusual = ((codes < 0x21) | (codes > 0x7e) | (codes == 0x5b) | (codes == 0x5d)) & ~newlines
+        special = set(np.cumsum(newlines)[unusual].tolist())
+        special.update(row for row, text in enumerate(self.texts) if "\n" in text)
+
+        # Plain rows are lowercase ASCII once joined.lower(), so hosts need
+        # only the trailing dot removed; the other URL_PARTS fields are
+        # split out for the rows read one by one
+        self.lowered = [url.lower() for url in self.urls]
+        host_ports = HOST_PORT.findall(joined.lower()) if self.urls else []
+        self.hosts = [host.rstrip(".") for host, _ in host_ports]
+        self.valid = [not port or plain_port(port)[1] for _, port in host_ports]
+        self.rows: Dict[int, ParsedURL] = {row: parse_split(self.urls[row], suffixes) for row in special}
+        for row, parsed in self.rows.items():
+            self.hosts[row], self.valid[row] = parsed.host, parsed.valid
+
+        # Host fields are derived once per distinct host
+        ids: Dict[str, int] = {}
+        self.host_ids = np.fromiter((ids.setdefault(host, len(ids)) for host in self.hosts),
+                                    dtype=np.intp, count=len(self.hosts))
+        self.unique_hosts = list(ids)
+        self.unicode_hosts = [decode_host(host) if "xn--" in host else host for host in self.unique_hosts]
+        self.is_ip = [is_ip_host(host) for host in self.unique_hosts]
+        # (registered domain, public suffix); an IP is its own registered domain
+        self.domains = suffixes.split_many(self.unicode_hosts)
+        for index in np.flatnonzero(self.is_ip).tolist():
+            self.domains[index] = (self.unicode_hosts[index], "")
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def __getitem__(self, row: int) -> ParsedURL:
+        parsed = self.rows.get(row)
+        if parsed is None:
+            scheme, _, port, path, query = URL_PARTS.match(self.texts[row]).groups("")
+            port, valid = plain_port(port)
+            host = self.host_ids[row]
+            registered, suffix = self.domains[host]
+            parsed = self.rows[row] = ParsedURL(self.urls[row], self.lowered[row], scheme.lower(), self.hosts[row],
+                                                self.unicode_hosts[host], port, path, query, registered, suffix,
+                                                self.is_ip[host], valid)
+        return parsed
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self.urls)))
+
+def parse_batch(urls: Sequence[str], suffixes: PublicSuffixList) -> ParsedBatch:
+    """parse_url() for every URL, with the regex run once over the batch"""
+    return ParsedBatch(urls, suffixes)
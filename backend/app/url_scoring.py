@@ -0,0 +1,308 @@
+"""
+URL Scoring Module for AbEthiopia Cyber Intelligence Platform
+Columnar URL analysis: the batch is parsed once (app.url_parser), every
+detection stage runs once over all of it (rule screen, one automaton pass
+over the hosts, a vectorized lookalike prefilter and vectorized feed
+lookups), and risk scores come out of NumPy arrays. The verdicts are the
+same as ThreatIntelligence.analyze_url gives one URL at a time.
+URLBatch.features() turns the same batch into a numeric feature
+matrix (length, digit ratio, entropy, subdomain depth, hit counts, TLD and
+IP-host flags).
+
+Usage:
+    python -m app.url_scoring benchmark [--count N] [--seed N]
+"""
+
+import argparse
+import random
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.threat_feeds import FeedSnapshot, IndicatorSet, classify_line, indicator_hash, indicator_hashes
+from app.url_parser import parse_batch
+
+# URLBatch.counts columns: indicators found per URL, by kind
+COUNT_COLUMNS = ("phishing", "typosquatting", "lookalike", "malware_distribution",
+                 "feed_detected", "feed_host_listed")
+# Severity of each kind's indicators (as calculate_risk_level ranks them)
+HIGH_SEVERITY = np.array([False, True, True, True, True, False])
+RISK_LEVELS = np.array(["low", "medium", "high"], dtype=object)
+
+FEED_STATUSES = np.array(["not_detected", "host_listed", "detected", "unavailable"], dtype=object)
+HOST_LISTED, DETECTED, UNAVAILABLE = 1, 2, 3
+
+# URLBatch.features() columns
+FEATURE_NAMES = ("length", "digit_ratio", "entropy", "subdomain_depth", "keyword_hits",
+                 "lookalike_hits", "feed_hits", "tld_et", "ip_host")
+
+def scan_rows(matches: Iterable[Tuple[int, Tuple[int, ...]]], starts: np.ndarray) -> Dict[int, List[int]]:
+    """Sorted ordinals matched in each row of a newline-joined batch, from
+    its (end, ordinals) automaton matches; rows without a match are left
+    out. Patterns are domains, never containing a newline, so no match
+    spans two rows."""
+    ends, found = [], []
+    for end, ordinals in matches:
+        ends.append(end)
+        found.append(ordinals)
+    if not ends:
+        return {}
+    matched: Dict[int, set] = {}
+    for row, ordinals in zip((np.searchsorted(starts, ends, side="right") - 1).tolist(), found):
+        matched.setdefault(row, set()).update(ordinals)
+    return {row: sorted(ordinals) for row, ordinals in matched.items()}
+
+class URLBatch:
+    """Detection results for a batch of URLs, one array (or sparse row map) per stage"""
+
+    def __init__(self, urls: Sequence[str], rules, snapshot: Optional[FeedSnapshot], feed_names: Sequence[str]):
+        self.urls = list(urls)
+        self.parsed = parse_batch(self.urls, rules.public_suffixes)
+        self.lowered = self.parsed.lowered
+        self.rules = rules
+        count = len(self.urls)
+
+        # One screen over every pattern; individual rules only run for the
+        # URLs it flags
+        screen = rules.url_screen.search
+        self.screened = np.fromiter((screen(url) is not None for url in self.lowered), dtype=bool, count=count)
+        self.phishing: Dict[int, List[str]] = {}
+        self.malware: Dict[int, List[str]] = {}
+        for row in np.flatnonzero(self.screened).tolist():
+            url = self.lowered[row]
+            phishing = [description for pattern, description in rules.phishing_rules if pattern.search(url)]
+            if phishing:
+                self.phishing[row] = phishing
+            malware = [description for pattern, description in rules.malware_rules if pattern.search(url)]
+            if malware:
+                self.malware[row] = malware
+
+        # Protected domains and typo variants: one automaton pass each over the joined hosts
+        hosts = self.parsed.hosts
+        joined = "\n".join(hosts)
+        lengths = np.fromiter(map(len, hosts), dtype=np.int64, count=count) + 1
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if count else np.zeros(0, dtype=np.int64)
+        self.domains = scan_rows(rules.domain_index.host_matches(joined), starts)
+        self.typosquats = scan_rows(rules.domain_index.typosquat_matches(joined), starts)
+
+        # Lookalikes: the prefilter rules out almost every host; only the
+        # rest go through the index (and its per-host cache)
+        lookalike_index = rules.lookalike_index
+        parsed = self.parsed
+        found = {
+            host: lookalike_index.find_host(parsed.unicode_hosts[host], registered, suffix)
+            for host, ((registered, suffix), candidate)
+            in enumerate(zip(parsed.domains, lookalike_index.candidates(parsed.domains)))
+            if candidate
+        }
+        entries = rules.domain_index.entries
+        self.lookalikes: Dict[int, List[Dict[str, object]]] = {}
+        for row in np.flatnonzero(np.isin(parsed.host_ids, list(found))).tolist():
+            matches = found[parsed.host_ids[row]]
+            if not matches:
+                continue
+            # Domains already reported as typosquats aren't repeated
+            flagged = {entries[ordinal][1] for ordinal in self.typosquats.get(row, ())}
+            matches = [match for match in matches if match["target"] not in flagged]
+            if matches:
+                self.lookalikes[row] = matches
+
+        # Feed listings: exact URL first, then host. Feeds list the host of
+        # every URL entry too (classify_line), so only URLs on a listed host
+        # need their canonical form hashed.
+        self.feed_names = list(feed_names)
+        self.feed_status: Dict[str, np.ndarray] = {}
+        feeds = {name: snapshot.feeds.get(name) if snapshot is not None else None for name in self.feed_names}
+        # Each distinct host is hashed once; rows without one (-1) land on
+        # the False appended after the per-host results
+        named = np.fromiter(map(bool, parsed.unique_hosts), dtype=bool, count=len(parsed.unique_hosts))
+        host_rows = np.where(np.array(parsed.valid, dtype=bool) & named[parsed.host_ids], parsed.host_ids, -1)
+        host_hashes = indicator_hashes(parsed.unique_hosts)
+        host_listed = {
+            name: np.append(indicators["hosts"].contains_many(host_hashes), False)[host_rows]
+            for name, indicators in feeds.items() if indicators is not None
+        }
+        url_rows = np.flatnonzero(np.logical_or.reduce(list(host_listed.values()))) if host_listed else []
+        url_hashes = indicator_hashes(parsed[row].feed_split()[0] for row in url_rows)
+        for name, indicators in feeds.items():
+            if indicators is None:
+                self.feed_status[name] = np.full(count, UNAVAILABLE, dtype=np.uint8)
+                continue
+            status = np.zeros(count, dtype=np.uint8)
+            status[host_listed[name]] = HOST_LISTED
+            if len(url_rows):
+                status[url_rows[indicators["urls"].contains_many(url_hashes)]] = DETECTED
+            self.feed_status[name] = status
+
+        self.counts = np.zeros((count, len(COUNT_COLUMNS)), dtype=np.int64)
+        for column, found_rows in enumerate((self.phishing, self.typosquats, self.lookalikes, self.malware)):
+            if found_rows:
+                self.counts[list(found_rows), column] = [len(items) for items in found_rows.values()]
+        for status in self.feed_status.values():
+            self.counts[:, 4] += status == DETECTED
+            self.counts[:, 5] += status == HOST_LISTED
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def scores(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(risk level, confidence) per URL, as calculate_risk_level computes them"""
+        totals = self.counts.sum(axis=1)
+        high = self.counts[:, HIGH_SEVERITY].sum(axis=1) > 0
+        medium = self.counts[:, ~HIGH_SEVERITY].sum(axis=1) > 0
+        severity = np.where(high, 2, np.where(medium, 1, 0))
+        confidence = np.where(totals > 0, np.minimum(95, 70 + 10 * totals), 85)
+        return RISK_LEVELS[severity], confidence
+
+    def flagged(self) -> np.ndarray:
+        """Rows with at least one threat indicator"""
+        return np.flatnonzero(self.counts.any(axis=1))
+
+    def status_rows(self) -> List[List[str]]:
+        """Per URL, the status in each feed (feed_names order)"""
+        codes = np.zeros((len(self.urls), len(self.feed_names)), dtype=np.uint8)
+        for column, name in enumerate(self.feed_names):
+            codes[:, column] = self.feed_status[name]
+        return FEED_STATUSES[codes].tolist()
+
+    def features(self) -> np.ndarray:
+        """Feature matrix (len(batch) x len(FEATURE_NAMES), float32).
+
+        Length, digit ratio and entropy are over the lowercased URL's UTF-8 bytes.
+        """
+        count = len(self.urls)
+        matrix = np.zeros((count, len(FEATURE_NAMES)), dtype=np.float32)
+        if not count:
+            return matrix
+        encoded = [url.encode("utf-8") for url in self.lowered]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=count)
+        codes = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        rows = np.repeat(np.arange(count), lengths)
+        digits = np.bincount(rows, weights=(codes >= 48) & (codes <= 57), minlength=count)
+        matrix[:, 0] = lengths
+        matrix[:, 1] = np.divide(digits, lengths, out=np.zeros(count), where=lengths > 0)
+
+        # Shannon entropy (bits per byte), from the count of each distinct
+        # (row, byte) pair
+        pairs = np.sort(rows * 256 + codes)
+        starts = np.flatnonzero(np.concatenate(([True], pairs[1:] != pairs[:-1])))
+        pair_rows = pairs[starts] // 256
+        probabilities = np.diff(np.append(starts, len(pairs))) / lengths[pair_rows]
+        matrix[:, 2] = np.bincount(pair_rows, weights=-probabilities * np.log2(probabilities), minlength=count)
+
+        # Per distinct host, then spread over the rows
+        parsed = self.parsed
+        host_features = np.array([
+            (unicode_host.count(".") - registered.count("."), host.rpartition(".")[2] == "et", is_ip)
+            for host, unicode_host, (registered, _), is_ip
+            in zip(parsed.unique_hosts, parsed.unicode_hosts, parsed.domains, parsed.is_ip)
+        ], dtype=np.float32).reshape(-1, 3)
+        matrix[:, [3, 7, 8]] = host_features[parsed.host_ids]
+        matrix[:, 4] = self.counts[:, 0] + self.counts[:, 3]
+        matrix[:, 5] = self.counts[:, 1] + self.counts[:, 2]
+        matrix[:, 6] = self.counts[:, 4] + self.counts[:, 5]
+        return matrix
+
+# Benchmark
+
+SYNTHETIC_WORDS = ["news", "shop", "mail", "cloud", "portal", "app", "data", "service", "media", "blog",
+                   "store", "travel", "pay", "docs", "login", "secure", "update"]
+SYNTHETIC_TLDS = ["com", "net", "org", "io", "et", "com.et", "info", "xyz"]
+SYNTHETIC_PATHS = ["", "/", "/index.html", "/a/b/c", "/img/logo.png", "/search", "/articles/2024/05"]
+SUSPICIOUS_PATHS = ["/login-secure", "/verify-account", "/files/setup.exe", "/download/pack.zip",
+                    "/password-reset", "/security_alert.html"]
+
+def synthetic_urls(count: int, protected: Sequence[str], seed: int = 7) -> List[str]:
+    """Distinct URLs, mostly ordinary; a few percent imitate protected
+    domains or have phishing / malware paths"""
+    generator = random.Random(seed)
+    urls = []
+    for index in range(count):
+        if generator.random() < 0.03:
+            domain = generator.choice(protected)
+            host = generator.choice([domain.replace(".", "-") + ".com", domain + "-login.xyz",
+                                     domain.replace("a", "4", 1), "www-" + domain, domain])
+        else:
+            host = ".".join(
+                generator.choice(SYNTHETIC_WORDS) + (str(generator.randint(0, 9999)) if generator.random() < 0.7 else "")
+                for _ in range(generator.randint(1, 3))
+            ) + "." + generator.choice(SYNTHETIC_TLDS)
+        path = generator.choice(SUSPICIOUS_PATHS if generator.random() < 0.03 else SYNTHETIC_PATHS)
+        urls.append(f"{generator.choice(['http', 'https'])}://{host}{path}?id={index}")
+    return urls
+
+def synthetic_snapshot(urls: Sequence[str], feed_names: Sequence[str], seed: int = 7) -> FeedSnapshot:
+    """Feeds listing a sample of the URLs, parsed as feed lines are"""
+    generator = random.Random(seed)
+    feeds = {}
+    for name in feed_names:
+        listed = {"urls": set(), "hosts": set(), "hashes": set()}
+        for url in generator.sample(list(urls), max(1, len(urls) // 200)):
+            for kind, indicator in classify_line(url):
+                listed[kind].add(indicator_hash(indicator))
+        feeds[name] = {kind: IndicatorSet(np.fromiter(hashes, dtype=np.uint64, count=len(hashes)))
+                       for kind, hashes in listed.items()}
+    return FeedSnapshot(feeds, {name: {"source": "synthetic"} for name in feed_names})
+
+def benchmark(count: int, seed: int) -> int:
+    from urllib.parse import urlsplit
+    from app.threat_intelligence import ThreatIntelligence
+
+    def engine() -> ThreatIntelligence:
+        # A fresh engine per run, so no run sees another's warm caches
+        urlsplit.cache_clear()
+        threat_intel = ThreatIntelligence()
+        threat_intel.feeds.snapshot = snapshot
+        return threat_intel
+
+    def timed(run):
+        started = time.perf_counter()
+        result = run()
+        return result, time.perf_counter() - started
+
+    reference = ThreatIntelligence()
+    protected = [domain for _, domain in reference.rules.domain_index.entries if " " not in domain]
+    urls = synthetic_urls(count, protected, seed)
+    snapshot = synthetic_snapshot(urls, list(reference.threat_feeds), seed)
+
+    per_url = engine()
+    expected, per_url_seconds = timed(lambda: [per_url.analyze_url(url) for url in urls])
+    scorer = engine()
+    (risk_levels, confidences), score_seconds = timed(
+        lambda: URLBatch(urls, scorer.rules, snapshot, list(scorer.threat_feeds)).scores())
+    batched = engine()
+    actual, batch_seconds = timed(lambda: batched.analyze_urls(urls))
+    extractor = engine()
+    features, feature_seconds = timed(
+        lambda: URLBatch(urls, extractor.rules, snapshot, list(extractor.threat_feeds)).features())
+
+    verdict_mismatches = sum(
+        1 for analysis, risk_level, confidence in zip(expected, risk_levels.tolist(), confidences.tolist())
+        if (analysis["risk_level"], analysis["confidence"]) != (risk_level, confidence)
+    )
+    mismatches = sum(1 for left, right in zip(expected, actual) if left != right)
+    flagged = sum(1 for analysis in expected if analysis["threat_indicators"])
+    print(f"{count} URLs ({flagged} with indicators)")
+    print(f"  analyze_url, one at a time: {per_url_seconds:.2f}s ({count / per_url_seconds:,.0f}/s)")
+    print(f"  URLBatch verdicts:          {score_seconds:.2f}s ({count / score_seconds:,.0f}/s), "
+          f"{per_url_seconds / score_seconds:.1f}x faster")
+    print(f"  analyze_urls (full results): {batch_seconds:.2f}s ({count / batch_seconds:,.0f}/s), "
+          f"{per_url_seconds / batch_seconds:.1f}x faster")
+    print(f"  URLBatch features:          {feature_seconds:.2f}s for a {features.shape[0]} x {features.shape[1]} matrix")
+    print(f"  differing from analyze_url: {verdict_mismatches} verdicts, {mismatches} results")
+    return 1 if mismatches or verdict_mismatches else 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.url_scoring",
+                                     description="Columnar URL scoring")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("benchmark", help="compare batch scoring with analyze_url on synthetic URLs")
+    bench.add_argument("--count", type=int, default=100000)
+    bench.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+    return benchmark(args.count, args.seed)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+Verdict Cache Module for AbEthiopia Cyber Intelligence Platform
+Two-tier cache for analysis results: a per-worker LRU in front of the
+shared Redis at REDIS_URL. Keys carry the analysis version, so changing
+the rules or the engine makes every older entry unreachable.
+"""
+
+import asyncio
+import json
+import socket
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.metrics import VERDICT_CACHE_HITS, VERDICT_CACHE_MISSES
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Keys per MGET round trip
+MGET_BATCH_SIZE = 1000
+
+def canonical_url(url: str) -> str:
+    """URL with case-insensitive parts (scheme, host) lowercased and the default port dropped.
+
+    Path, query and fragment are kept as given: they are case-sensitive and
+    the detection rules look at them.
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    if not parts.netloc or not parts.hostname:
+        return url
+    userinfo, _, _ = parts.netloc.rpartition("@")
+    host = parts.hostname.rstrip(".")
+    netloc = f"[{host}]" if ":" in host else host
+    if port is not None and port != DEFAULT_PORTS.get(parts.scheme.lower()):
+        netloc = f"{netloc}:{port}"
+    if userinfo:
+        netloc = f"{userinfo}@{netloc}"
+    return urlunsplit((parts.scheme.lower(), netloc, parts.path, parts.query, parts.fragment))
+
+def packed_ip(ip: str) -> Optional[str]:
+    """Hex of the packed address (IPv4-mapped IPv6 folded to IPv4); None if invalid"""
+    ip = ip.strip()
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            packed = socket.inet_pton(family, ip)
+        except OSError:
+            continue
+        if family == socket.AF_INET6 and packed[:12] == b"\x00" * 10 + b"\xff\xff":
+            packed = packed[12:]
+        return packed.hex()
+    return None
+
+class VerdictCache:
+    def __init__(self, name: str, local_size: Optional[int] = None, ttl: Optional[int] = None,
+                 redis_url: Optional[str] = None, client: Optional[redis.Redis] = None):
+        self.name = name
+        self.local_size = local_size or settings.VERDICT_CACHE_LOCAL_SIZE
+        self.ttl = ttl or settings.VERDICT_CACHE_TTL
+        self.redis_url = settings.REDIS_URL if redis_url is None else redis_url
+        # key -> (expires_at, value)
+        self.local: "OrderedDict[str, tuple]" = OrderedDict()
+        # Any redis.asyncio-compatible client (e.g. fakeredis) can be injected
+        self.client: Optional[redis.Redis] = client
+        # While Redis is unreachable only the local tier is used
+        self.redis_retry_at = 0.0
+        self.pending: Dict[str, asyncio.Future] = {}
+
+    def key(self, version: str, key: str) -> str:
+        return f"opencyber:{self.name}:{version}:{key}"
+
+    def ttl_for(self, value: Dict[str, Any]) -> int:
+        """Verdicts with a risk level use VERDICT_CACHE_TTLS: clean results
+        expire sooner, since a URL or address can turn malicious"""
+        return settings.VERDICT_CACHE_TTLS.get(value.get("risk_level"), self.ttl)
+
+    async def get(self, version: str, key: str) -> Optional[Dict[str, Any]]:
+        return (await self.get_many(version, [key])).get(key)
+
+    async def get_many(self, version: str, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Cached values for whichever keys have one; Redis is asked for the
+        local misses in pipelined MGETs"""
+        found: Dict[str, Dict[str, Any]] = {}
+        missing = []
+        now = time.monotonic()
+        for key in keys:
+            cache_key = self.key(version, key)
+            cached = self.local.get(cache_key)
+            if cached is not None and cached[0] > now:
+                self.local.move_to_end(cache_key)
+                found[key] = cached[1]
+            else:
+                missing.append(key)
+        if found:
+            VERDICT_CACHE_HITS.labels(cache=self.name, tier="local").inc(len(found))
+
+        client = self.redis()
+        if missing and client is not None:
+            redis_hits = 0
+            try:
+                for start in range(0, len(missing), MGET_BATCH_SIZE):
+                    batch = missing[start:start + MGET_BATCH_SIZE]
+                    values = await client.mget([self.key(version, key) for key in batch])
+                    for key, raw in zip(batch, values):
+                        if raw is not None:
+                            value = json.loads(raw)
+                            self.store_local(self.key(version, key), value, self.ttl_for(value))
+                            found[key] = value
+                            redis_hits += 1
+            except (redis.RedisError, OSError) as e:
+                self.redis_failed(e)
+            if redis_hits:
+                VERDICT_CACHE_HITS.labels(cache=self.name, tier="redis").inc(redis_hits)
+
+        if len(found) < len(keys):
+            VERDICT_CACHE_MISSES.labels(cache=self.name).inc(len(keys) - len(found))
+        return found
+
+    async def set(self, version: str, key: str, value: Dict[str, Any], ttl: Optional[int] = None):
+        await self.set_many(version, {key: value}, ttl)
+
+    async def set_many(self, version: str, values: Dict[str, Dict[str, Any]], ttl: Optional[int] = None):
+        """Store in both tiers; Redis writes go out in one pipeline"""
+        if not values:
+            return
+        entries = [(self.key(version, key), value, ttl or self.ttl_for(value)) for key, value in values.items()]
+        for cache_key, value, entry_ttl in entries:
+            self.store_local(cache_key, value, entry_ttl)
+        client = self.redis()
+        if client is not None:
+            try:
+                async with client.pipeline(transaction=False) as pipe:
+                    for cache_key, value, entry_ttl in entries:
+                        pipe.set(cache_key, json.dumps(value), ex=entry_ttl)
+                    await pipe.execute()
+            except (redis.RedisError, OSError) as e:
+                self.redis_failed(e)
+
+    async def get_or_compute(self, version: str, key: str, compute: Callable[[], Awaitable[Dict[str, Any]]],
+                             cacheable: Callable[[Dict[str, Any]], bool] = lambda value: True) -> Dict[str, Any]:
+        """Cached value, or the result of compute(); concurrent misses for
+        the same key share a single computation. A result cacheable()
+        rejects is returned without being stored."""
+        cached = await self.get(version, key)
+        if cached is not None:
+            return cached
+
+        cache_key = self.key(version, key)
+        while cache_key in self.pending:
+            pending = self.pending[cache_key]
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                # The request computing it was cancelled, not this one: compute it here
+
+        future = asyncio.get_running_loop().create_future()
+        # Waiters re-raise a failure themselves; don't report it as unretrieved
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self.pending[cache_key] = future
+        try:
+            value = await compute()
+            if cacheable(value):
+                await self.set(version, key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            del self.pending[cache_key]
+
+    def store_local(self, cache_key: str, value: Dict[str, Any], ttl: int):
+        self.local[cache_key] = (time.monotonic() + ttl, value)
+        self.local.move_to_end(cache_key)
+        while len(self.local) > self.local_size:
+            self.local.popitem(last=False)
+
+    def redis(self) -> Optional[redis.Redis]:
+        if time.monotonic() < self.redis_retry_at:
+            return None
+        if self.client is None:
+            if not self.redis_url:
+                return None
+            self.client = redis.from_url(self.redis_url, socket_timeout=settings.VERDICT_CACHE_REDIS_TIMEOUT,
+                                         socket_connect_timeout=settings.VERDICT_CACHE_REDIS_TIMEOUT)
+        return self.client
+
+    def redis_failed(self, error: Exception):
+        if self.redis_retry_at <= time.monotonic():
+            print(f"⚠️  Redis unavailable for {self.name} cache, using local cache only: {error}")
+        self.redis_retry_at = time.monotonic() + settings.VERDICT_CACHE_REDIS_RETRY
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+    def stats(self) -> Dict[str, Any]:
+        if time.monotonic() < self.redis_retry_at:
+            redis_status = "unavailable"
+        else:
+            redis_status = "configured" if self.client is not None or self.redis_url else "disabled"
+        return {"local_entries": len(self.local), "in_flight": len(self.pending), "redis": redis_status}
+
+# File analysis results keyed by SHA-256; URL and IP verdicts keyed by
+# canonical URL and packed address
+file_verdicts = VerdictCache("file")
+url_verdicts = VerdictCache("url")
+ip_verdicts = VerdictCache("ip")
+
+async def close_caches():
+    for cache in (file_verdicts, url_verdicts, ip_verdicts):
+        await cache.close()
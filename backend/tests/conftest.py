@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# Settings are read at import time: the tests run against a throwaway
+# SQLite database and without Redis
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='opencyber-tests-')}/test.db"
+os.environ["REDIS_URL"] = ""
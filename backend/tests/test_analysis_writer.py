@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from app.analysis_writer import AnalysisWriter
+from app.core.database import Base, engine
+from app.models.database import ThreatAnalysis
+
+@pytest.fixture(autouse=True)
+def empty_table():
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(delete(ThreatAnalysis.__table__))
+
+def stored_rows() -> int:
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(ThreatAnalysis.__table__)).scalar()
+
+def counting_writes(writer: AnalysisWriter) -> list:
+    """Sizes of the batches written, in order"""
+    batches = []
+    write_rows = writer.write_rows
+
+    def recorded(rows):
+        batches.append(len(rows))
+        write_rows(rows)
+
+    writer.write_rows = recorded
+    return batches
+
+def record(writer: AnalysisWriter, count: int):
+    for index in range(count):
+        writer.record("url", f"http://example{index}.test/", {"risk_level": "low", "confidence": 85}, 0.01)
+
+def test_full_batches_are_written_without_waiting_for_the_interval():
+    async def run():
+        writer = AnalysisWriter(batch_size=3, flush_interval=60)
+        batches = counting_writes(writer)
+        writer.start()
+        record(writer, 7)
+        for _ in range(100):
+            if sum(batches) >= 6:
+                break
+            await asyncio.sleep(0.01)
+        assert batches == [3, 3]
+        await writer.stop()
+        assert batches == [3, 3, 1]
+
+    asyncio.run(run())
+    assert stored_rows() == 7
+
+def test_partial_batch_is_written_after_the_interval():
+    async def run():
+        writer = AnalysisWriter(batch_size=100, flush_interval=0.05)
+        batches = counting_writes(writer)
+        writer.start()
+        record(writer, 2)
+        await asyncio.sleep(0.3)
+        assert batches == [2]
+        assert stored_rows() == 2
+        await writer.stop()
+
+    asyncio.run(run())
+
+def test_stop_drains_the_queue():
+    async def run():
+        writer = AnalysisWriter(batch_size=10, flush_interval=60)
+        batches = counting_writes(writer)
+        writer.start()
+        record(writer, 45)
+        await writer.stop()
+        assert sum(batches) == 45
+        assert max(batches) <= 10
+        # Nothing is accepted once stopped
+        record(writer, 1)
+        assert writer.queue.empty()
+
+    asyncio.run(run())
+    assert stored_rows() == 45
+
+def test_full_queue_and_error_results_are_dropped():
+    async def run():
+        writer = AnalysisWriter(max_queue=5, batch_size=100, flush_interval=60)
+        writer.start()
+        writer.record("url", "http://bad.test/", {"error": "URL analysis failed"})
+        record(writer, 8)
+        assert writer.queue.qsize() == 5
+        await writer.stop()
+
+    asyncio.run(run())
+    assert stored_rows() == 5
+
+def test_rows_carry_the_verdict():
+    async def run():
+        writer = AnalysisWriter(batch_size=1, flush_interval=60)
+        writer.start()
+        writer.record("ip", "10.0.0.1", {"risk_level": "high", "confidence": 95})
+        await writer.stop()
+
+    asyncio.run(run())
+    with engine.connect() as connection:
+        row = connection.execute(select(ThreatAnalysis.__table__)).one()
+    assert (row.analysis_type, row.target, row.verdict, row.confidence_score) == ("ip", "10.0.0.1", "malicious", 95.0)
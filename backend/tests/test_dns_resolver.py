@@ -0,0 +1,85 @@
+import asyncio
+import ipaddress
+import time
+
+from app.core.config import settings
+from app.dns_resolver import ReverseDNSResolver, StubNameserver
+
+async def start_stub(silent=()):
+    """StubNameserver on an ephemeral port; silent addresses get no answer"""
+    names = {ipaddress.ip_address(ip).reverse_pointer for ip in silent}
+    loop = asyncio.get_running_loop()
+    transport, stub = await loop.create_datagram_endpoint(lambda: StubNameserver(names),
+                                                          local_addr=("127.0.0.1", 0))
+    resolver = ReverseDNSResolver(nameservers=[f"127.0.0.1#{transport.get_extra_info('sockname')[1]}"],
+                                  timeout=0.2)
+    return transport, stub, resolver
+
+def test_resolves_and_caches_with_the_answer_ttl():
+    async def run():
+        transport, stub, resolver = await start_stub()
+        try:
+            assert await resolver.resolve("10.0.0.7") == "host-7.bench.test"
+            assert await resolver.resolve("10.0.0.7") == "host-7.bench.test"
+            assert stub.queries == 1
+            assert resolver.stats()["hits"] == 1
+            # The stub answers with a 300s TTL
+            expires_at, _ = resolver.cache["10.0.0.7"]
+            assert 290 < expires_at - time.monotonic() <= 300
+
+            # Once expired, the address is queried again
+            resolver.cache["10.0.0.7"] = (time.monotonic() - 1, "host-7.bench.test")
+            assert await resolver.resolve("10.0.0.7") == "host-7.bench.test"
+            assert stub.queries == 2
+        finally:
+            transport.close()
+
+    asyncio.run(run())
+
+def test_unanswered_lookup_is_cached_for_the_failure_ttl():
+    async def run():
+        transport, stub, resolver = await start_stub(silent=["10.0.0.9"])
+        try:
+            assert await resolver.resolve("10.0.0.9") is None
+            expires_at, hostname = resolver.cache["10.0.0.9"]
+            assert hostname is None
+            assert expires_at - time.monotonic() <= settings.DNS_FAILURE_TTL
+            assert await resolver.resolve("10.0.0.9") is None
+            assert stub.queries == 1
+        finally:
+            transport.close()
+
+    asyncio.run(run())
+
+def test_concurrent_lookups_share_one_query():
+    async def run():
+        transport, stub, resolver = await start_stub()
+        try:
+            hostnames = await asyncio.gather(*(resolver.resolve("10.0.0.3") for _ in range(10)))
+            assert hostnames == ["host-3.bench.test"] * 10
+            assert stub.queries == 1
+            assert await resolver.resolve_many(["10.0.0.1", "10.0.0.2"]) == {
+                "10.0.0.1": "host-1.bench.test", "10.0.0.2": "host-2.bench.test"}
+        finally:
+            transport.close()
+
+    asyncio.run(run())
+
+def test_waiters_query_again_when_the_lookup_task_is_cancelled():
+    async def run():
+        transport, stub, resolver = await start_stub(silent=["10.0.0.5"])
+        try:
+            owner = asyncio.create_task(resolver.resolve("10.0.0.5"))
+            await asyncio.sleep(0.05)
+            waiters = [asyncio.create_task(resolver.resolve("10.0.0.5")) for _ in range(3)]
+            await asyncio.sleep(0.05)
+            owner.cancel()
+            # Not cancelled themselves: they time out on their own query instead
+            assert await asyncio.gather(*waiters) == [None] * 3
+            assert owner.cancelled()
+            assert stub.queries == 2
+            assert not resolver.pending
+        finally:
+            transport.close()
+
+    asyncio.run(run())
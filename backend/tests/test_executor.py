@@ -0,0 +1,45 @@
+import asyncio
+import threading
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.executor import PoolSaturatedError, WorkPool
+
+def sample(name: str, pool: str) -> float:
+    return REGISTRY.get_sample_value(name, {"pool": pool}) or 0.0
+
+def observed(pool: str) -> float:
+    return sample("opencyber_executor_wait_seconds_count", pool)
+
+def test_wait_is_observed_for_failing_jobs():
+    async def run():
+        pool = WorkPool("test-failing", max_workers=1, max_queue=1)
+
+        def fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            await pool.run(fail)
+        assert observed("test-failing") == 1
+        pool.shutdown()
+
+    asyncio.run(run())
+
+def test_rejected_jobs_are_counted_but_not_observed():
+    async def run():
+        pool = WorkPool("test-saturated", max_workers=1, max_queue=0)
+        release = threading.Event()
+        running = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0.01)
+        with pytest.raises(PoolSaturatedError):
+            await pool.run(lambda: None)
+        assert sample("opencyber_executor_rejected_total", "test-saturated") == 1
+        release.set()
+        await running
+        await asyncio.sleep(0.01)
+        assert observed("test-saturated") == 1
+        assert pool.in_flight == 0
+        pool.shutdown()
+
+    asyncio.run(run())
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from app.file_analysis import OBFUSCATION_SIGNATURES, FileScan
+from app.file_hashing import hash_bytes
+
+def scan(data: bytes, chunk_sizes) -> FileScan:
+    """FileScan fed data in chunks of the given sizes (the last one repeated)"""
+    file_scan = FileScan()
+    offset, sizes = 0, list(chunk_sizes)
+    while offset < len(data):
+        size = sizes.pop(0) if len(sizes) > 1 else sizes[0]
+        file_scan.update(data[offset:offset + size])
+        offset += size
+    return file_scan
+
+@pytest.mark.parametrize("signature", OBFUSCATION_SIGNATURES)
+def test_signature_split_at_every_position_is_found(signature):
+    data = b"x" * 50 + signature + b"y" * 50
+    for boundary in range(50, 50 + len(signature) + 1):
+        assert scan(data, [boundary, len(data)]).summary()["signatures"] == [signature.decode()]
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7])
+def test_signature_spanning_several_small_chunks_is_found(chunk_size):
+    data = b"<?php " + b"base64_decode" + b"($x); eval($y);"
+    assert scan(data, [chunk_size]).summary()["signatures"] == ["base64_decode", "eval("]
+
+def test_no_match_across_unrelated_chunks():
+    # "eval" at the end of one upload chunk and "(" much later is not a match
+    data = b"eval" + b"-" * 10 + b"("
+    assert scan(data, [4, 1]).summary()["signatures"] == []
+
+def test_size_and_hashes_match_the_whole_buffer():
+    data = os.urandom(300_000)
+    summary = scan(data, [65_536, 1, 100_000, 7]).summary()
+    assert summary["file_size"] == len(data)
+    assert summary["hashes"] == hash_bytes(data, fuzzy=False)
+
+def test_empty_chunks_are_ignored():
+    file_scan = FileScan()
+    file_scan.update(b"ev")
+    file_scan.update(b"")
+    file_scan.update(b"al(")
+    assert file_scan.summary()["signatures"] == ["eval("]
@@ -0,0 +1,20 @@
+import asyncio
+
+from app.network_scanner import NetworkScanner
+
+def test_scan_ip_async_accepts_ipv6():
+    async def run():
+        scanner = NetworkScanner(port_timeout=0.2)
+        result = await scanner.scan_ip_async("0:0::1", ports=[9])
+        assert result["ip"] == "::1"
+        assert result["network_info"]["type"] == "Loopback"
+
+    asyncio.run(run())
+
+def test_scan_ip_async_rejects_invalid_addresses():
+    async def run():
+        scanner = NetworkScanner()
+        for address in ("999.1.1.1", "example.com", "1.2.3", "::g"):
+            assert await scanner.scan_ip_async(address) == {"error": "Invalid IP address"}
+
+    asyncio.run(run())
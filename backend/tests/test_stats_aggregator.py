@@ -0,0 +1,93 @@
+import asyncio
+from collections import Counter
+from datetime import datetime, timezone
+
+import fakeredis
+import pytest
+import redis.asyncio as redis
+from sqlalchemy import delete
+
+from app.core.database import Base, async_engine, engine
+from app.models.database import SystemMetrics
+from app.stats_aggregator import KEY_PREFIX, StatsAggregator
+
+@pytest.fixture(autouse=True)
+def empty_table():
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(delete(SystemMetrics.__table__))
+
+def store_snapshot(**values):
+    with engine.begin() as connection:
+        connection.execute(SystemMetrics.__table__.insert().values(
+            id="snapshot", timestamp=datetime.now(timezone.utc), **values))
+
+def run(coroutine):
+    async def wrapped():
+        try:
+            return await coroutine
+        finally:
+            # aiosqlite connections belong to the loop that opened them
+            await async_engine.dispose()
+
+    return asyncio.run(wrapped())
+
+def analysis(risk_level: str = "low") -> dict:
+    return {"risk_level": risk_level, "confidence": 80}
+
+def test_detection_accuracy_is_an_alias_of_mean_confidence():
+    aggregator = StatsAggregator(redis_url="")
+    aggregator.record("url", {"risk_level": "low", "confidence": 70})
+    aggregator.record("url", {"risk_level": "high", "confidence": 90})
+    view = aggregator.local_view()
+    assert view["mean_confidence"] == view["detection_accuracy"] == 80.0
+
+def test_seed_adds_to_counts_flushed_before_it():
+    async def scenario():
+        store_snapshot(threats_analyzed=10, threats_analyzed_today=4, detections_today=2,
+                       average_processing_time=0.5, mean_confidence=60.0)
+        client = fakeredis.FakeAsyncRedis()
+        # Another worker has already served (and flushed) three analyses
+        early = StatsAggregator(client=client)
+        for risk_level in ("low", "low", "high"):
+            early.record("url", analysis(risk_level))
+        await early.flush()
+
+        late = StatsAggregator(client=client)
+        await late.seed()
+        await late.refresh()
+        assert late.view["total_threats_analyzed"] == 13
+        assert late.view["threats_today"] == 7
+        assert late.view["detections_today"] == 3
+
+    run(scenario())
+
+def test_snapshot_keeps_todays_detections_across_a_restart():
+    async def scenario():
+        before = StatsAggregator(redis_url="")
+        for risk_level in ("low", "medium", "high"):
+            before.record("url", analysis(risk_level))
+        before.view = before.local_view()
+        await before.snapshot()
+
+        after = StatsAggregator(redis_url="")
+        await after.seed()
+        assert after.view["threats_today"] == 3
+        assert after.view["detections_today"] == 2
+
+    run(scenario())
+
+def test_concurrent_workers_seed_once():
+    async def scenario():
+        client = fakeredis.FakeAsyncRedis()
+        workers = [StatsAggregator(client=client) for _ in range(4)]
+        results = await asyncio.gather(*(worker.seed_redis(client, Counter({"analyses": 10}))
+                                         for worker in workers), return_exceptions=True)
+        # Workers that lost the race see a WatchError or the marker
+        assert all(result is None or isinstance(result, redis.WatchError) for result in results)
+        assert int(await client.hget(f"{KEY_PREFIX}:totals", "analyses")) == 10
+        # A restart against the same Redis doesn't add the snapshot again
+        await StatsAggregator(client=client).seed_redis(client, Counter({"analyses": 10}))
+        assert int(await client.hget(f"{KEY_PREFIX}:totals", "analyses")) == 10
+
+    asyncio.run(scenario())
@@ -0,0 +1,49 @@
+import pytest
+
+from app.threat_intelligence import ThreatIntelligence
+from app.url_scoring import FEATURE_NAMES, URLBatch, synthetic_snapshot, synthetic_urls
+
+EDGE_CASES = [
+    "HTTP://WWW.Example.COM.:8080/Login?Next=/",
+    "example.com/verify-account",
+    "http://[::1]:8443/files/setup.exe",
+    "http://user@10.0.0.1/password-reset",
+    "http://xn--bcher-kva.de/",
+    "https://münchen.de/secure",
+    "http://example.com:99999/",
+    "mailto:someone@example.com",
+    "",
+    "   ",
+    "http://a\nb.com/",
+]
+
+@pytest.fixture(scope="module")
+def corpus():
+    threat_intel = ThreatIntelligence()
+    protected = [domain for _, domain in threat_intel.rules.domain_index.entries if " " not in domain]
+    urls = synthetic_urls(3000, protected, seed=11) + EDGE_CASES
+    threat_intel.feeds.snapshot = synthetic_snapshot(urls, list(threat_intel.threat_feeds), seed=11)
+    return threat_intel, urls
+
+def test_batch_verdicts_match_analyze_url(corpus):
+    threat_intel, urls = corpus
+    expected = [threat_intel.analyze_url(url) for url in urls]
+    batch = URLBatch(urls, threat_intel.rules, threat_intel.feeds.snapshot, list(threat_intel.threat_feeds))
+    risk_levels, confidences = batch.scores()
+    assert [(analysis["risk_level"], analysis["confidence"]) for analysis in expected] \
+        == list(zip(risk_levels.tolist(), confidences.tolist()))
+    # The corpus exercises the detectors, not only clean URLs
+    assert len(batch.flagged()) > 0
+
+def test_analyze_urls_matches_analyze_url(corpus):
+    threat_intel, urls = corpus
+    # Repeats share the first occurrence's result
+    urls = urls + urls[:50]
+    assert threat_intel.analyze_urls(urls) == [threat_intel.analyze_url(url) for url in urls]
+
+def test_features_shape(corpus):
+    threat_intel, urls = corpus
+    batch = URLBatch(urls, threat_intel.rules, threat_intel.feeds.snapshot, list(threat_intel.threat_feeds))
+    features = batch.features()
+    assert features.shape == (len(urls), len(FEATURE_NAMES))
+    assert URLBatch([], threat_intel.rules, None, []).features().shape == (0, len(FEATURE_NAMES))
@@ -0,0 +1,106 @@
+import asyncio
+
+import fakeredis
+
+from app.verdict_cache import VerdictCache
+
+def make_cache(**kwargs) -> VerdictCache:
+    return VerdictCache("test", client=fakeredis.FakeAsyncRedis(), **kwargs)
+
+def test_set_many_then_get_many_from_both_tiers():
+    async def run():
+        cache = make_cache()
+        await cache.set_many("v1", {"a": {"risk_level": "low"}, "b": {"risk_level": "high"}})
+        assert await cache.get_many("v1", ["a", "b", "c"]) == {"a": {"risk_level": "low"},
+                                                               "b": {"risk_level": "high"}}
+        # A fresh worker (empty local tier) finds them in Redis
+        other = VerdictCache("test", client=cache.client)
+        assert await other.get_many("v1", ["a", "b"]) == {"a": {"risk_level": "low"},
+                                                          "b": {"risk_level": "high"}}
+        assert await other.get("v2", "a") is None
+
+    asyncio.run(run())
+
+def test_set_many_uses_risk_level_ttls():
+    async def run():
+        cache = make_cache()
+        await cache.set_many("v1", {"clean": {"risk_level": "low"}})
+        assert 0 < await cache.client.ttl(cache.key("v1", "clean")) <= 900
+
+    asyncio.run(run())
+
+def test_get_or_compute_shares_one_computation():
+    async def run():
+        cache = make_cache()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"risk_level": "low"}
+
+        results = await asyncio.gather(*(cache.get_or_compute("v1", "k", compute) for _ in range(5)))
+        assert calls == 1
+        assert results == [{"risk_level": "low"}] * 5
+        assert await cache.get("v1", "k") == {"risk_level": "low"}
+
+    asyncio.run(run())
+
+def test_get_or_compute_skips_storing_uncacheable_values():
+    async def run():
+        cache = make_cache()
+        value = await cache.get_or_compute("v1", "k", lambda: asyncio.sleep(0, {"risk_level": "low"}),
+                                           cacheable=lambda value: False)
+        assert value == {"risk_level": "low"}
+        assert await cache.get("v1", "k") is None
+        assert await cache.client.get(cache.key("v1", "k")) is None
+
+    asyncio.run(run())
+
+def test_waiters_take_over_when_the_computing_request_is_cancelled():
+    async def run():
+        cache = make_cache()
+        started = asyncio.Event()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            started.set()
+            await asyncio.sleep(0.05)
+            return {"risk_level": "low"}
+
+        owner = asyncio.create_task(cache.get_or_compute("v1", "k", compute))
+        await started.wait()
+        waiters = [asyncio.create_task(cache.get_or_compute("v1", "k", compute)) for _ in range(3)]
+        # Past their cache lookups and waiting on the owner's computation
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        assert await asyncio.gather(*waiters) == [{"risk_level": "low"}] * 3
+        assert owner.cancelled()
+        # One waiter recomputed; the others shared its result
+        assert calls == 2
+        assert not cache.pending
+
+    asyncio.run(run())
+
+def test_cancelled_waiter_does_not_cancel_the_computation():
+    async def run():
+        cache = make_cache()
+        started = asyncio.Event()
+
+        async def compute():
+            started.set()
+            await asyncio.sleep(0.05)
+            return {"risk_level": "low"}
+
+        owner = asyncio.create_task(cache.get_or_compute("v1", "k", compute))
+        await started.wait()
+        waiter = asyncio.create_task(cache.get_or_compute("v1", "k", compute))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        assert await owner == {"risk_level": "low"}
+        assert waiter.cancelled()
+
+    asyncio.run(run())